@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Gestion Scolaire',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.1.0',
     'category': 'Education',
     'summary': 'Module de gestion scolaire complète: étudiants, notes, emplois du temps, présence et rapports',
     'description': """
@@ -30,21 +30,39 @@
         
         # Données
         'data/sequence_data.xml',
+        'data/ir_cron_data.xml',
+        'data/school_config_data.xml',
+        'data/absence_alert_data.xml',
         
         # Vues
         'views/student_views.xml',
         'views/course_views.xml',
         'views/class_views.xml',
         'views/grade_views.xml',
+        'views/gradebook_views.xml',
+        'views/grade_summary_views.xml',
+        'views/room_views.xml',
         'views/schedule_views.xml',
+        'views/timetable_views.xml',
+        'views/promotion_views.xml',
         'views/attendance_views.xml',
+        'views/absence_alert_views.xml',
+        'views/school_year_views.xml',
+        'views/job_views.xml',
         'views/teacher_views.xml',
+        'views/school_import_views.xml',
+        'views/audit_log_views.xml',
+        'views/benchmark_views.xml',
+        'views/data_generator_views.xml',
+        'views/profiling_views.xml',
         'views/menu_views.xml',
         
         # Rapports
         'reports/report_template.xml',
         'reports/student_report.xml',
         'reports/bulletin_report.xml',
+        'reports/schedule_report.xml',
+        'reports/promotion_report.xml',
     ],
     'demo': [],
     'images': ['static/description/banner.png'],
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Normalise l'ancien champ texte `room` des emplois du temps en salles school.room"""
+    cr.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'school_schedule' AND column_name = 'room'
+    """)
+    if not cr.fetchone():
+        return
+    cr.execute("""
+        INSERT INTO school_room (name, capacity, room_type, active, create_uid, write_uid, create_date, write_date)
+        SELECT DISTINCT TRIM(room), 30, 'classroom', TRUE, 1, 1, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+        FROM school_schedule
+        WHERE COALESCE(TRIM(room), '') != ''
+        ON CONFLICT (name) DO NOTHING
+    """)
+    # Doubles réservations historiques: la contrainte d'exclusion (différée) des salles
+    # ferait échouer la mise à jour; ces créneaux restent sans salle et sont signalés
+    cr.execute("""
+        WITH candidate AS (
+            SELECT s.id, r.id AS room_id, s.day_of_week, s.start_time, s.end_time, FALSE AS assigned
+            FROM school_schedule s
+            JOIN school_room r ON r.name = TRIM(s.room)
+            WHERE s.room_id IS NULL AND s.active
+        ), occupied AS (
+            SELECT * FROM candidate
+            UNION ALL
+            SELECT id, room_id, day_of_week, start_time, end_time, TRUE
+            FROM school_schedule
+            WHERE room_id IS NOT NULL AND active
+        )
+        SELECT c.id, c.room_id
+        FROM candidate c
+        WHERE EXISTS (
+            SELECT 1 FROM occupied o
+            WHERE o.room_id = c.room_id
+              AND o.day_of_week = c.day_of_week
+              AND o.id != c.id
+              AND (o.assigned OR o.id < c.id)
+              AND numrange(LEAST(o.start_time, o.end_time)::numeric, GREATEST(o.start_time, o.end_time)::numeric)
+                  && numrange(LEAST(c.start_time, c.end_time)::numeric, GREATEST(c.start_time, c.end_time)::numeric)
+        )
+        ORDER BY c.id
+    """)
+    conflicts = cr.fetchall()
+    for schedule_id, room_id in conflicts:
+        _logger.warning("Créneau %s: salle %s déjà occupée sur ce créneau, salle non affectée.", schedule_id, room_id)
+    cr.execute("""
+        UPDATE school_schedule s
+        SET room_id = r.id
+        FROM school_room r
+        WHERE r.name = TRIM(s.room) AND s.room_id IS NULL AND s.id != ALL(%s)
+    """, [[schedule_id for schedule_id, _room_id in conflicts]])
@@ -1,9 +1,27 @@
 # -*- coding: utf-8 -*-
 
+from . import profiling
+from . import job
+from . import audit_log
+from . import search_mixin
 from . import student
 from . import teacher
 from . import course
 from . import class_level
 from . import grade
+from . import grade_summary
+from . import grade_statistics
+from . import dashboard
+from . import gradebook
+from . import room
 from . import schedule
 from . import attendance
+from . import absence_alert
+from . import school_year
+from . import promotion
+from . import timetable
+from . import school_import
+from . import ir_sequence
+from . import benchmark
+from . import data_generator
+from . import load_test
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import html_escape
+
+_logger = logging.getLogger(__name__)
+
+# Dernière date d'écriture des présences examinée par le passage précédent
+ALERT_WATERMARK_PARAM = 'school_management.absence_alert_watermark'
+# Relecture avant le filigrane: présences écrites par des transactions encore ouvertes
+# lors du passage précédent (les lignes déjà signalées sont ignorées grâce à alert_date)
+ALERT_WATERMARK_MARGIN = timedelta(minutes=15)
+ALERT_STATUSES = ('absent', 'late')
+RULE_STATUSES = {
+    'absent': ('absent',),
+    'late': ('late',),
+    'both': ('absent', 'late'),
+}
+
+
+class AbsenceRule(models.Model):
+    _name = 'school.absence.rule'
+    _description = "Règle d'alerte d'absence"
+    _order = 'sequence, id'
+    
+    name = fields.Char(string='Nom', required=True)
+    sequence = fields.Integer(string='Séquence', default=10)
+    active = fields.Boolean(string='Actif', default=True)
+    status = fields.Selection([
+        ('absent', 'Absences non justifiées'),
+        ('late', 'Retards'),
+        ('both', 'Absences non justifiées et retards'),
+    ], string='Compter', required=True, default='absent')
+    threshold = fields.Integer(string='Seuil', required=True, default=3,
+                               help="Nombre d'occurrences à partir duquel le tuteur est prévenu")
+    window_days = fields.Integer(string='Période (jours)', required=True, default=7)
+    
+    @api.constrains('threshold', 'window_days')
+    def _check_threshold(self):
+        for record in self:
+            if record.threshold <= 0 or record.window_days <= 0:
+                raise ValidationError(_("Le seuil et la période doivent être positifs."))
+    
+    def init(self):
+        """Index de la recherche des nouvelles absences et retards depuis le filigrane"""
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_attendance_alert_idx
+            ON school_attendance (write_date)
+            WHERE status IN ('absent', 'late')
+        """)
+    
+    @api.model
+    def _cron_send_alerts(self):
+        """Envoie aux tuteurs un récapitulatif des absences et retards enregistrés depuis
+        le passage précédent, quand une règle est atteinte; un seul mail par tuteur,
+        créés en lot dans la file d'envoi"""
+        rules = self.search([])
+        if not rules:
+            return {'events': 0, 'mails': 0}
+        Param = self.env['ir.config_parameter'].sudo()
+        cr = self.env.cr
+        self.env.flush_all()
+        cr.execute("SELECT now() AT TIME ZONE 'UTC'")
+        now = cr.fetchone()[0]
+        watermark = fields.Datetime.to_datetime(Param.get_param(ALERT_WATERMARK_PARAM) or False)
+        # Premier passage: seulement la dernière journée, pas l'historique
+        since = watermark - ALERT_WATERMARK_MARGIN if watermark else now - timedelta(days=1)
+        today = fields.Date.context_today(self)
+        cr.execute("""
+            WITH fresh AS (
+                SELECT id, student_id
+                FROM school_attendance
+                WHERE write_date > %(since)s AND write_date <= %(now)s
+                  AND status IN %(statuses)s
+                  AND (alert_date IS NULL OR alert_date < write_date)
+            )
+            SELECT a.id, a.student_id, a.course_id, a.date, a.status, f.id IS NOT NULL AS fresh
+            FROM school_attendance a
+            LEFT JOIN fresh f ON f.id = a.id
+            WHERE a.student_id IN (SELECT student_id FROM fresh)
+              AND a.status IN %(statuses)s
+              AND (a.date > %(start)s OR f.id IS NOT NULL)
+            ORDER BY a.student_id, a.date, a.id
+        """, {
+            'since': since,
+            'now': now,
+            'statuses': ALERT_STATUSES,
+            'start': today - timedelta(days=max(rules.mapped('window_days'))),
+        })
+        events = defaultdict(list)
+        for row in cr.dictfetchall():
+            events[row['student_id']].append(row)
+    
+        digests = defaultdict(list)
+        students = self.env['school.student'].browse(list(events))
+        for student in students:
+            email = (student.guardian_email or '').strip().lower()
+            if not email or not student.active:
+                continue
+            triggered = [rule for rule in rules if self._rule_triggered(rule, events[student.id], today)]
+            if triggered:
+                digests[email].append((student, events[student.id], triggered))
+    
+        mails = self.env['mail.mail'].sudo().create([
+            self._prepare_digest(email, entries) for email, entries in digests.items()
+        ])
+        fresh_ids = [row['id'] for rows in events.values() for row in rows if row['fresh']]
+        if fresh_ids:
+            cr.execute("UPDATE school_attendance SET alert_date = %s WHERE id = ANY(%s)", [now, fresh_ids])
+            self.env['school.attendance'].invalidate_model(['alert_date'])
+        Param.set_param(ALERT_WATERMARK_PARAM, fields.Datetime.to_string(now))
+        _logger.info("Alertes d'absence: %s présences nouvelles, %s récapitulatifs envoyés aux tuteurs",
+                     len(fresh_ids), len(mails))
+        return {'events': len(fresh_ids), 'mails': len(mails)}
+    
+    @api.model
+    def _rule_triggered(self, rule, events, today):
+        """Règle atteinte sur la période, par au moins une présence nouvelle"""
+        start = today - timedelta(days=rule.window_days)
+        matching = [event for event in events
+                    if event['status'] in RULE_STATUSES[rule.status] and event['date'] > start]
+        return len(matching) >= rule.threshold and any(event['fresh'] for event in matching)
+    
+    @api.model
+    def _prepare_digest(self, email, entries):
+        statuses = dict(self.env['school.attendance']._fields['status'].selection)
+        courses = self.env['school.course'].browse(list(
+            {event['course_id'] for _student, events, _rules in entries for event in events if event['course_id']}))
+        course_names = {course.id: course.name for course in courses}
+        sections = []
+        for student, events, rules in entries:
+            lines = "".join(
+                "<li>%s - %s%s</li>" % (
+                    html_escape(event['date'].strftime('%d/%m/%Y')),
+                    html_escape(statuses[event['status']]),
+                    html_escape(" (%s)" % course_names[event['course_id']]) if event['course_id'] else "",
+                )
+                for event in events if event['fresh']
+            )
+            reasons = ", ".join(html_escape(rule.name) for rule in rules)
+            sections.append(_("<p><strong>%(student)s</strong> (%(class)s): %(reasons)s</p><ul>%(lines)s</ul>") % {
+                'student': html_escape(student.name),
+                'class': html_escape(student.class_id.name or ''),
+                'reasons': reasons,
+                'lines': lines,
+            })
+        guardian = entries[0][0].guardian_name
+        return {
+            'subject': _("Absences et retards: %s") % ", ".join(student.name for student, _events, _rules in entries),
+            'email_from': self.env.company.email_formatted or self.env.user.email_formatted,
+            'email_to': email,
+            'body_html': _("<p>Bonjour %s,</p><p>Nous vous informons des absences et retards suivants:</p>%s")
+                         % (html_escape(guardian or ''), "".join(sections)),
+            'auto_delete': True,
+        }
+    
+    @api.model
+    def action_send_alerts(self):
+        result = self._cron_send_alerts()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'success',
+                'message': _("%(events)s absences ou retards examinés, %(mails)s récapitulatifs mis en file d'envoi.")
+                           % result,
+            },
+        }
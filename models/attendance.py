@@ -1,15 +1,52 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import time
+from collections import Counter
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .profiling import profiled
+
+_logger = logging.getLogger(__name__)
+
+# Cron de rafraîchissement de la vue matérialisée des rapports de présence
+REPORT_REFRESH_CRON = 'school_management.ir_cron_school_attendance_report_refresh'
+# Champs d'une présence lus par les indicateurs du tableau de bord
+KPI_FIELDS = {'status', 'date', 'student_id', 'class_id'}
+
+# Présences existantes parmi les clés (étudiant, date, cours) à écrire, hors présences réécrites
+DUPLICATE_QUERY = """
+    SELECT a.student_id, a.date, a.course_id
+    FROM school_attendance a
+    JOIN unnest(%(key_student_ids)s::int[], %(key_dates)s::date[], %(key_course_ids)s::int[])
+         AS k(student_id, date, course_id)
+      ON a.student_id = k.student_id AND a.date = k.date AND a.course_id = k.course_id
+    WHERE a.id != ALL(%(exclude_ids)s::int[])
+"""
+
+# Insertion en masse des présences d'un cours et d'une date, suivie de la clause ON CONFLICT
+UPSERT_QUERY = """
+    INSERT INTO school_attendance (
+        student_id, class_id, course_id, schedule_id, date, status, display_name,
+        marked_by, create_uid, write_uid, create_date, write_date
+    )
+    SELECT t.student_id, t.class_id, %%(course_id)s, %%(schedule_id)s, %%(date)s, t.status, t.display_name,
+           %%(uid)s, %%(uid)s, %%(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+    FROM unnest(%%(student_id)s::int[], %%(class_id)s::int[], %%(status)s::varchar[], %%(display_name)s::varchar[])
+         AS t(student_id, class_id, status, display_name)
+    %(conflict)s
+    RETURNING id, (xmax = 0) AS inserted, status
+"""
+
 
 class Attendance(models.Model):
     _name = 'school.attendance'
     _description = 'Présence'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'school.audit.mixin']
     _order = 'date desc, student_id'
-
+    
     # Relations
     student_id = fields.Many2one('school.student', string='Étudiant', required=True, tracking=True)
     class_id = fields.Many2one('school.class', string='Classe', related='student_id.class_id', store=True)
@@ -38,10 +75,14 @@ class Attendance(models.Model):
     # Marqué par
     marked_by = fields.Many2one('res.users', string='Marqué par', default=lambda self: self.env.user)
     
+    # Alertes aux tuteurs
+    alert_date = fields.Datetime(string='Alerte envoyée le', readonly=True, copy=False)
+    
     # Nom affiché
     display_name = fields.Char(string='Nom', compute='_compute_display_name', store=True)
     
     @api.depends('student_id', 'date', 'status')
+    @profiled('compute')
     def _compute_display_name(self):
         for record in self:
             status_names = dict(self._fields['status'].selection)
@@ -57,33 +98,246 @@ class Attendance(models.Model):
                 if record.check_out <= record.check_in:
                     raise ValidationError(_("L'heure de départ doit être après l'heure d'arrivée."))
     
-    @api.constrains('student_id', 'date', 'course_id')
-    def _check_duplicate(self):
-        """Empêche la duplication de présence pour le même étudiant, cours et date"""
-        for record in self:
-            if record.course_id:
-                duplicate = self.search([
-                    ('id', '!=', record.id),
-                    ('student_id', '=', record.student_id.id),
-                    ('date', '=', record.date),
-                    ('course_id', '=', record.course_id.id),
-                ])
-                if duplicate:
-                    raise ValidationError(_("Une présence existe déjà pour cet étudiant, ce cours et cette date."))
+    @api.constrains('date')
+    @profiled('constraint')
+    def _check_school_year(self):
+        self.env['school.year']._check_open_dates(self.mapped('date'))
+    
+    @api.model
+    @profiled('constraint', processed=lambda self, keys, exclude_ids=(): len(keys))
+    def _check_duplicates(self, keys, exclude_ids=()):
+        """Empêche la duplication de présence pour le même étudiant, cours et date, avant
+        l'écriture (doublons du lot compris), en une seule requête; l'index unique
+        partiel reste le garde-fou contre les écritures concurrentes.
+        
+        :param keys: liste de (student_id, date, course_id) à écrire
+        :param exclude_ids: présences réécrites (ne comptent pas comme doublons)
+        """
+        keys = [(student_id, fields.Date.to_date(day), course_id)
+                for student_id, day, course_id in keys if student_id and day and course_id]
+        if not keys:
+            return
+        duplicates = {key for key, count in Counter(keys).items() if count > 1}
+        self.flush_model(['student_id', 'date', 'course_id'])
+        self.env.cr.execute(DUPLICATE_QUERY, {
+            'key_student_ids': [key[0] for key in keys],
+            'key_dates': [key[1] for key in keys],
+            'key_course_ids': [key[2] for key in keys],
+            'exclude_ids': list(exclude_ids),
+        })
+        duplicates.update(self.env.cr.fetchall())
+        if duplicates:
+            students = self.env['school.student'].browse({key[0] for key in duplicates})
+            names = ", ".join(sorted(set(students.mapped('name'))))
+            raise ValidationError(_("Une présence existe déjà pour cet étudiant, ce cours et cette date: %s.") % names)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._check_duplicates([
+            (vals.get('student_id'), vals.get('date') or fields.Date.today(), vals.get('course_id'))
+            for vals in vals_list
+        ])
+        records = super(Attendance, self._audit_context()).create(vals_list).with_env(self.env)
+        self.env['school.dashboard']._invalidate_classes(records.class_id.ids)
+        return records
+    
+    def write(self, vals):
+        if {'student_id', 'date', 'course_id'} & set(vals):
+            self._check_duplicates([(
+                vals.get('student_id', record.student_id.id),
+                vals.get('date', record.date),
+                vals.get('course_id', record.course_id.id),
+            ) for record in self], exclude_ids=self.ids)
+        records = self._audit_context()
+        snapshot = records._audit_snapshot(vals)
+        classes = self.class_id
+        res = super(Attendance, records).write(vals)
+        records._audit_log_changes(snapshot)
+        # Remarques, raison ou horaires ne changent pas les indicateurs du tableau de bord
+        if KPI_FIELDS & set(vals):
+            self.env['school.dashboard']._invalidate_classes((classes | self.class_id).ids)
+        return res
+    
+    def unlink(self):
+        classes = self.class_id
+        res = super(Attendance, self).unlink()
+        self.env['school.dashboard']._invalidate_classes(classes.ids)
+        return res
+    
+    def init(self):
+        """Index composites des chemins chauds (taux de présence, appel d'un cours, filtres
+        par classe et période) et index unique partiel (étudiant, date, cours), garde-fou
+        des écritures concurrentes derrière la vérification de create() et write()"""
+        for name, columns in (
+            ('student_status', 'student_id, status'),
+            ('course_date', 'course_id, date'),
+            ('class_date', 'class_id, date'),
+        ):
+            self.env.cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS school_attendance_{name}_idx
+                ON school_attendance ({columns})
+            """)
+        self.env.cr.execute("""
+            SELECT 1 FROM school_attendance
+            WHERE course_id IS NOT NULL
+            GROUP BY student_id, date, course_id
+            HAVING COUNT(*) > 1
+            LIMIT 1
+        """)
+        if self.env.cr.fetchone():
+            _logger.warning("Présences en double détectées: index unique school_attendance non créé, "
+                            "l'appel en masse procède par mise à jour puis insertion.")
+            self.env.cr.execute("""
+                CREATE INDEX IF NOT EXISTS school_attendance_student_date_course_idx
+                ON school_attendance (student_id, date, course_id)
+            """)
+            return
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS school_attendance_student_date_course_uniq
+            ON school_attendance (student_id, date, course_id)
+            WHERE course_id IS NOT NULL
+        """)
     
     @api.model
     def mark_bulk_attendance(self, student_ids, date, course_id, status):
         """Méthode pour marquer la présence en masse"""
-        attendance_records = []
-        for student_id in student_ids:
-            vals = {
+        if not course_id:
+            # Présences sans cours: pas de clé d'unicité, création par l'ORM
+            return self.create([{
                 'student_id': student_id,
                 'date': date,
-                'course_id': course_id,
+                'course_id': False,
                 'status': status,
-            }
-            attendance_records.append(vals)
-        return self.create(attendance_records)
+            } for student_id in student_ids])
+        result = self._upsert_attendance({student_id: status for student_id in student_ids}, date, course_id)
+        return self.browse(result['ids'])
+    
+    @api.model
+    def record_roll_call(self, schedule_id, date, statuses):
+        """Enregistre l'appel complet d'un créneau en un seul appel.
+        
+        :param statuses: dictionnaire {student_id: statut}
+        :return: compteurs (lignes insérées, mises à jour, requêtes, durée en ms)
+        """
+        schedule = self.env['school.schedule'].browse(schedule_id)
+        return self._upsert_attendance(statuses, date, schedule.course_id.id, schedule.id)
+    
+    @api.model
+    def _has_unique_index(self):
+        """Vrai si l'index unique (étudiant, date, cours) existe; il manque tant que des
+        doublons hérités n'ont pas été résolus"""
+        self.env.cr.execute("""
+            SELECT 1 FROM pg_indexes
+            WHERE tablename = 'school_attendance' AND indexname = 'school_attendance_student_date_course_uniq'
+        """)
+        return bool(self.env.cr.fetchone())
+    
+    @api.model
+    def _update_then_insert(self, rows, params):
+        """Repli de l'upsert sans index unique: mise à jour des présences existantes,
+        puis insertion des autres, en deux requêtes"""
+        self.env.cr.execute("""
+            UPDATE school_attendance a
+            SET status = t.status,
+                display_name = t.display_name,
+                schedule_id = COALESCE(%(schedule_id)s, a.schedule_id),
+                marked_by = %(uid)s,
+                write_uid = %(uid)s,
+                write_date = now() AT TIME ZONE 'UTC'
+            FROM unnest(%(student_id)s::int[], %(status)s::varchar[], %(display_name)s::varchar[])
+                 AS t(student_id, status, display_name)
+            WHERE a.student_id = t.student_id AND a.date = %(date)s AND a.course_id = %(course_id)s
+            RETURNING a.id, a.student_id, a.status
+        """, params)
+        updated = self.env.cr.fetchall()
+        result = [(attendance_id, False, status) for attendance_id, _student_id, status in updated]
+        done = {student_id for _id, student_id, _status in updated}
+        missing = [index for index, student_id in enumerate(rows['student_id']) if student_id not in done]
+        if missing:
+            self.env.cr.execute(UPSERT_QUERY % {'conflict': ""}, dict(params, **{
+                column: [values[index] for index in missing] for column, values in rows.items()
+            }))
+            result += self.env.cr.fetchall()
+        return result
+    
+    @api.model
+    def _upsert_attendance(self, statuses, date, course_id, schedule_id=False):
+        """Insère ou met à jour les présences (étudiant, date, cours) en une requête SQL,
+        sans suivi du chatter ni contraintes par enregistrement. Les règles d'accès sont
+        vérifiées avant la requête (étudiants, cours, présences existantes) et sur les
+        présences créées."""
+        start = time.perf_counter()
+        queries = self.env.cr.sql_log_count
+        self.check_access('create')
+        self.check_access('write')
+        if not course_id:
+            raise ValidationError(_("Un cours est requis pour l'appel en masse."))
+        valid_statuses = dict(self._fields['status'].selection)
+        statuses = {int(student_id): status for student_id, status in statuses.items()}
+        invalid = set(statuses.values()) - set(valid_statuses)
+        if invalid:
+            raise ValidationError(_("Statut de présence inconnu: %s.") % ", ".join(sorted(invalid)))
+        date = fields.Date.to_date(date)
+        self.env['school.year']._check_open_dates([date])
+        
+        students = self.env['school.student'].browse(statuses).exists()
+        students.check_access('read')
+        self.env['school.course'].browse(course_id).check_access('read')
+        rows = {'student_id': [], 'class_id': [], 'status': [], 'display_name': []}
+        for student in students:
+            status = statuses[student.id]
+            rows['student_id'].append(student.id)
+            rows['class_id'].append(student.class_id.id or None)
+            rows['status'].append(status)
+            rows['display_name'].append(
+                f"{student.name} - {date.strftime('%d/%m/%Y')} - {valid_statuses[status]}")
+        
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT id, status FROM school_attendance
+            WHERE student_id = ANY(%s) AND date = %s AND course_id = %s
+        """, [rows['student_id'], date, course_id])
+        previous = dict(self.env.cr.fetchall())
+        self.browse(previous).check_access('write')
+        params = dict(rows, course_id=course_id, schedule_id=schedule_id or None, date=date, uid=self.env.uid)
+        if self._has_unique_index():
+            self.env.cr.execute(UPSERT_QUERY % {'conflict': """
+                ON CONFLICT (student_id, date, course_id) WHERE course_id IS NOT NULL
+                DO UPDATE SET status = EXCLUDED.status,
+                              display_name = EXCLUDED.display_name,
+                              schedule_id = COALESCE(EXCLUDED.schedule_id, school_attendance.schedule_id),
+                              marked_by = EXCLUDED.marked_by,
+                              write_uid = EXCLUDED.write_uid,
+                              write_date = EXCLUDED.write_date
+            """}, params)
+            result = self.env.cr.fetchall()
+        else:
+            result = self._update_then_insert(rows, params)
+        self.invalidate_model()
+        students.invalidate_recordset(['attendance_ids'])
+        self.browse([attendance_id for attendance_id, is_new, _status in result if is_new]).check_access('create')
+        # Mode journal léger: les changements de statut sont consignés en une requête
+        if self.env['school.audit.log']._is_light_mode():
+            self.env['school.audit.log']._insert(self._name, [
+                (attendance_id, 'status', valid_statuses[previous[attendance_id]], valid_statuses[status])
+                for attendance_id, _is_new, status in result
+                if attendance_id in previous and previous[attendance_id] != status
+            ])
+        # Le taux de présence des étudiants concernés est recalculé en une requête groupée
+        self.env.add_to_compute(students._fields['attendance_rate'], students)
+        students.flush_recordset(['attendance_rate'])
+        self.env['school.attendance.report']._trigger_refresh()
+        self.env['school.dashboard']._invalidate_classes(list(set(rows['class_id'])))
+        
+        inserted = sum(1 for _id, is_new, _status in result if is_new)
+        return {
+            'ids': [attendance_id for attendance_id, _is_new, _status in result],
+            'rows': len(result),
+            'inserted': inserted,
+            'updated': len(result) - inserted,
+            'queries': self.env.cr.sql_log_count - queries,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
 
 
 class AttendanceReport(models.Model):
@@ -91,7 +345,7 @@ class AttendanceReport(models.Model):
     _description = 'Rapport de présence'
     _auto = False
     _order = 'date desc'
-
+    
     student_id = fields.Many2one('school.student', string='Étudiant', readonly=True)
     class_id = fields.Many2one('school.class', string='Classe', readonly=True)
     course_id = fields.Many2one('school.course', string='Cours', readonly=True)
@@ -103,13 +357,21 @@ class AttendanceReport(models.Model):
         ('excused', 'Absent justifié'),
     ], string='Statut', readonly=True)
     total = fields.Integer(string='Total', readonly=True)
-
+    
     def init(self):
-        """Vue SQL pour les rapports de présence"""
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW school_attendance_report AS (
+        """Vue matérialisée pour les rapports de présence, avec un id stable
+        (plus petit id du groupe) et des index pour les vues pivot et graphique"""
+        cr = self.env.cr
+        cr.execute("SELECT relkind FROM pg_class WHERE relname = %s", [self._table])
+        kind = cr.fetchone()
+        if kind and kind[0] == 'v':
+            cr.execute("DROP VIEW school_attendance_report")
+        elif kind and kind[0] == 'm':
+            cr.execute("DROP MATERIALIZED VIEW school_attendance_report")
+        cr.execute("""
+            CREATE MATERIALIZED VIEW school_attendance_report AS (
                 SELECT
-                    ROW_NUMBER() OVER (ORDER BY sa.date, sa.student_id) as id,
+                    MIN(sa.id) as id,
                     sa.student_id,
                     sa.class_id,
                     sa.course_id,
@@ -120,3 +382,40 @@ class AttendanceReport(models.Model):
                 GROUP BY sa.student_id, sa.class_id, sa.course_id, sa.date, sa.status
             )
         """)
+        # L'index unique sur id est requis par REFRESH ... CONCURRENTLY
+        cr.execute("CREATE UNIQUE INDEX school_attendance_report_id_idx ON school_attendance_report (id)")
+        cr.execute("""
+            CREATE INDEX school_attendance_report_filter_idx
+            ON school_attendance_report (date, class_id, course_id, student_id)
+        """)
+    
+    @api.model
+    def _refresh(self):
+        """Rafraîchit la vue sans bloquer les lectures des tableaux de bord"""
+        self.env['school.attendance'].flush_model()
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY school_attendance_report")
+        self.invalidate_model()
+    
+    @api.model
+    def _trigger_refresh(self):
+        """Demande un rafraîchissement asynchrone (les demandes rapprochées sont regroupées)"""
+        cron = self.env.ref(REPORT_REFRESH_CRON, raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+    
+    @api.model
+    def action_open_report(self):
+        """Ouvre le rapport avec l'heure de son dernier rafraîchissement dans le titre:
+        les appels saisis depuis n'y figurent qu'après le prochain passage du cron"""
+        action = self.env['ir.actions.act_window']._for_xml_id('school_management.action_school_attendance_report')
+        cron = self.env.ref(REPORT_REFRESH_CRON, raise_if_not_found=False)
+        if not cron or not cron.sudo().lastcall:
+            return action
+        refreshed = fields.Datetime.context_timestamp(self, cron.sudo().lastcall)
+        pending = self.env['ir.cron.trigger'].sudo().search_count([('cron_id', '=', cron.id)], limit=1)
+        action['name'] = (_("%(name)s (données du %(date)s, mise à jour en attente)") if pending
+                          else _("%(name)s (données du %(date)s)")) % {
+            'name': action['name'],
+            'date': refreshed.strftime('%d/%m/%Y %H:%M'),
+        }
+        return action
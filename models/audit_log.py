@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Mode de suivi des notes et présences: 'chatter' (mail.thread) ou 'light' (journal compact)
+AUDIT_MODE_PARAM = 'school_management.audit_mode'
+
+
+class AuditLog(models.Model):
+    _name = 'school.audit.log'
+    _description = 'Journal des modifications'
+    _order = 'id desc'
+    _log_access = False
+    
+    date = fields.Datetime(string='Date', readonly=True, default=fields.Datetime.now)
+    user_id = fields.Many2one('res.users', string='Utilisateur', readonly=True)
+    res_model = fields.Char(string='Modèle', readonly=True, required=True)
+    res_id = fields.Many2oneReference(string='Enregistrement', model_field='res_model', readonly=True, required=True)
+    field_name = fields.Char(string='Champ', readonly=True, required=True)
+    old_value = fields.Char(string='Ancienne valeur', readonly=True)
+    new_value = fields.Char(string='Nouvelle valeur', readonly=True)
+    
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_audit_log_record_idx
+            ON school_audit_log (res_model, res_id, id DESC)
+        """)
+    
+    def write(self, vals):
+        raise UserError(_("Le journal des modifications ne peut pas être modifié."))
+    
+    @api.model
+    def _is_light_mode(self):
+        """Le contexte 'school_audit_mode' prime sur le paramètre système (mesures comparatives)"""
+        mode = self.env.context.get('school_audit_mode') or self.env['ir.config_parameter'].sudo().get_param(
+            AUDIT_MODE_PARAM, 'chatter')
+        return mode == 'light'
+    
+    @api.model
+    def _insert(self, res_model, changes):
+        """Ajoute les lignes [(res_id, champ, ancienne valeur, nouvelle valeur)] en une requête"""
+        if not changes:
+            return
+        res_ids, field_names, old_values, new_values = zip(*changes)
+        self.env.cr.execute("""
+            INSERT INTO school_audit_log (date, user_id, res_model, res_id, field_name, old_value, new_value)
+            SELECT now() AT TIME ZONE 'UTC', %s, %s, t.res_id, t.field_name, t.old_value, t.new_value
+            FROM unnest(%s::int[], %s::varchar[], %s::varchar[], %s::varchar[])
+                 AS t(res_id, field_name, old_value, new_value)
+        """, [self.env.uid, res_model, list(res_ids), list(field_names), list(old_values), list(new_values)])
+    
+    @api.model
+    def action_benchmark(self, count=200):
+        """Compare le coût de saisie et modification de `count` notes en mode chatter et en
+        mode journal léger; tout est annulé ensuite. Le résultat est journalisé et notifié."""
+        if not self.env.user.has_group('school_management.group_school_manager'):
+            raise UserError(_("Seul un responsable peut lancer cette mesure."))
+        student = self.env['school.student'].search([], limit=1)
+        course = self.env['school.course'].search([], limit=1)
+        if not student or not course:
+            raise UserError(_("Il faut au moins un étudiant et un cours pour la mesure."))
+        results = {mode: self._benchmark_mode(mode, student, course, count) for mode in ('chatter', 'light')}
+        _logger.info("Mesure du suivi des notes (%s notes): %s", count, results)
+        message = "\n".join(_(
+            "%(mode)s: %(duration).2f s, %(queries)s requêtes, %(messages)s messages, "
+            "%(tracking)s valeurs suivies, %(audit)s lignes de journal"
+        ) % dict(result, mode=mode) for mode, result in results.items())
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Chatter / journal léger (%s notes)") % count,
+                'message': message,
+                'sticky': True,
+            },
+        }
+    
+    def _benchmark_mode(self, mode, student, course, count):
+        # Curseur séparé, annulé à la fin: le pré-commit exécuté pour la mesure ne lance
+        # pas (pour les annuler ensuite) les rappels en attente de la transaction appelante
+        with self.env.registry.cursor() as cr:
+            Grade = self.env(cr=cr)['school.grade'].with_context(school_audit_mode=mode)
+    
+            def row_counts():
+                cr.execute("""
+                    SELECT (SELECT COUNT(*) FROM mail_message),
+                           (SELECT COUNT(*) FROM mail_tracking_value),
+                           (SELECT COUNT(*) FROM school_audit_log)
+                """)
+                return cr.fetchone()
+    
+            try:
+                before = row_counts()
+                queries = cr.sql_log_count
+                start = time.perf_counter()
+                grades = Grade.create([{
+                    'student_id': student.id,
+                    'course_id': course.id,
+                    'grade': 10.0,
+                    'evaluation_type': 'quiz',
+                    'semester': '1',
+                } for _i in range(count)])
+                for grade in grades:
+                    grade.write({'grade': 12.0, 'evaluation_type': 'homework'})
+                Grade.env.flush_all()
+                # Les valeurs suivies du chatter ne sont écrites qu'au pré-commit
+                cr.precommit.run()
+                duration = time.perf_counter() - start
+                queries = cr.sql_log_count - queries
+                after = row_counts()
+            finally:
+                cr.rollback()
+        return {
+            'duration': duration,
+            'queries': queries,
+            'messages': after[0] - before[0],
+            'tracking': after[1] - before[1],
+            'audit': after[2] - before[2],
+        }
+
+
+class AuditMixin(models.AbstractModel):
+    _name = 'school.audit.mixin'
+    _description = 'Suivi des modifications (chatter ou journal léger)'
+    
+    @api.model
+    def _audit_context(self):
+        """En mode léger, désactive le suivi mail.thread (messages et valeurs suivies)"""
+        if self.env['school.audit.log']._is_light_mode():
+            return self.with_context(tracking_disable=True)
+        return self
+    
+    def _audit_snapshot(self, vals):
+        """Valeurs affichables des champs suivis modifiés par `vals`, avant écriture;
+        None hors mode léger ou si aucun champ suivi n'est concerné"""
+        if not self.env['school.audit.log']._is_light_mode():
+            return None
+        fnames = [fname for fname in vals if getattr(self._fields.get(fname), 'tracking', False)]
+        if not fnames:
+            return None
+        return {record.id: record._audit_values(fnames) for record in self}
+    
+    def _audit_values(self, fnames):
+        values = {}
+        for fname in fnames:
+            field = self._fields[fname]
+            value = self[fname]
+            if field.type == 'many2one':
+                values[fname] = value.display_name or ''
+            elif field.type == 'selection':
+                values[fname] = dict(field._description_selection(self.env)).get(value, '')
+            else:
+                values[fname] = '' if value is False or value is None else str(value)
+        return values
+    
+    def _audit_log_changes(self, snapshot):
+        """Enregistre en une requête les différences depuis `snapshot`"""
+        if not snapshot:
+            return
+        changes = []
+        for record in self:
+            old_values = snapshot[record.id]
+            new_values = record._audit_values(list(old_values))
+            changes += [
+                (record.id, fname, old_values[fname], new_values[fname])
+                for fname in old_values if old_values[fname] != new_values[fname]
+            ]
+        self.env['school.audit.log']._insert(self._name, changes)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _, Command
+from odoo.exceptions import UserError
+
+from .attendance import DUPLICATE_QUERY
+
+_logger = logging.getLogger(__name__)
+
+# Requêtes des chemins chauds: (code, libellé, SQL); les paramètres sont tirés du jeu de données
+HOT_QUERIES = [
+    # Même requête que le contrôle des doublons avant l'appel (Attendance._check_duplicates)
+    ('attendance_duplicate', "Doublons de présence (appel d'une classe)", DUPLICATE_QUERY),
+    ('attendance_rate', "Taux de présence d'une classe", """
+        SELECT student_id, COUNT(*) FILTER (WHERE status = 'present'), COUNT(*)
+        FROM school_attendance
+        WHERE student_id = ANY(%(students)s)
+        GROUP BY student_id
+    """),
+    ('grade_bulletin', "Notes d'un étudiant par semestre et cours", """
+        SELECT course_id, SUM(grade), SUM(max_grade), COUNT(*)
+        FROM school_grade
+        WHERE student_id = %(student)s AND semester = '1'
+        GROUP BY course_id
+    """),
+    ('gradebook', "Carnet de notes d'un cours", """
+        SELECT DISTINCT ON (student_id, evaluation_type) student_id, evaluation_type, id, grade
+        FROM school_grade
+        WHERE course_id = %(course)s AND semester = '1'
+        ORDER BY student_id, evaluation_type, date DESC, id DESC
+    """),
+    ('schedule_conflicts', "Créneaux à contrôler (conflits d'horaire)", """
+        SELECT id, class_id, teacher_id, room_id, day_of_week, start_time, end_time
+        FROM school_schedule
+        WHERE active AND day_of_week = ANY(%(days)s)
+          AND (class_id = ANY(%(classes)s) OR teacher_id = ANY(%(teachers)s) OR room_id = ANY(%(rooms)s))
+    """),
+    ('free_teachers', "Enseignants libres sur un créneau", """
+        SELECT t.id
+        FROM school_teacher t
+        WHERE t.active
+          AND NOT EXISTS (
+              SELECT 1 FROM school_schedule s
+              WHERE s.teacher_id = t.id AND s.active AND s.day_of_week = 'monday'
+                AND s.start_time < 10.0 AND 8.0 < s.end_time
+          )
+    """),
+    ('attendance_report', "Rapport de présence d'une classe sur un mois", """
+        SELECT status, SUM(total)
+        FROM school_attendance_report
+        WHERE class_id = %(class)s AND date BETWEEN %(date_from)s AND %(date_to)s
+        GROUP BY status
+    """),
+]
+
+
+class BenchmarkRun(models.Model):
+    _name = 'school.benchmark.run'
+    _description = 'Mesure des requêtes critiques'
+    _order = 'id desc'
+    
+    name = fields.Char(string='Nom', required=True, default=lambda self: _('Mesure du %s') % fields.Date.today())
+    date = fields.Datetime(string='Date', default=fields.Datetime.now, readonly=True)
+    students = fields.Integer(string="Nombre d'étudiants", default=2000, required=True)
+    repeat = fields.Integer(string='Répétitions par requête', default=20, required=True)
+    seed_duration = fields.Float(string='Durée du jeu de données (s)', readonly=True)
+    dataset = fields.Text(string='Jeu de données', readonly=True)
+    line_ids = fields.One2many('school.benchmark.line', 'run_id', string='Requêtes', readonly=True)
+    
+    def action_run(self):
+        """Crée un jeu de données réaliste dans un point de sauvegarde, relève plan
+        d'exécution (EXPLAIN ANALYZE) et latences de chaque requête, puis annule tout"""
+        self.ensure_one()
+        if self.students <= 0 or self.repeat <= 0:
+            raise UserError(_("Le nombre d'étudiants et de répétitions doivent être positifs."))
+        cr = self.env.cr
+        self.env.flush_all()
+        cr.execute("SAVEPOINT school_benchmark")
+        try:
+            start = time.perf_counter()
+            counts = self._seed_dataset(self.students)
+            seed_duration = time.perf_counter() - start
+            params = self._get_query_params()
+            lines = [self._measure(code, label, query, params) for code, label, query in HOT_QUERIES]
+        finally:
+            cr.execute("ROLLBACK TO SAVEPOINT school_benchmark")
+            self.env.invalidate_all()
+        self.write({
+            'seed_duration': seed_duration,
+            'dataset': "\n".join(f"{table}: {count}" for table, count in counts.items()),
+            'line_ids': [Command.clear()] + [Command.create(line) for line in lines],
+        })
+        _logger.info("Mesure %s: %s", self.name, [(line['code'], line['p95_ms']) for line in lines])
+        return True
+    
+    def _measure(self, code, label, query, params):
+        cr = self.env.cr
+        cr.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+        plan = "\n".join(row[0] for row in cr.fetchall())
+        latencies = []
+        for _i in range(self.repeat):
+            start = time.perf_counter()
+            cr.execute(query, params)
+            rows = len(cr.fetchall())
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        return {
+            'code': code,
+            'name': label,
+            'rows': rows,
+            'avg_ms': sum(latencies) / len(latencies),
+            'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'seq_scan': 'Seq Scan on school_' in plan,
+            'plan': plan,
+        }
+    
+    @api.model
+    def _seed_dataset(self, students):
+        """Jeu de données déterministe du générateur: classes de 30 étudiants, 6 cours par
+        classe, 2 notes par étudiant et par cours, et 10 jours d'appel par cours"""
+        cr = self.env.cr
+        self.env['school.data.generator']._generate(
+            max(1, students // 30), students_per_class=30, courses_per_class=6, grades_per_course=2,
+            attendance_days=10, seed=42, prefix='BENCH', finalize=False,
+        )
+        cr.execute("REFRESH MATERIALIZED VIEW school_attendance_report")
+        counts = {}
+        for table in ('school_class', 'school_teacher', 'school_room', 'school_course', 'school_schedule',
+                      'school_student', 'school_grade', 'school_attendance'):
+            cr.execute(f"ANALYZE {table}")
+            cr.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cr.fetchone()[0]
+        return counts
+    
+    @api.model
+    def _get_query_params(self):
+        """Paramètres représentatifs: une classe du jeu de données, ses étudiants et cours"""
+        cr = self.env.cr
+        cr.execute("SELECT id FROM school_class WHERE code = 'BENCH-1'")
+        class_id = cr.fetchone()[0]
+        cr.execute("SELECT id FROM school_student WHERE class_id = %s ORDER BY id", [class_id])
+        students = [row[0] for row in cr.fetchall()]
+        cr.execute("SELECT id, teacher_id FROM school_course WHERE class_id = %s ORDER BY id", [class_id])
+        courses = cr.fetchall()
+        cr.execute("SELECT DISTINCT room_id FROM school_schedule WHERE class_id = %s", [class_id])
+        rooms = [row[0] for row in cr.fetchall()]
+        today = fields.Date.today()
+        # Appel de la veille pour le premier cours de la classe
+        roll_call = today - timedelta(days=1)
+        return {
+            'class': class_id,
+            'classes': [class_id],
+            'students': students,
+            'student': students[0],
+            'course': courses[0][0],
+            'teachers': list({teacher_id for _course_id, teacher_id in courses}),
+            'rooms': rooms,
+            'days': ['monday', 'tuesday'],
+            'key_student_ids': students,
+            'key_dates': [roll_call] * len(students),
+            'key_course_ids': [courses[0][0]] * len(students),
+            'exclude_ids': [],
+            'date_from': today - timedelta(days=30),
+            'date_to': today,
+        }
+
+
+class BenchmarkLine(models.Model):
+    _name = 'school.benchmark.line'
+    _description = 'Mesure d\'une requête critique'
+    _order = 'run_id, id'
+    
+    run_id = fields.Many2one('school.benchmark.run', string='Mesure', required=True, ondelete='cascade')
+    code = fields.Char(string='Code', required=True)
+    name = fields.Char(string='Requête', required=True)
+    rows = fields.Integer(string='Lignes')
+    avg_ms = fields.Float(string='Moyenne (ms)', digits=(16, 3))
+    p95_ms = fields.Float(string='p95 (ms)', digits=(16, 3))
+    seq_scan = fields.Boolean(string='Parcours séquentiel', help="Le plan lit une table du module en entier")
+    plan = fields.Text(string="Plan d'exécution")
@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
+from odoo.tools import html_escape
+
+from .profiling import profiled
+from ..reports.bulletin_report import BULLETIN_CHUNK_SIZE
+
+# Classes par lot lors d'une reconstruction des moyennes en arrière-plan
+REBUILD_CHUNK_SIZE = 10
 
 
 class ClassLevel(models.Model):
@@ -8,7 +15,7 @@ class ClassLevel(models.Model):
     _description = 'Classe'
     _inherit = ['mail.thread', 'mail.activity.mixin']
     _order = 'name'
-
+    
     name = fields.Char(string='Nom de la classe', required=True, tracking=True)
     code = fields.Char(string='Code', required=True, tracking=True)
     
@@ -39,7 +46,17 @@ class ClassLevel(models.Model):
     
     # Statistiques
     student_count = fields.Integer(string="Nombre d'étudiants", compute='_compute_student_count', store=True)
+    average_grade_sum = fields.Float(string='Somme des moyennes étudiantes', readonly=True, copy=False)
     average_class_grade = fields.Float(string='Moyenne de la classe', compute='_compute_average_class_grade', store=True)
+    grade_revision = fields.Integer(string='Révision des notes', readonly=True, copy=False,
+                                    help="Change à chaque modification des notes; clé du cache des statistiques")
+    kpi_revision = fields.Integer(string='Révision des indicateurs', readonly=True, copy=False,
+                                  help="Change à chaque modification des présences ou de l'effectif; clé du cache du tableau de bord")
+    schedule_revision = fields.Integer(string='Révision des horaires', readonly=True, copy=False,
+                                       help="Change à chaque modification des horaires; clé du cache des grilles hebdomadaires")
+    grade_median = fields.Float(string='Médiane', compute='_compute_grade_statistics')
+    grade_std_dev = fields.Float(string='Écart type', compute='_compute_grade_statistics')
+    grade_statistics_html = fields.Html(string='Statistiques des notes', compute='_compute_grade_statistics')
     
     # Actif
     active = fields.Boolean(string='Actif', default=True)
@@ -48,19 +65,111 @@ class ClassLevel(models.Model):
     notes = fields.Text(string='Notes')
     
     @api.depends('student_ids')
+    @profiled('compute')
     def _compute_student_count(self):
         for record in self:
             record.student_count = len(record.student_ids)
     
-    @api.depends('student_ids.average_grade')
+    @api.depends('average_grade_sum', 'student_count')
+    @profiled('compute')
     def _compute_average_class_grade(self):
         for record in self:
-            if record.student_ids:
-                total = sum(record.student_ids.mapped('average_grade'))
-                record.average_class_grade = total / len(record.student_ids)
+            if record.student_count:
+                record.average_class_grade = record.average_grade_sum / record.student_count
             else:
                 record.average_class_grade = 0.0
     
+    @api.depends('grade_revision')
+    @profiled('compute')
+    def _compute_grade_statistics(self):
+        Statistics = self.env['school.grade.statistics']
+        for record in self:
+            if not record.id:
+                record.grade_median = record.grade_std_dev = 0.0
+                record.grade_statistics_html = False
+                continue
+            stats = Statistics.get_statistics(self._name, record.id)
+            record.grade_median = stats['median']
+            record.grade_std_dev = stats['std']
+            record.grade_statistics_html = record._render_grade_statistics(stats)
+    
+    def _render_grade_statistics(self, stats):
+        """Tableau récapitulatif et classement des étudiants"""
+        students = self.env['school.student'].browse(list(stats['students'])).with_prefetch()
+        names = {student.id: student.name for student in students}
+        ranking = sorted(stats['students'].items(), key=lambda item: item[1]['rank'])
+        histogram = "".join(f"<td>{count}</td>" for _letter, count in stats['histogram'])
+        letters = "".join(f"<th>{letter.upper()}</th>" for letter, _count in stats['histogram'])
+        rows = "".join(
+            f"<tr><td>{values['rank']}</td><td>{html_escape(names.get(student_id, ''))}</td>"
+            f"<td>{values['score']:.2f}</td><td>{values['percentile']:.0f}</td></tr>"
+            for student_id, values in ranking
+        )
+        return _(
+            "<p>%(count)s étudiants notés: moyenne %(mean).2f, médiane %(median).2f, écart type %(std).2f, "
+            "minimum %(min).2f, maximum %(max).2f</p>"
+        ) % stats + (
+            f"<table class='table table-sm'><thead><tr>{letters}</tr></thead><tbody><tr>{histogram}</tr></tbody></table>"
+        ) + _(
+            "<table class='table table-sm'><thead><tr><th>Rang</th><th>Étudiant</th><th>Score (/20)</th>"
+            "<th>Percentile</th></tr></thead><tbody>%s</tbody></table>"
+        ) % rows
+    
+    def _rebuild_grade_totals(self):
+        """Reconstruit la somme des moyennes des étudiants actifs de la classe"""
+        groups = self.env['school.student']._read_group(
+            [('class_id', 'in', self.ids)], ['class_id'], ['average_grade:sum'])
+        totals = {class_level.id: total for class_level, total in groups}
+        for record in self:
+            total = totals.get(record.id, 0.0)
+            if record.average_grade_sum != total:
+                record.write({'average_grade_sum': total})
+    
+    def action_generate_timetable(self):
+        """Ouvre le générateur d'emploi du temps pour les classes sélectionnées"""
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _("Générer l'emploi du temps"),
+            'res_model': 'school.timetable.generator',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_class_ids': self.ids},
+        }
+    
+    def action_print_bulletins(self):
+        """Imprime par lots les bulletins de tous les étudiants des classes sélectionnées;
+        au-delà du seuil, une tâche en arrière-plan produit un PDF par lot"""
+        students = self.env['school.student'].search([('class_id', 'in', self.ids)])
+        Job = self.env['school.job']
+        Report = self.env['report.school_management.report_bulletin']
+        if Job._should_enqueue(len(students)):
+            return Job._enqueue(
+                students, '_job_print_bulletins', _("Bulletins de %s étudiants") % len(students),
+                chunk_size=BULLETIN_CHUNK_SIZE)._action_open()
+        attachment = Report._render_archive(students)
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % attachment.id,
+            'target': 'self',
+        }
+    
+    def action_rebuild_grade_totals(self):
+        """Reconstruction complète des cumuls de notes des classes sélectionnées,
+        en arrière-plan (par lots de classes) au-delà du seuil"""
+        Job = self.env['school.job']
+        if Job._should_enqueue(sum(self.mapped('student_count'))):
+            return Job._enqueue(
+                self, '_job_rebuild_grade_totals', _("Recalcul des moyennes de %s classes") % len(self),
+                chunk_size=REBUILD_CHUNK_SIZE)._action_open()
+        self._job_rebuild_grade_totals()
+    
+    def _job_rebuild_grade_totals(self):
+        students = self.env['school.student'].with_context(active_test=False).search([('class_id', 'in', self.ids)])
+        students._recompute_statistics()
+        self.env['school.grade.summary']._rebuild(students)
+        self.course_ids._rebuild_grade_totals()
+        self._rebuild_grade_totals()
+    
     _sql_constraints = [
         ('code_unique', 'unique(code)', 'Le code de la classe doit être unique!')
     ]
@@ -2,6 +2,8 @@
 
 from odoo import models, fields, api, _
 
+from .profiling import profiled
+
 
 class Course(models.Model):
     _name = 'school.course'
@@ -29,6 +31,10 @@ class Course(models.Model):
     schedule_ids = fields.One2many('school.schedule', 'course_id', string='Emploi du temps')
     
     # Statistiques
+    grade_sum = fields.Float(string='Somme des notes', readonly=True, copy=False)
+    grade_count = fields.Integer(string='Nombre de notes', readonly=True, copy=False)
+    grade_revision = fields.Integer(string='Révision des notes', readonly=True, copy=False,
+                                    help="Change à chaque modification des notes; clé du cache des statistiques")
     average_course_grade = fields.Float(string='Moyenne du cours', compute='_compute_average_course_grade', store=True)
     total_students = fields.Integer(string="Nombre d'étudiants", related='class_id.student_count')
     
@@ -39,14 +45,21 @@ class Course(models.Model):
     # Actif
     active = fields.Boolean(string='Actif', default=True)
     
-    @api.depends('grade_ids.grade')
+    @api.depends('grade_sum', 'grade_count')
+    @profiled('compute')
     def _compute_average_course_grade(self):
         for record in self:
-            if record.grade_ids:
-                total = sum(record.grade_ids.mapped('grade'))
-                record.average_course_grade = total / len(record.grade_ids)
-            else:
-                record.average_course_grade = 0.0
+            record.average_course_grade = record.grade_sum / record.grade_count if record.grade_count else 0.0
+    
+    def _rebuild_grade_totals(self):
+        """Reconstruit les sommes courantes à partir des notes (réparation de dérive)"""
+        groups = self.env['school.grade']._read_group(
+            [('course_id', 'in', self.ids)], ['course_id'], ['grade:sum', '__count'])
+        totals = {course.id: (total, count) for course, total, count in groups}
+        for record in self:
+            total, count = totals.get(record.id, (0.0, 0))
+            if (record.grade_sum, record.grade_count) != (total, count):
+                record.write({'grade_sum': total, 'grade_count': count})
     
     _sql_constraints = [
         ('code_unique', 'unique(code)', 'Le code du cours doit être unique!')
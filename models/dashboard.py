@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.tools import LRU
+
+# Durée de vie (secondes) des indicateurs en cache, par paramètre système
+KPI_CACHE_TTL_PARAM = 'school_management.kpi_cache_ttl'
+KPI_CACHE_TTL = 300
+# Nombre de classes gardées en cache par processus (les moins récemment lues sont évincées)
+KPI_CACHE_SIZE = 512
+# Fenêtre des compteurs de retards et d'absences
+KPI_WINDOW_DAYS = 30
+# Clé de precommit.data: classes dont la révision des indicateurs est à tirer au commit
+PENDING_CLASSES_KEY = 'school.dashboard.pending_classes'
+
+# (base, classe, révision des notes, révision des indicateurs, jour) -> (expiration, indicateurs)
+_kpi_cache = LRU(KPI_CACHE_SIZE)
+
+
+class Dashboard(models.AbstractModel):
+    """Indicateurs par classe et par étudiant pour le tableau de bord, servis en un appel.
+    
+    Les indicateurs d'une classe sont calculés en une requête groupée pour toutes les
+    classes absentes du cache, puis gardés dans un cache LRU par processus avec une durée
+    de vie. La clé inclut les révisions de la classe: grade_revision (notes, déjà tenue
+    par les sommes courantes) et kpi_revision (présences, effectif), tirées d'une séquence,
+    donc toute modification, dans n'importe quel processus, invalide l'entrée.
+    
+    kpi_revision n'est tirée qu'une fois par transaction, au commit: un appel ne verrouille
+    pas la ligne de la classe à chaque présence saisie. D'ici là, les classes modifiées dans
+    la transaction courante sont recalculées sans passer par le cache.
+    """
+    _name = 'school.dashboard'
+    _description = 'Tableau de bord'
+    
+    @api.model
+    def get_kpis(self, class_ids=None, with_students=False):
+        """Indicateurs des classes données (toutes les classes actives par défaut).
+    
+        :return: liste de {'id', 'name', 'capacity', 'headcount', 'occupancy', 'average_grade',
+                 'attendance_rate', 'late_count', 'absence_count'[, 'students']}; chaque
+                 étudiant: {'id', 'name', 'average_grade', 'attendance_rate', 'late_count',
+                 'absence_count'}, taux et compteurs sur les 30 derniers jours
+        """
+        self.env['school.student'].check_access('read')
+        domain = [('id', 'in', class_ids)] if class_ids is not None else []
+        classes = self.env['school.class'].search(domain)
+        today = fields.Date.context_today(self)
+        keys = {
+            record.id: (self.env.cr.dbname, record.id, record.grade_revision, record.kpi_revision, today)
+            for record in classes
+        }
+        pending = self.env.cr.precommit.data.get(PENDING_CLASSES_KEY, set())
+        now = time.monotonic()
+        kpis = {}
+        for class_id, key in keys.items():
+            if class_id in pending:
+                continue
+            entry = _kpi_cache.get(key)
+            if entry and entry[0] > now:
+                kpis[class_id] = entry[1]
+        missing = classes.filtered(lambda record: record.id not in kpis)
+        if missing:
+            ttl = int(self.env['ir.config_parameter'].sudo().get_param(KPI_CACHE_TTL_PARAM, KPI_CACHE_TTL))
+            computed = self._compute_kpis(missing, today)
+            for class_id, values in computed.items():
+                if class_id in pending:
+                    continue
+                _kpi_cache[keys[class_id]] = (now + ttl, values)
+            kpis.update(computed)
+        result = []
+        for record in classes:
+            values = dict(kpis[record.id])
+            if not with_students:
+                values.pop('students')
+            result.append(values)
+        return result
+    
+    @api.model
+    def _compute_kpis(self, classes, today):
+        self.env['school.student'].flush_model(['class_id', 'active', 'name', 'average_grade', 'grade_count'])
+        self.env['school.attendance'].flush_model(['student_id', 'date', 'status'])
+        classes.flush_recordset(['name', 'capacity'])
+        self.env.cr.execute("""
+            SELECT s.id, s.class_id, s.name, s.average_grade, s.grade_count,
+                   COUNT(a.id) FILTER (WHERE a.status = 'present') AS present,
+                   COUNT(a.id) FILTER (WHERE a.status = 'late') AS late,
+                   COUNT(a.id) FILTER (WHERE a.status IN ('absent', 'excused')) AS absent,
+                   COUNT(a.id) AS total
+            FROM school_student s
+            LEFT JOIN school_attendance a ON a.student_id = s.id AND a.date > %s AND a.date <= %s
+            WHERE s.active AND s.class_id = ANY(%s)
+            GROUP BY s.id
+            ORDER BY s.name, s.id
+        """, [today - timedelta(days=KPI_WINDOW_DAYS), today, classes.ids])
+        students = {record.id: [] for record in classes}
+        for row in self.env.cr.dictfetchall():
+            students[row['class_id']].append(row)
+        kpis = {}
+        for record in classes:
+            rows = students[record.id]
+            graded = [row['average_grade'] for row in rows if row['grade_count']]
+            present = sum(row['present'] for row in rows)
+            total = sum(row['total'] for row in rows)
+            kpis[record.id] = {
+                'id': record.id,
+                'name': record.name,
+                'capacity': record.capacity,
+                'headcount': len(rows),
+                'occupancy': len(rows) * 100.0 / record.capacity if record.capacity else 0.0,
+                'average_grade': sum(graded) / len(graded) if graded else 0.0,
+                'attendance_rate': present * 100.0 / total if total else 0.0,
+                'late_count': sum(row['late'] for row in rows),
+                'absence_count': sum(row['absent'] for row in rows),
+                'students': [{
+                    'id': row['id'],
+                    'name': row['name'],
+                    'average_grade': row['average_grade'] or 0.0,
+                    'attendance_rate': row['present'] * 100.0 / row['total'] if row['total'] else 0.0,
+                    'late_count': row['late'],
+                    'absence_count': row['absent'],
+                } for row in rows],
+            }
+        return kpis
+    
+    @api.model
+    def _invalidate_classes(self, class_ids):
+        """Nouvelle révision des indicateurs des classes (présences, effectif modifiés),
+        tirée une seule fois au commit de la transaction pour toutes les classes collectées"""
+        class_ids = {class_id for class_id in class_ids if class_id}
+        if not class_ids:
+            return
+        pending = self.env.cr.precommit.data.setdefault(PENDING_CLASSES_KEY, set())
+        if not pending:
+            self.env.cr.precommit.add(self._bump_pending_classes)
+        pending.update(class_ids)
+    
+    def _bump_pending_classes(self):
+        class_ids = self.env.cr.precommit.data.pop(PENDING_CLASSES_KEY, set())
+        if class_ids:
+            self.env['school.grade.statistics'].sudo()._bump_revision(
+                'school.class', sorted(class_ids), 'kpi_revision')
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from .grade_summary import _letter_sql
+
+_logger = logging.getLogger(__name__)
+
+FIRST_NAMES = [
+    'Adam', 'Alice', 'Amine', 'Anaïs', 'Bastien', 'Camille', 'Chloé', 'Clément', 'Élodie', 'Emma',
+    'Étienne', 'Fatima', 'Hélène', 'Hugo', 'Inès', 'Jérôme', 'Léa', 'Louis', 'Lucas', 'Manon',
+    'Mathis', 'Mélanie', 'Nathan', 'Noémie', 'Océane', 'Rayan', 'Salomé', 'Sami', 'Théo', 'Yasmine',
+]
+LAST_NAMES = [
+    'Benali', 'Bernard', 'Bonnet', 'Chevalier', 'Dubois', 'Durand', 'Faure', 'François', 'Garnier',
+    'Girard', 'Haddad', 'Lambert', 'Laurent', 'Lefèvre', 'Leroy', 'Martin', 'Mercier', 'Moreau',
+    'Morel', 'Petit', 'Renaud', 'Robert', 'Roux', 'Simon', 'Thomas', 'Vincent', 'Zidane',
+]
+SUBJECTS = [
+    'Mathématiques', 'Français', 'Histoire-Géographie', 'Physique-Chimie', 'Sciences de la vie',
+    'Anglais', 'Espagnol', 'Philosophie', 'Éducation physique', 'Informatique', 'Économie',
+    'Arts plastiques', 'Musique',
+]
+EVALUATION_TYPES = ['homework', 'quiz', 'midterm', 'final', 'project', 'presentation', 'participation']
+# Trois séances d'une heure par cours sur une grille de 5 jours x 8 heures
+SESSIONS_PER_COURSE = 3
+MAX_COURSES_PER_CLASS = 5 * 8 // SESSIONS_PER_COURSE
+
+
+class DataGenerator(models.TransientModel):
+    _name = 'school.data.generator'
+    _description = 'Générateur de données de test'
+    
+    prefix = fields.Char(string='Préfixe des codes', required=True, default='GEN',
+                         help="Préfixe des codes de classes, salles et matricules générés")
+    seed = fields.Integer(string='Graine', default=42, required=True,
+                          help="Même graine et mêmes paramètres: mêmes données")
+    classes = fields.Integer(string='Classes', default=20, required=True)
+    students_per_class = fields.Integer(string='Étudiants par classe', default=30, required=True)
+    courses_per_class = fields.Integer(string='Cours par classe', default=6, required=True)
+    grades_per_course = fields.Integer(string='Notes par étudiant et par cours', default=4, required=True)
+    attendance_days = fields.Integer(string="Jours d'appel par cours", default=20, required=True)
+    chunk_size = fields.Integer(string='Classes par lot', default=200, required=True)
+    repeat = fields.Integer(string='Répétitions des tests de charge', default=5, required=True)
+    result = fields.Text(string='Résultat', readonly=True)
+    
+    def action_generate(self):
+        self.ensure_one()
+        start = time.perf_counter()
+        counts = self._generate(
+            self.classes, self.students_per_class, self.courses_per_class, self.grades_per_course,
+            self.attendance_days, seed=self.seed, prefix=self.prefix, chunk_size=self.chunk_size,
+        )
+        self.result = _("Généré en %.1f s:\n") % (time.perf_counter() - start) + "\n".join(
+            f"{table}: {count}" for table, count in counts.items())
+        return self._reopen()
+    
+    def action_run_load_tests(self):
+        self.ensure_one()
+        results = self.env['school.load.test'].run(repeat=self.repeat)
+        attachment = self.env['school.load.test']._save_results(results)
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % attachment.id,
+            'target': 'self',
+        }
+    
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+    
+    @api.model
+    def _generate(self, classes, students_per_class=30, courses_per_class=6, grades_per_course=2,
+                  attendance_days=10, seed=42, prefix='GEN', chunk_size=200, finalize=True):
+        """Insère un jeu de données déterministe en SQL ensembliste, par lots de classes.
+    
+        Chaque classe a sa salle, deux enseignants, `courses_per_class` cours de trois
+        séances sans chevauchement, ses étudiants, leurs notes et leurs présences.
+        Avec `finalize`, les cumuls (moyennes, résultats, taux de présence, âges, effectifs)
+        et le rapport de présence sont reconstruits ensuite, en SQL également.
+    
+        :return: nombre de lignes insérées par table
+        """
+        if not re.fullmatch(r'[A-Za-z0-9]+', prefix or ''):
+            raise UserError(_("Le préfixe ne peut contenir que des lettres et des chiffres."))
+        if min(classes, students_per_class, courses_per_class, chunk_size) <= 0 \
+                or min(grades_per_course, attendance_days) < 0:
+            raise UserError(_("Les volumes demandés doivent être positifs."))
+        if courses_per_class > MAX_COURSES_PER_CLASS:
+            raise UserError(_("Au plus %s cours par classe tiennent dans la grille hebdomadaire.")
+                            % MAX_COURSES_PER_CLASS)
+        cr = self.env.cr
+        self.env.flush_all()
+        cr.execute("SELECT 1 FROM school_class WHERE code LIKE %s LIMIT 1", [prefix + '-%'])
+        if cr.fetchone():
+            raise UserError(_("Des données de préfixe %s existent déjà.") % prefix)
+    
+        today = fields.Date.today()
+        weekdays = []
+        day = today
+        while len(weekdays) < attendance_days:
+            day -= timedelta(days=1)
+            if day.weekday() < 5:
+                weekdays.append(day)
+        params = {
+            'uid': self.env.uid,
+            'prefix': prefix + '-',
+            'classes': classes,
+            'students': students_per_class,
+            'courses': courses_per_class,
+            'grades': grades_per_course,
+            'today': today,
+            'dates': weekdays,
+            'first_names': FIRST_NAMES,
+            'last_names': LAST_NAMES,
+            'subjects': SUBJECTS,
+            'evaluation_types': EVALUATION_TYPES,
+        }
+        stamps = "%(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'"
+        person = ("(%(first_names)s::varchar[])[1 + floor(random() * array_length(%(first_names)s::varchar[], 1))::int]"
+                  " || ' ' || (%(last_names)s::varchar[])[1 + floor(random() * array_length(%(last_names)s::varchar[], 1))::int]")
+        counts = dict.fromkeys(['school_class', 'school_room', 'school_teacher', 'school_student',
+                                'school_course', 'school_schedule', 'school_grade', 'school_attendance'], 0)
+    
+        cr.execute("SELECT setseed(%s)", [(seed % 2001) / 1000.0 - 1])
+        cr.execute(f"""
+            INSERT INTO school_class (name, code, level, capacity, active, student_count, average_grade_sum,
+                                      average_class_grade, grade_revision, create_uid, write_uid, create_date, write_date)
+            SELECT 'Classe ' || %(prefix)s || i, %(prefix)s || i, (1 + (i - 1) %% 6)::varchar,
+                   %(students)s + 5, TRUE, 0, 0, 0, 0, {stamps}
+            FROM generate_series(1, %(classes)s) i
+        """, params)
+        counts['school_class'] = cr.rowcount
+        cr.execute(f"""
+            INSERT INTO school_room (name, code, capacity, room_type, active,
+                                     create_uid, write_uid, create_date, write_date)
+            SELECT 'Salle ' || %(prefix)s || i, %(prefix)s || i, %(students)s + 5, 'classroom', TRUE, {stamps}
+            FROM generate_series(1, %(classes)s) i
+        """, params)
+        counts['school_room'] = cr.rowcount
+        cr.execute(f"""
+            INSERT INTO school_teacher (name, employee_number, email, status, active,
+                                        create_uid, write_uid, create_date, write_date)
+            SELECT {person}, %(prefix)s || i, lower(%(prefix)s) || 'teacher' || i || '@example.com',
+                   'active', TRUE, {stamps}
+            FROM generate_series(1, %(classes)s * 2) i
+        """, params)
+        counts['school_teacher'] = cr.rowcount
+        # Correspondance rang -> id, pour relier les lignes générées entre elles
+        for name, table, column in (
+            ('class', 'school_class', 'code'),
+            ('room', 'school_room', 'code'),
+            ('teacher', 'school_teacher', 'employee_number'),
+        ):
+            cr.execute(f"DROP TABLE IF EXISTS school_generator_{name}")
+            cr.execute(f"""
+                CREATE TEMPORARY TABLE school_generator_{name} ON COMMIT DROP AS
+                SELECT id, substring({column} FROM length(%(prefix)s) + 1)::int AS rank
+                FROM {table}
+                WHERE {column} ~ ('^' || %(prefix)s || '[0-9]+$')
+            """, params)
+            cr.execute(f"CREATE INDEX ON school_generator_{name} (rank)")
+    
+        for first in range(1, classes + 1, chunk_size):
+            chunk = dict(params, first=first, last=min(classes, first + chunk_size - 1))
+            in_chunk = "c.rank BETWEEN %(first)s AND %(last)s"
+            cr.execute(f"""
+                INSERT INTO school_student (name, registration_number, class_id, status, active, gender,
+                                            date_of_birth, admission_date, email,
+                                            create_uid, write_uid, create_date, write_date)
+                SELECT {person}, %(prefix)s || 'S' || ((c.rank - 1) * %(students)s + j), c.id, 'active', TRUE,
+                       (ARRAY['male', 'female'])[1 + (j %% 2)],
+                       DATE '2004-01-01' + (random() * 4000)::int, %(today)s,
+                       lower(%(prefix)s) || '.student' || ((c.rank - 1) * %(students)s + j) || '@example.com',
+                       {stamps}
+                FROM school_generator_class c
+                CROSS JOIN generate_series(1, %(students)s) j
+                WHERE {in_chunk}
+            """, chunk)
+            counts['school_student'] += cr.rowcount
+            cr.execute(f"""
+                INSERT INTO school_course (name, code, class_id, teacher_id, credits, hours_per_week, active,
+                                           grade_sum, grade_count, grade_revision, average_course_grade,
+                                           create_uid, write_uid, create_date, write_date)
+                SELECT (%(subjects)s::varchar[])[1 + k %% array_length(%(subjects)s::varchar[], 1)] || ' ' || c.rank,
+                       %(prefix)s || c.rank || '-' || k, c.id, t.id, 1 + k %% 4, {SESSIONS_PER_COURSE}, TRUE,
+                       0, 0, 0, 0, {stamps}
+                FROM school_generator_class c
+                CROSS JOIN generate_series(0, %(courses)s - 1) k
+                JOIN school_generator_teacher t ON t.rank = (c.rank - 1) * 2 + 1 + k %% 2
+                WHERE {in_chunk}
+            """, chunk)
+            counts['school_course'] += cr.rowcount
+            # Créneau = rang du cours dans la classe x 3 + séance: aucun chevauchement de classe,
+            # d'enseignant (propre à la classe) ni de salle
+            cr.execute(f"""
+                INSERT INTO school_schedule (class_id, course_id, teacher_id, room_id, day_of_week,
+                                             start_time, end_time, duration, start_date, session_type, active,
+                                             create_uid, write_uid, create_date, write_date)
+                SELECT co.class_id, co.id, co.teacher_id, r.id,
+                       (ARRAY['monday', 'tuesday', 'wednesday', 'thursday', 'friday'])[1 + s.slot / 8],
+                       8 + s.slot %% 8, 9 + s.slot %% 8, 1, %(today)s, 'lecture', TRUE, {stamps}
+                FROM school_course co
+                JOIN school_generator_class c ON c.id = co.class_id
+                JOIN school_generator_room r ON r.rank = c.rank
+                CROSS JOIN LATERAL (
+                    SELECT split_part(co.code, '-', 3)::int * {SESSIONS_PER_COURSE} + n AS slot
+                    FROM generate_series(0, {SESSIONS_PER_COURSE} - 1) n
+                ) s
+                WHERE {in_chunk}
+            """, chunk)
+            counts['school_schedule'] += cr.rowcount
+            # Niveau propre à chaque étudiant (dérivé du matricule) et variation par note
+            value = ("LEAST(20, GREATEST(0, round(((6 + (abs(hashtext(st.registration_number)) %% 1000) / 100.0)"
+                     " + (random() - 0.5) * 6)::numeric * 4) / 4))::float")
+            cr.execute(f"""
+                INSERT INTO school_grade (student_id, course_id, grade, max_grade, evaluation_type, date, semester,
+                                          percentage, grade_letter, create_uid, write_uid, create_date, write_date)
+                SELECT g.student_id, g.course_id, g.value, 20, g.evaluation_type, g.date, g.semester,
+                       g.value * 5, {_letter_sql('g.value * 5')}, {stamps}
+                FROM (
+                    SELECT st.id AS student_id, co.id AS course_id, {value} AS value,
+                           (%(evaluation_types)s::varchar[])[1 + n %% array_length(%(evaluation_types)s::varchar[], 1)]
+                               AS evaluation_type,
+                           %(today)s - (%(grades)s - n) * 7 AS date,
+                           CASE WHEN n < GREATEST(%(grades)s / 2, 1) THEN '1' ELSE '2' END AS semester
+                    FROM school_generator_class c
+                    JOIN school_student st ON st.class_id = c.id
+                    JOIN school_course co ON co.class_id = c.id
+                    CROSS JOIN generate_series(0, %(grades)s - 1) n
+                    WHERE {in_chunk}
+                ) g
+            """, chunk)
+            counts['school_grade'] += cr.rowcount
+            cr.execute(f"""
+                INSERT INTO school_attendance (student_id, class_id, course_id, date, status, display_name,
+                                               marked_by, create_uid, write_uid, create_date, write_date)
+                SELECT a.student_id, a.class_id, a.course_id, a.date, a.status,
+                       a.name || ' - ' || to_char(a.date, 'DD/MM/YYYY') || ' - ' || CASE a.status
+                           WHEN 'present' THEN 'Présent' WHEN 'late' THEN 'En retard'
+                           WHEN 'excused' THEN 'Absent justifié' ELSE 'Absent' END,
+                       %(uid)s, {stamps}
+                FROM (
+                    SELECT r.*, CASE WHEN r.draw < 0.88 THEN 'present' WHEN r.draw < 0.94 THEN 'late'
+                                     WHEN r.draw < 0.97 THEN 'excused' ELSE 'absent' END AS status
+                    FROM (
+                        SELECT st.id AS student_id, st.class_id, st.name, co.id AS course_id, d.date,
+                               random() AS draw
+                        FROM school_generator_class c
+                        JOIN school_student st ON st.class_id = c.id
+                        JOIN school_course co ON co.class_id = c.id
+                        CROSS JOIN unnest(%(dates)s::date[]) d(date)
+                        WHERE {in_chunk}
+                    ) r
+                ) a
+            """, chunk)
+            counts['school_attendance'] += cr.rowcount
+            _logger.info("Données de test %s: classes %s-%s sur %s insérées",
+                         prefix, chunk['first'], chunk['last'], classes)
+    
+        self.env.invalidate_all()
+        # Grilles d'emploi du temps en cache (horaires insérés en SQL)
+        for name, model in (('class', 'school.class'), ('teacher', 'school.teacher'), ('room', 'school.room')):
+            cr.execute(f"SELECT id FROM school_generator_{name}")
+            self.env['school.grade.statistics']._bump_revision(
+                model, [row[0] for row in cr.fetchall()], 'schedule_revision')
+        if finalize:
+            self._finalize(prefix)
+        return counts
+    
+    @api.model
+    def _finalize(self, prefix):
+        """Reconstruit en SQL les champs calculés et cumuls des données générées"""
+        cr = self.env.cr
+        classes = self.env['school.class'].with_context(active_test=False).search([('code', '=like', prefix + '-%')])
+        cr.execute("""
+            UPDATE school_class c
+            SET student_count = (SELECT COUNT(*) FROM school_student s WHERE s.class_id = c.id)
+            WHERE c.id = ANY(%s)
+        """, [classes.ids])
+        cr.execute("""
+            UPDATE school_student
+            SET age = date_part('year', age(%s, date_of_birth))::int
+            WHERE class_id = ANY(%s)
+        """, [fields.Date.today(), classes.ids])
+        self.env.invalidate_all()
+        students = self.env['school.student'].with_context(active_test=False).search([('class_id', 'in', classes.ids)])
+        students._recompute_statistics()
+        self.env['school.grade.summary']._rebuild(students)
+        classes._rebuild_grade_totals()
+        classes.course_ids._rebuild_grade_totals()
+        Statistics = self.env['school.grade.statistics']
+        Statistics._bump_revision('school.class', classes.ids)
+        Statistics._bump_revision('school.course', classes.course_ids.ids)
+        self.env['school.attendance.report']._refresh()
@@ -1,15 +1,42 @@
 # -*- coding: utf-8 -*-
 
+import time
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .profiling import profiled
+
+# Champs dont la modification impacte les sommes courantes (étudiant, cours, classe, résultats)
+RUNNING_TOTAL_FIELDS = {'grade', 'max_grade', 'semester', 'student_id', 'course_id'}
+
+# Seuils (pourcentage minimal, lettre), du meilleur au moins bon; en dessous: 'f'
+GRADE_LETTER_THRESHOLDS = [
+    (95, 'a+'),
+    (90, 'a'),
+    (85, 'b+'),
+    (80, 'b'),
+    (75, 'c+'),
+    (70, 'c'),
+    (60, 'd'),
+]
+
+
+def grade_letter(percentage):
+    """Lettre correspondant à un pourcentage"""
+    for threshold, letter in GRADE_LETTER_THRESHOLDS:
+        if percentage >= threshold:
+            return letter
+    return 'f'
+
 
 class Grade(models.Model):
     _name = 'school.grade'
     _description = 'Note'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'school.audit.mixin']
     _order = 'date desc'
-
+    
     # Relations
     student_id = fields.Many2one('school.student', string='Étudiant', required=True, tracking=True)
     course_id = fields.Many2one('school.course', string='Cours', required=True, tracking=True)
@@ -56,6 +83,7 @@ class Grade(models.Model):
     graded_by = fields.Many2one('school.teacher', string='Noté par', default=lambda self: self._get_default_teacher())
     
     @api.depends('grade', 'max_grade')
+    @profiled('compute')
     def _compute_percentage(self):
         for record in self:
             if record.max_grade > 0:
@@ -64,31 +92,295 @@ class Grade(models.Model):
                 record.percentage = 0.0
     
     @api.depends('percentage')
+    @profiled('compute')
     def _compute_grade_letter(self):
         for record in self:
-            percentage = record.percentage
-            if percentage >= 95:
-                record.grade_letter = 'a+'
-            elif percentage >= 90:
-                record.grade_letter = 'a'
-            elif percentage >= 85:
-                record.grade_letter = 'b+'
-            elif percentage >= 80:
-                record.grade_letter = 'b'
-            elif percentage >= 75:
-                record.grade_letter = 'c+'
-            elif percentage >= 70:
-                record.grade_letter = 'c'
-            elif percentage >= 60:
-                record.grade_letter = 'd'
-            else:
-                record.grade_letter = 'f'
+            record.grade_letter = grade_letter(record.percentage)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        grades = super(Grade, self._audit_context()).create(vals_list)
+        self._apply_running_totals(grades._get_running_deltas(1))
+        return grades.with_env(self.env)
+    
+    def write(self, vals):
+        records = self._audit_context()
+        snapshot = records._audit_snapshot(vals)
+        if not RUNNING_TOTAL_FIELDS & vals.keys():
+            res = super(Grade, records).write(vals)
+            records._audit_log_changes(snapshot)
+            return res
+        deltas = records._get_running_deltas(-1)
+        res = super(Grade, records).write(vals)
+        records._get_running_deltas(1, deltas)
+        records._apply_running_totals(deltas)
+        records._audit_log_changes(snapshot)
+        return res
+    
+    def unlink(self):
+        deltas = self._get_running_deltas(-1)
+        res = super(Grade, self).unlink()
+        self._apply_running_totals(deltas)
+        return res
+    
+    @api.model
+    def _create_batch(self, vals_list):
+        """Création sans cumuls ni journal, appliqués en une passe par l'appelant
+        (carnet de notes); méthode privée, non exposée aux appels RPC"""
+        return super(Grade, self).create(vals_list)
+    
+    def _write_batch(self, vals):
+        """Modification sans cumuls ni journal, voir _create_batch()"""
+        return super(Grade, self).write(vals)
+    
+    def init(self):
+        """Initialise les sommes courantes à partir des notes existantes.
+        Placé sur school.grade, chargé après les étudiants, cours et classes."""
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS school_grade_revision_seq")
+        # Bulletins et résultats (étudiant, semestre, cours); carnet de notes et statistiques (cours, semestre)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_grade_student_semester_course_idx
+            ON school_grade (student_id, semester, course_id)
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_grade_course_semester_student_idx
+            ON school_grade (course_id, semester, student_id)
+        """)
+        self.env.cr.execute("""
+            UPDATE school_student s
+            SET grade_sum = g.total, grade_count = g.count
+            FROM (
+                SELECT student_id, SUM(grade) AS total, COUNT(*) AS count
+                FROM school_grade
+                GROUP BY student_id
+            ) g
+            WHERE s.id = g.student_id
+              AND (s.grade_count IS DISTINCT FROM g.count OR s.grade_sum IS DISTINCT FROM g.total)
+        """)
+        self.env.cr.execute("""
+            UPDATE school_course c
+            SET grade_sum = g.total, grade_count = g.count
+            FROM (
+                SELECT course_id, SUM(grade) AS total, COUNT(*) AS count
+                FROM school_grade
+                GROUP BY course_id
+            ) g
+            WHERE c.id = g.course_id
+              AND (c.grade_count IS DISTINCT FROM g.count OR c.grade_sum IS DISTINCT FROM g.total)
+        """)
+        self.env.cr.execute("""
+            UPDATE school_class c
+            SET average_grade_sum = s.total
+            FROM (
+                SELECT class_id, SUM(average_grade) AS total
+                FROM school_student
+                WHERE active AND class_id IS NOT NULL
+                GROUP BY class_id
+            ) s
+            WHERE c.id = s.class_id AND c.average_grade_sum IS DISTINCT FROM s.total
+        """)
+    
+    def _get_running_deltas(self, sign, deltas=None):
+        """Contribution de ces notes aux étudiants et aux cours (somme, nombre)
+        et aux résultats (étudiant, cours, semestre) (somme, nombre, somme des maxima)"""
+        if deltas is None:
+            deltas = {
+                'school.student': defaultdict(lambda: [0.0, 0]),
+                'school.course': defaultdict(lambda: [0.0, 0]),
+                'school.grade.summary': defaultdict(lambda: [0.0, 0, 0.0]),
+            }
+        for record in self:
+            for model, target in (('school.student', record.student_id), ('school.course', record.course_id)):
+                if target:
+                    deltas[model][target.id][0] += sign * record.grade
+                    deltas[model][target.id][1] += sign
+            if record.student_id and record.course_id and record.semester:
+                summary = deltas['school.grade.summary'][(record.student_id.id, record.course_id.id, record.semester)]
+                summary[0] += sign * record.grade
+                summary[1] += sign
+                summary[2] += sign * record.max_grade
+        return deltas
+    
+    @api.model
+    def _apply_running_totals(self, deltas):
+        """Applique les deltas en O(1) par étudiant, cours et classe touchés,
+        sans relire les autres notes ni les autres étudiants.
+        Chaque delta est ajouté en une instruction atomique (SET x = x + delta): deux
+        saisies concurrentes sur le même cours ou la même classe ne perdent aucune mise
+        à jour. En SQL, donc sans les droits d'un enseignant qui note sur les étudiants
+        et classes."""
+        cr = self.env.cr
+        Student, Course, Class = (self.env[model] for model in ('school.student', 'school.course', 'school.class'))
+        Student.flush_model(['grade_sum', 'grade_count', 'average_grade', 'class_id', 'active'])
+        Course.flush_model(['grade_sum', 'grade_count', 'average_course_grade'])
+        Class.flush_model(['average_grade_sum', 'student_count', 'average_class_grade'])
+        class_deltas = defaultdict(float)
+        for Model, average in ((Student, 'average_grade'), (Course, 'average_course_grade')):
+            rows = [(target_id, total, count) for target_id, (total, count) in deltas[Model._name].items()
+                    if total or count]
+            if not rows:
+                continue
+            extra = ", t.class_id, t.active" if Model is Student else ""
+            # Remise à zéro exacte quand la dernière note disparaît
+            cr.execute(f"""
+                UPDATE {Model._table} t
+                SET grade_count = COALESCE(t.grade_count, 0) + d.count,
+                    grade_sum = CASE WHEN COALESCE(t.grade_count, 0) + d.count = 0 THEN 0
+                                     ELSE COALESCE(t.grade_sum, 0) + d.total END,
+                    {average} = CASE WHEN COALESCE(t.grade_count, 0) + d.count = 0 THEN 0
+                                     ELSE (COALESCE(t.grade_sum, 0) + d.total) / (COALESCE(t.grade_count, 0) + d.count) END
+                FROM unnest(%s::int[], %s::float8[], %s::int[]) AS d(id, total, count)
+                WHERE t.id = d.id
+                RETURNING t.id, t.grade_sum, t.grade_count{extra}
+            """, [[row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]])
+            Model.invalidate_model(['grade_sum', 'grade_count', average])
+            if Model is not Student:
+                continue
+            # Variation de la moyenne de chaque étudiant, déduite des valeurs écrites
+            for student_id, grade_sum, grade_count, class_id, active in cr.fetchall():
+                total, count = deltas[Model._name][student_id]
+                old_count = grade_count - count
+                old_average = (grade_sum - total) / old_count if old_count else 0.0
+                new_average = grade_sum / grade_count if grade_count else 0.0
+                if active and class_id:
+                    class_deltas[class_id] += new_average - old_average
+        class_deltas = {class_id: delta for class_id, delta in class_deltas.items() if delta}
+        if class_deltas:
+            cr.execute("""
+                UPDATE school_class c
+                SET average_grade_sum = COALESCE(c.average_grade_sum, 0) + d.delta,
+                    average_class_grade = CASE WHEN c.student_count > 0
+                                               THEN (COALESCE(c.average_grade_sum, 0) + d.delta) / c.student_count
+                                               ELSE 0 END
+                FROM unnest(%s::int[], %s::float8[]) AS d(id, delta)
+                WHERE c.id = d.id
+            """, [list(class_deltas), list(class_deltas.values())])
+            Class.invalidate_model(['average_grade_sum', 'average_class_grade'])
+        self.env['school.grade.summary'].sudo()._apply_deltas(deltas['school.grade.summary'])
+        # Les statistiques en cache des classes et cours touchés sont périmées, même à
+        # sommes inchangées (note maximale, semestre)
+        Statistics = self.env['school.grade.statistics']
+        students = self.env['school.student'].sudo().with_context(active_test=False).browse(
+            list(deltas['school.student']))
+        Statistics._bump_revision('school.class', students.class_id.ids)
+        Statistics._bump_revision('school.course', list(deltas['school.course']))
+    
+    @api.model
+    def get_gradebook(self, course_id, semester):
+        """Carnet de notes d'un cours pour un semestre, lu en une requête.
+        
+        Les lignes sont les étudiants actifs de la classe du cours (et ceux qui ont déjà
+        une note dans ce cours), les colonnes les types d'évaluation; pour chaque case,
+        la note la plus récente.
+        
+        :return: {'students': [{'id', 'name', 'registration_number'}],
+                  'cells': {student_id: {evaluation_type: {'id', 'grade', 'max_grade'}}}}
+        """
+        self.check_access('read')
+        course = self.env['school.course'].browse(course_id)
+        course.check_access('read')
+        self.flush_model(['student_id', 'course_id', 'semester', 'evaluation_type', 'grade', 'max_grade', 'date'])
+        self.env['school.student'].flush_model(['name', 'registration_number', 'class_id', 'active'])
+        self.env.cr.execute("""
+            SELECT s.id, s.name, s.registration_number, g.evaluation_type, g.id, g.grade, g.max_grade
+            FROM school_student s
+            LEFT JOIN (
+                SELECT DISTINCT ON (student_id, evaluation_type)
+                       student_id, evaluation_type, id, grade, max_grade
+                FROM school_grade
+                WHERE course_id = %(course_id)s AND semester = %(semester)s
+                ORDER BY student_id, evaluation_type, date DESC, id DESC
+            ) g ON g.student_id = s.id
+            WHERE (s.active AND s.class_id = %(class_id)s) OR g.id IS NOT NULL
+            ORDER BY s.name, s.id
+        """, {'course_id': course.id, 'semester': semester, 'class_id': course.class_id.id})
+        students, cells = [], {}
+        for student_id, name, number, evaluation_type, grade_id, grade, max_grade in self.env.cr.fetchall():
+            if student_id not in cells:
+                students.append({'id': student_id, 'name': name, 'registration_number': number})
+                cells[student_id] = {}
+            if grade_id:
+                cells[student_id][evaluation_type] = {'id': grade_id, 'grade': grade, 'max_grade': max_grade}
+        return {'students': students, 'cells': cells}
+    
+    @api.model
+    def save_gradebook(self, course_id, semester, cells, date=None, max_grade=20.0):
+        """Enregistre en un lot les cases modifiées d'un carnet de notes.
+        
+        Les notes sont créées en un seul create() et modifiées par valeur; les cumuls
+        (étudiants, cours, classes, résultats) sont appliqués en une passe. Le suivi suit
+        le mode configuré: chatter (valeurs suivies de mail.thread) ou journal léger
+        (changements consignés en une requête, sans chatter).
+        
+        :param cells: liste de {'student_id', 'evaluation_type', 'grade'};
+                      une case sans note ('grade' vide) est ignorée
+        :return: compteurs (notes créées, modifiées, requêtes, durée en ms)
+        """
+        start = time.perf_counter()
+        queries = self.env.cr.sql_log_count
+        self.check_access('create')
+        self.check_access('write')
+        current = self.get_gradebook(course_id, semester)['cells']
+        evaluation_types = dict(self._fields['evaluation_type'].selection)
+        
+        to_create, to_write, changes = [], defaultdict(list), []
+        for cell in cells:
+            student_id, evaluation_type = int(cell['student_id']), cell['evaluation_type']
+            if cell.get('grade') is None or cell.get('grade') is False:
+                continue
+            if student_id not in current:
+                raise ValidationError(_("L'étudiant %s ne fait pas partie de ce carnet de notes.") % student_id)
+            if evaluation_type not in evaluation_types:
+                raise ValidationError(_("Type d'évaluation inconnu: %s.") % evaluation_type)
+            value = float(cell['grade'])
+            existing = current[student_id].get(evaluation_type)
+            if existing and existing['grade'] != value:
+                to_write[value].append(existing['id'])
+                changes.append((existing['id'], 'grade', str(existing['grade']), str(value)))
+            elif not existing:
+                to_create.append({
+                    'student_id': student_id,
+                    'course_id': course_id,
+                    'semester': semester,
+                    'evaluation_type': evaluation_type,
+                    'grade': value,
+                    'max_grade': max_grade,
+                    'date': date or fields.Date.context_today(self),
+                })
+        
+        light_mode = self.env['school.audit.log']._is_light_mode()
+        Grade = self._audit_context()
+        updated = Grade.browse([grade_id for grade_ids in to_write.values() for grade_id in grade_ids])
+        deltas = updated._get_running_deltas(-1)
+        for value, grade_ids in to_write.items():
+            Grade.browse(grade_ids)._write_batch({'grade': value})
+        created = Grade._create_batch(to_create)
+        updated._get_running_deltas(1, deltas)
+        created._get_running_deltas(1, deltas)
+        self._apply_running_totals(deltas)
+        if light_mode:
+            self.env['school.audit.log']._insert(self._name, changes + [
+                (grade.id, 'grade', '', str(grade.grade)) for grade in created
+            ])
+        self.env.flush_all()
+        return {
+            'created': len(created),
+            'updated': len(updated),
+            'queries': self.env.cr.sql_log_count - queries,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
     
     def _get_default_teacher(self):
         # Retourne l'enseignant du cours si disponible
         return False
     
+    @api.constrains('date')
+    @profiled('constraint')
+    def _check_school_year(self):
+        self.env['school.year']._check_open_dates(self.mapped('date'))
+    
     @api.constrains('grade', 'max_grade')
+    @profiled('constraint')
     def _check_grade(self):
         for record in self:
             if record.grade < 0:
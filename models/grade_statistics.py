@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import statistics
+
+from odoo import models, api, tools
+
+from .grade import GRADE_LETTER_THRESHOLDS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Seuils en ordre croissant et lettres associées (index 0: en dessous du premier seuil)
+LETTER_BINS = [threshold for threshold, _letter in reversed(GRADE_LETTER_THRESHOLDS)]
+LETTERS = ['f'] + [letter for _threshold, letter in reversed(GRADE_LETTER_THRESHOLDS)]
+
+
+class GradeStatistics(models.AbstractModel):
+    _name = 'school.grade.statistics'
+    _description = 'Statistiques des notes'
+    
+    @api.model
+    def get_statistics(self, model, res_id, semester=False):
+        """Statistiques des notes d'une classe ('school.class') ou d'un cours ('school.course').
+    
+        Chaque étudiant a un score sur 20 (somme des notes rapportée à la somme des notes
+        maximales). Le résultat est mis en cache tant que le compteur de modifications
+        des notes (grade_revision) de la classe ou du cours ne change pas.
+    
+        :return: {'count', 'mean', 'median', 'std', 'min', 'max',
+                  'histogram': [(lettre, nombre)],
+                  'students': {student_id: {'score', 'rank', 'percentile'}}}
+        """
+        record = self.env[model].browse(res_id)
+        record.check_access('read')
+        return self._get_statistics(model, record.id, semester or False, record.grade_revision)
+    
+    @tools.ormcache('model', 'res_id', 'semester', 'revision')
+    def _get_statistics(self, model, res_id, semester, revision):
+        student_ids, scores = self._fetch_scores(model, res_id, semester)
+        return self._compute(student_ids, scores)
+    
+    @api.model
+    def _compute(self, student_ids, scores):
+        if np is not None:
+            return self._compute_numpy(student_ids, scores)
+        return self._compute_python(student_ids, scores)
+    
+    @api.model
+    def _fetch_scores(self, model, res_id, semester):
+        """Scores sur 20 par étudiant actif, en une requête"""
+        self.env['school.grade'].flush_model(['student_id', 'course_id', 'semester', 'grade', 'max_grade'])
+        self.env['school.student'].flush_model(['class_id', 'active'])
+        scope = "s.class_id = %(res_id)s" if model == 'school.class' else "g.course_id = %(res_id)s"
+        self.env.cr.execute(f"""
+            SELECT g.student_id, SUM(g.grade) / SUM(g.max_grade) * 20
+            FROM school_grade g
+            JOIN school_student s ON s.id = g.student_id
+            WHERE {scope} AND s.active
+              AND (%(semester)s IS NULL OR g.semester = %(semester)s)
+            GROUP BY g.student_id
+            HAVING SUM(g.max_grade) > 0
+            ORDER BY g.student_id
+        """, {'res_id': res_id, 'semester': semester or None})
+        rows = self.env.cr.fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+    
+    @api.model
+    def _empty_statistics(self):
+        return {
+            'count': 0, 'mean': 0.0, 'median': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0,
+            'histogram': [(letter, 0) for letter in reversed(LETTERS)],
+            'students': {},
+        }
+    
+    @api.model
+    def _compute_numpy(self, student_ids, scores):
+        if not scores:
+            return self._empty_statistics()
+        values = np.asarray(scores, dtype=float)
+        ordered = np.sort(values)
+        # Nombre de scores inférieurs ou égaux à chaque score; rang 1 pour le meilleur, ex aequo partagés
+        at_most = np.searchsorted(ordered, values, side='right')
+        ranks = len(values) - at_most + 1
+        percentiles = at_most / len(values) * 100
+        letters = np.bincount(np.digitize(values * 5, LETTER_BINS), minlength=len(LETTERS))
+        return {
+            'count': len(values),
+            'mean': float(values.mean()),
+            'median': float(np.median(values)),
+            'std': float(values.std()),
+            'min': float(ordered[0]),
+            'max': float(ordered[-1]),
+            'histogram': [(LETTERS[index], int(letters[index])) for index in reversed(range(len(LETTERS)))],
+            'students': {
+                student_id: {'score': float(score), 'rank': int(rank), 'percentile': float(percentile)}
+                for student_id, score, rank, percentile in zip(student_ids, values, ranks, percentiles)
+            },
+        }
+    
+    @api.model
+    def _compute_python(self, student_ids, scores):
+        """Équivalent sans NumPy"""
+        if not scores:
+            return self._empty_statistics()
+        count = len(scores)
+        ordered = sorted(scores)
+        letters = [0] * len(LETTERS)
+        result_students = {}
+        for student_id, score in zip(student_ids, scores):
+            at_most = bisect.bisect_right(ordered, score)
+            letters[bisect.bisect_right(LETTER_BINS, score * 5)] += 1
+            result_students[student_id] = {
+                'score': score,
+                'rank': count - at_most + 1,
+                'percentile': at_most / count * 100,
+            }
+        return {
+            'count': count,
+            'mean': statistics.fmean(scores),
+            'median': statistics.median(ordered),
+            'std': statistics.pstdev(scores),
+            'min': ordered[0],
+            'max': ordered[-1],
+            'histogram': [(LETTERS[index], letters[index]) for index in reversed(range(len(LETTERS)))],
+            'students': result_students,
+        }
+    
+    @api.model
+    def _bump_revision(self, model, ids, field='grade_revision'):
+        """Invalide les statistiques en cache: nouvelle révision tirée d'une séquence,
+        jamais réutilisée même si la transaction est annulée"""
+        ids = [res_id for res_id in ids if res_id]
+        if not ids:
+            return
+        Model = self.env[model]
+        self.env.cr.execute(
+            f"UPDATE {Model._table} SET {field} = nextval('school_grade_revision_seq') WHERE id = ANY(%s)",
+            [ids])
+        Model.browse(ids).invalidate_recordset([field])
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+
+from .grade import GRADE_LETTER_THRESHOLDS, grade_letter
+
+
+def _letter_sql(percentage):
+    """Expression SQL équivalente à grade_letter() pour les reconstructions en masse"""
+    whens = " ".join(f"WHEN {percentage} >= {threshold} THEN '{letter}'"
+                     for threshold, letter in GRADE_LETTER_THRESHOLDS)
+    return f"CASE {whens} ELSE 'f' END"
+
+
+class GradeSummary(models.Model):
+    _name = 'school.grade.summary'
+    _description = 'Résultat par étudiant, cours et semestre'
+    _order = 'student_id, semester, course_id'
+    
+    # Relations
+    student_id = fields.Many2one('school.student', string='Étudiant', required=True, readonly=True, ondelete='cascade')
+    course_id = fields.Many2one('school.course', string='Cours', required=True, readonly=True, index=True, ondelete='cascade')
+    class_id = fields.Many2one('school.class', string='Classe', related='student_id.class_id', store=True, index=True)
+    semester = fields.Selection([
+        ('1', 'Semestre 1'),
+        ('2', 'Semestre 2'),
+    ], string='Semestre', required=True, readonly=True)
+    credits = fields.Integer(string='Crédits', related='course_id.credits', store=True)
+    
+    # Cumuls entretenus à chaque modification de note
+    grade_count = fields.Integer(string='Nombre de notes', readonly=True)
+    grade_sum = fields.Float(string='Somme des notes', readonly=True)
+    max_grade_sum = fields.Float(string='Somme des notes maximales', readonly=True)
+    
+    # Résultats
+    average = fields.Float(string='Moyenne', readonly=True)
+    weighted_average = fields.Float(string='Moyenne pondérée (/20)', readonly=True,
+                                    help="Somme des notes rapportée à la somme des notes maximales, sur 20")
+    grade_letter = fields.Selection([
+        ('a+', 'A+ (Excellent)'),
+        ('a', 'A (Très bien)'),
+        ('b+', 'B+ (Bien)'),
+        ('b', 'B (Assez bien)'),
+        ('c+', 'C+ (Passable)'),
+        ('c', 'C (Moyen)'),
+        ('d', 'D (Insuffisant)'),
+        ('f', 'F (Échec)'),
+    ], string='Lettre', readonly=True)
+    
+    _sql_constraints = [
+        ('student_course_semester_unique', 'unique(student_id, course_id, semester)',
+         'Un seul résultat par étudiant, cours et semestre!')
+    ]
+    
+    @api.model
+    def _get_result_values(self, grade_sum, grade_count, max_grade_sum):
+        percentage = grade_sum / max_grade_sum * 100 if max_grade_sum > 0 else 0.0
+        return {
+            'grade_count': grade_count,
+            'grade_sum': grade_sum,
+            'max_grade_sum': max_grade_sum,
+            'average': grade_sum / grade_count if grade_count else 0.0,
+            'weighted_average': percentage / 5,
+            'grade_letter': grade_letter(percentage),
+        }
+    
+    @api.model
+    def _apply_deltas(self, deltas):
+        """Applique les deltas {(étudiant, cours, semestre): [somme, nombre, somme des maxima]}"""
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+        existing = self.search([
+            ('student_id', 'in', list({key[0] for key in deltas})),
+            ('course_id', 'in', list({key[1] for key in deltas})),
+        ])
+        by_key = {(summary.student_id.id, summary.course_id.id, summary.semester): summary for summary in existing}
+        to_create = []
+        to_unlink = self.browse()
+        for key, (total, count, max_total) in deltas.items():
+            summary = by_key.get(key)
+            if summary:
+                count += summary.grade_count
+                if count <= 0:
+                    to_unlink |= summary
+                    continue
+                summary.write(self._get_result_values(
+                    summary.grade_sum + total, count, summary.max_grade_sum + max_total))
+            elif count > 0:
+                student_id, course_id, semester = key
+                to_create.append(dict(
+                    self._get_result_values(total, count, max_total),
+                    student_id=student_id, course_id=course_id, semester=semester,
+                ))
+        to_unlink.unlink()
+        self.create(to_create)
+    
+    @api.model
+    def _rebuild(self, students=None):
+        """Reconstruit les résultats (et les moyennes pondérées des étudiants) en SQL
+        à partir des notes; tous les étudiants si aucun n'est donné"""
+        self.env['school.grade'].flush_model()
+        self.flush_model()
+        student_where, grade_where, params = "TRUE", "TRUE", []
+        if students is not None:
+            student_where, grade_where, params = "st.id = ANY(%s)", "g.student_id = ANY(%s)", [students.ids]
+            self.env.cr.execute("DELETE FROM school_grade_summary WHERE student_id = ANY(%s)", params)
+        else:
+            self.env.cr.execute("DELETE FROM school_grade_summary")
+        percentage = "CASE WHEN SUM(g.max_grade) > 0 THEN SUM(g.grade) / SUM(g.max_grade) * 100 ELSE 0 END"
+        self.env.cr.execute(f"""
+            INSERT INTO school_grade_summary (
+                student_id, course_id, class_id, semester, credits,
+                grade_count, grade_sum, max_grade_sum, average, weighted_average, grade_letter,
+                create_uid, write_uid, create_date, write_date
+            )
+            SELECT g.student_id, g.course_id, st.class_id, g.semester, c.credits,
+                   COUNT(*), SUM(g.grade), SUM(g.max_grade), AVG(g.grade),
+                   {percentage} / 5, {_letter_sql(percentage)},
+                   %s, %s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+            FROM school_grade g
+            JOIN school_student st ON st.id = g.student_id
+            JOIN school_course c ON c.id = g.course_id
+            WHERE {grade_where}
+            GROUP BY g.student_id, g.course_id, st.class_id, g.semester, c.credits
+        """, [self.env.uid, self.env.uid] + params)
+        self.env.cr.execute(f"""
+            UPDATE school_student s
+            SET weighted_average_grade = COALESCE(r.average, 0.0)
+            FROM (
+                SELECT st.id,
+                       SUM(gs.weighted_average * gs.credits) / NULLIF(SUM(gs.credits), 0) AS average
+                FROM school_student st
+                LEFT JOIN school_grade_summary gs ON gs.student_id = st.id
+                WHERE {student_where}
+                GROUP BY st.id
+            ) r
+            WHERE s.id = r.id AND s.weighted_average_grade IS DISTINCT FROM COALESCE(r.average, 0.0)
+        """, params)
+        # Lignes supprimées et recréées: les listes de résultats en cache sont périmées
+        self.invalidate_model()
+        self.env['school.student'].invalidate_model(['summary_ids', 'weighted_average_grade'])
+    
+    def init(self):
+        """Construit les résultats à l'installation, ou s'ils ne couvrent plus toutes les notes"""
+        self.env.cr.execute("SELECT COUNT(*) FROM school_grade")
+        grades = self.env.cr.fetchone()[0]
+        self.env.cr.execute("SELECT COALESCE(SUM(grade_count), 0) FROM school_grade_summary")
+        if grades != self.env.cr.fetchone()[0]:
+            self._rebuild()
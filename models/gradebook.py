@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _, Command
+from odoo.exceptions import UserError
+
+# Colonne du carnet de notes par type d'évaluation
+GRADEBOOK_COLUMNS = {
+    'homework': 'grade_homework',
+    'quiz': 'grade_quiz',
+    'midterm': 'grade_midterm',
+    'final': 'grade_final',
+    'project': 'grade_project',
+    'presentation': 'grade_presentation',
+    'participation': 'grade_participation',
+}
+
+
+class Gradebook(models.TransientModel):
+    _name = 'school.gradebook'
+    _description = 'Carnet de notes'
+    
+    course_id = fields.Many2one('school.course', string='Cours', required=True,
+                                default=lambda self: self._default_course_id())
+    class_id = fields.Many2one('school.class', string='Classe', related='course_id.class_id')
+    semester = fields.Selection([
+        ('1', 'Semestre 1'),
+        ('2', 'Semestre 2'),
+    ], string='Semestre', required=True, default='1')
+    date = fields.Date(string='Date des nouvelles notes', default=fields.Date.context_today, required=True)
+    max_grade = fields.Float(string='Note maximale', default=20.0, required=True)
+    line_ids = fields.One2many('school.gradebook.line', 'gradebook_id', string='Étudiants')
+    
+    def _default_course_id(self):
+        if self.env.context.get('active_model') == 'school.course':
+            return self.env.context.get('active_id')
+        return False
+    
+    @api.onchange('course_id', 'semester')
+    def _onchange_load(self):
+        """Charge le carnet en une requête"""
+        commands = [Command.clear()]
+        if self.course_id and self.semester:
+            gradebook = self.env['school.grade'].get_gradebook(self.course_id.id, self.semester)
+            for student in gradebook['students']:
+                cells = gradebook['cells'][student['id']]
+                line = {
+                    'student_id': student['id'],
+                    'registration_number': student['registration_number'],
+                }
+                for evaluation_type, column in GRADEBOOK_COLUMNS.items():
+                    line[column] = '%g' % cells[evaluation_type]['grade'] if evaluation_type in cells else False
+                commands.append(Command.create(line))
+        self.line_ids = commands
+    
+    def action_save(self):
+        self.ensure_one()
+        cells = []
+        for line in self.line_ids:
+            for evaluation_type, column in GRADEBOOK_COLUMNS.items():
+                # Une case vide est ignorée; 0 est une vraie note
+                value = (line[column] or '').strip().replace(',', '.')
+                if not value:
+                    continue
+                try:
+                    grade = float(value)
+                except ValueError:
+                    raise UserError(_("Note invalide pour %(student)s: %(value)s.") % {
+                        'student': line.student_id.name,
+                        'value': line[column],
+                    })
+                cells.append({
+                    'student_id': line.student_id.id,
+                    'evaluation_type': evaluation_type,
+                    'grade': grade,
+                })
+        if not cells:
+            raise UserError(_("Aucune note à enregistrer."))
+        result = self.env['school.grade'].save_gradebook(
+            self.course_id.id, self.semester, cells, date=self.date, max_grade=self.max_grade)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'success',
+                'message': _("%(created)s notes créées, %(updated)s modifiées en %(duration_ms)s ms.") % result,
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+
+class GradebookLine(models.TransientModel):
+    _name = 'school.gradebook.line'
+    _description = 'Ligne du carnet de notes'
+    
+    gradebook_id = fields.Many2one('school.gradebook', string='Carnet de notes', required=True, ondelete='cascade')
+    student_id = fields.Many2one('school.student', string='Étudiant', required=True, readonly=True)
+    registration_number = fields.Char(string='Matricule', readonly=True)
+    
+    # Cases saisies en texte: une case vide n'est pas notée, 0 est une vraie note
+    grade_homework = fields.Char(string='Devoir')
+    grade_quiz = fields.Char(string='Interrogation')
+    grade_midterm = fields.Char(string='Examen partiel')
+    grade_final = fields.Char(string='Examen final')
+    grade_project = fields.Char(string='Projet')
+    grade_presentation = fields.Char(string='Présentation')
+    grade_participation = fields.Char(string='Participation')
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+
+
+class IrSequence(models.Model):
+    _inherit = 'ir.sequence'
+    
+    @api.model
+    def _next_block_by_code(self, sequence_code, count):
+        """Réserve `count` numéros consécutifs d'une séquence en un seul aller-retour,
+        au lieu d'un appel à next_by_code() par enregistrement"""
+        if count <= 0:
+            return []
+        self.check_access('read')
+        company_id = self.env.company.id
+        sequence = self.sudo().search(
+            [('code', '=', sequence_code), ('company_id', 'in', [company_id, False])],
+            order='company_id', limit=1,
+        )
+        if not sequence:
+            return [False] * count
+        if sequence.use_date_range:
+            # Séquences par période: on conserve le chemin standard, numéro par numéro
+            return [sequence._next() for _i in range(count)]
+        if sequence.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % sequence.id, count],
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            step = sequence.number_increment
+            self.env.cr.execute("SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT", [sequence.id])
+            self.env.cr.execute(
+                "UPDATE ir_sequence SET number_next = number_next + %s WHERE id = %s RETURNING number_next - %s",
+                [step * count, sequence.id, step * count],
+            )
+            first = self.env.cr.fetchone()[0]
+            numbers = [first + step * index for index in range(count)]
+            sequence.invalidate_recordset(['number_next'])
+        return [sequence.get_next_char(number) for number in numbers]
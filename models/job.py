@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import AccessError, UserError
+
+_logger = logging.getLogger(__name__)
+
+# Au-delà de ce nombre d'enregistrements, les actions lourdes passent en arrière-plan
+JOB_THRESHOLD_PARAM = 'school_management.job_threshold'
+JOB_THRESHOLD = 500
+# Durée maximale d'un passage du cron de traitement (secondes), relancé s'il reste du travail
+JOB_TIME_LIMIT_PARAM = 'school_management.job_time_limit'
+JOB_TIME_LIMIT = 240
+JOB_CHUNK_SIZE = 200
+# Délai avant la première nouvelle tentative d'un lot en échec, doublé à chaque tentative
+JOB_RETRY_DELAY = timedelta(minutes=1)
+# Conservation des tâches terminées ou annulées
+JOB_RETENTION_DAYS = 30
+# Seules les méthodes préfixées peuvent être exécutées par une tâche
+JOB_METHOD_PREFIX = '_job_'
+# Champs décrivant le travail et l'utilisateur qui l'exécute: fixés par _enqueue() uniquement
+JOB_EXECUTION_FIELDS = {'user_id', 'res_model', 'method', 'res_ids', 'kwargs', 'job_context', 'chunk_size'}
+
+
+class SchoolJob(models.Model):
+    """Tâche en arrière-plan: une méthode appliquée par lots à une liste d'enregistrements.
+    
+    Le cron de traitement verrouille une tâche (FOR UPDATE SKIP LOCKED, plusieurs
+    processus peuvent travailler en parallèle), exécute un lot dans un point de
+    sauvegarde et valide la transaction après chaque lot: la progression survit à
+    un arrêt du processus, un lot en échec est retenté avec un délai croissant, et
+    une annulation prend effet à la fin du lot en cours.
+    """
+    _name = 'school.job'
+    _description = 'Tâche en arrière-plan'
+    _order = 'id desc'
+    
+    name = fields.Char(string='Tâche', required=True, readonly=True)
+    user_id = fields.Many2one('res.users', string='Demandée par', required=True, readonly=True,
+                              default=lambda self: self.env.user, index=True)
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'En échec'),
+        ('cancelled', 'Annulée'),
+    ], string='État', default='pending', required=True, readonly=True, index=True)
+    priority = fields.Integer(string='Priorité', default=10, readonly=True)
+    
+    # Travail à effectuer: res_model.browse(lot).method(**kwargs)
+    res_model = fields.Char(string='Modèle', required=True, readonly=True)
+    method = fields.Char(string='Méthode', required=True, readonly=True)
+    res_ids = fields.Json(string='Enregistrements', readonly=True)
+    kwargs = fields.Json(string='Paramètres', readonly=True)
+    job_context = fields.Json(string='Contexte', readonly=True)
+    chunk_size = fields.Integer(string='Taille des lots', default=JOB_CHUNK_SIZE, readonly=True)
+    
+    # Avancement
+    total_count = fields.Integer(string='Total', readonly=True)
+    done_count = fields.Integer(string='Traités', readonly=True)
+    progress = fields.Float(string='Progression', compute='_compute_progress')
+    attempts = fields.Integer(string='Tentatives du lot', readonly=True)
+    max_attempts = fields.Integer(string='Tentatives maximum', default=3, readonly=True)
+    next_attempt = fields.Datetime(string='Prochaine tentative', readonly=True)
+    date_started = fields.Datetime(string='Démarrée le', readonly=True)
+    date_done = fields.Datetime(string='Terminée le', readonly=True)
+    error = fields.Text(string='Erreur', readonly=True)
+    attachment_ids = fields.One2many('ir.attachment', 'res_id', string='Fichiers', readonly=True,
+                                     domain=[('res_model', '=', 'school.job')])
+    
+    def init(self):
+        """Index de la recherche des tâches à traiter par le cron"""
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_job_queue_idx
+            ON school_job (priority, id)
+            WHERE state IN ('pending', 'running')
+        """)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        if not self.env.su:
+            raise AccessError(_("Les tâches en arrière-plan sont créées par les actions de l'école uniquement."))
+        return super(SchoolJob, self).create(vals_list)
+    
+    def write(self, vals):
+        # Le travail et l'utilisateur qui l'exécute ne peuvent pas être modifiés par RPC
+        if not self.env.su and JOB_EXECUTION_FIELDS & vals.keys():
+            raise AccessError(_("Le travail d'une tâche en arrière-plan ne peut pas être modifié."))
+        return super(SchoolJob, self).write(vals)
+    
+    @api.depends('done_count', 'total_count')
+    def _compute_progress(self):
+        for record in self:
+            record.progress = record.done_count * 100.0 / record.total_count if record.total_count else 0.0
+    
+    @api.model
+    def _should_enqueue(self, count):
+        """Vrai si une action sur count enregistrements doit passer en arrière-plan"""
+        threshold = int(self.env['ir.config_parameter'].sudo().get_param(JOB_THRESHOLD_PARAM, JOB_THRESHOLD))
+        return count > threshold
+    
+    @api.model
+    def _enqueue(self, records, method, name, chunk_size=JOB_CHUNK_SIZE, kwargs=None, max_attempts=3, priority=10):
+        """Crée une tâche appliquant records.method(**kwargs) par lots, au nom de
+        l'utilisateur courant, et réveille le cron de traitement. Sans enregistrements,
+        la méthode est appelée une fois sur le modèle (travail décrit par kwargs)."""
+        if not method.startswith(JOB_METHOD_PREFIX) or not callable(getattr(records, method, None)):
+            raise UserError(_("La méthode %s ne peut pas être exécutée en arrière-plan.") % method)
+        if chunk_size <= 0:
+            raise UserError(_("La taille des lots doit être positive."))
+        job = self.sudo().create({
+            'name': name,
+            'user_id': self.env.uid,
+            'priority': priority,
+            'res_model': records._name,
+            'method': method,
+            'res_ids': records.ids,
+            'kwargs': kwargs or {},
+            'job_context': {key: self.env.context[key] for key in ('lang', 'tz') if self.env.context.get(key)},
+            'chunk_size': chunk_size,
+            'total_count': len(records) or 1,
+            'max_attempts': max_attempts,
+        })
+        self._trigger_worker()
+        return job.sudo(False)
+    
+    @api.model
+    def _trigger_worker(self):
+        cron = self.env.ref('school_management.ir_cron_school_job_worker', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+    
+    def _action_open(self):
+        """Fenêtre de suivi de la tâche, retournée par les actions mises en file"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _("Tâche en arrière-plan"),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+    
+    def action_cancel(self):
+        """Annule les tâches non terminées; un lot en cours d'exécution se termine d'abord"""
+        self.filtered(lambda job: job.state in ('pending', 'running', 'failed')).sudo().write({
+            'state': 'cancelled',
+            'date_done': fields.Datetime.now(),
+        })
+    
+    def action_retry(self):
+        """Reprend les tâches en échec ou annulées au premier lot non traité"""
+        jobs = self.filtered(lambda job: job.state in ('failed', 'cancelled'))
+        jobs.sudo().write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt': False,
+            'date_done': False,
+            'error': False,
+        })
+        if jobs:
+            self._trigger_worker()
+    
+    @api.model
+    def _cron_run_jobs(self):
+        """Traite les lots en attente jusqu'à la limite de temps, une transaction par lot"""
+        time_limit = int(self.env['ir.config_parameter'].sudo().get_param(JOB_TIME_LIMIT_PARAM, JOB_TIME_LIMIT))
+        deadline = time.monotonic() + time_limit
+        chunks = 0
+        while time.monotonic() < deadline:
+            job = self._acquire()
+            if not job:
+                break
+            job._run_chunk()
+            self.env.cr.commit()
+            # Libère le cache ORM du lot précédent
+            self.env.invalidate_all()
+            chunks += 1
+        else:
+            # Limite de temps atteinte: un nouveau passage reprend les lots restants
+            self._trigger_worker()
+        if chunks:
+            _logger.info("Tâches en arrière-plan: %s lots traités", chunks)
+    
+    @api.model
+    def _acquire(self):
+        """Verrouille la prochaine tâche à traiter; les tâches verrouillées par un
+        autre processus sont ignorées"""
+        self.env.cr.execute("""
+            SELECT id FROM school_job
+            WHERE state IN ('pending', 'running')
+              AND (next_attempt IS NULL OR next_attempt <= now() AT TIME ZONE 'UTC')
+            ORDER BY priority, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """)
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+    
+    def _run_chunk(self):
+        """Exécute le prochain lot de la tâche (verrouillée) avec les droits du demandeur"""
+        self.ensure_one()
+        if not self.method.startswith(JOB_METHOD_PREFIX):
+            raise UserError(_("La méthode %s ne peut pas être exécutée en arrière-plan.") % self.method)
+        ids = (self.res_ids or [])[self.done_count:self.done_count + self.chunk_size]
+        if self.state == 'pending':
+            self.write({'state': 'running', 'date_started': self.date_started or fields.Datetime.now()})
+        records = self.env[self.res_model].with_user(self.user_id).with_context(
+            **(self.job_context or {}),
+            school_job_id=self.id,
+            school_job_chunk=self.done_count // self.chunk_size + 1,
+        ).browse(ids).exists()
+        try:
+            with self.env.cr.savepoint():
+                result = getattr(records, self.method)(**(self.kwargs or {}))
+        except Exception:
+            self.env.invalidate_all()
+            attempts = self.attempts + 1
+            _logger.exception("Tâche %s (%s): échec du lot, tentative %s/%s",
+                              self.id, self.name, attempts, self.max_attempts)
+            values = {'attempts': attempts, 'error': traceback.format_exc()}
+            if attempts >= self.max_attempts:
+                values.update(state='failed', date_done=fields.Datetime.now())
+            else:
+                values['next_attempt'] = fields.Datetime.now() + JOB_RETRY_DELAY * 2 ** (attempts - 1)
+            self.write(values)
+            return
+        # Fichiers produits par le lot (bulletins, exports...), rattachés à la tâche
+        if isinstance(result, models.BaseModel) and result._name == 'ir.attachment':
+            result.sudo().write({'res_model': self._name, 'res_id': self.id})
+        done = self.done_count + (len(ids) or 1)
+        values = {'done_count': done, 'attempts': 0, 'next_attempt': False, 'error': False}
+        if done >= self.total_count:
+            values.update(state='done', date_done=fields.Datetime.now())
+        self.write(values)
+    
+    @api.autovacuum
+    def _gc_jobs(self):
+        """Supprime les tâches terminées ou annulées anciennes (et leurs fichiers)"""
+        limit = fields.Datetime.now() - timedelta(days=JOB_RETENTION_DAYS)
+        jobs = self.sudo().search([('state', 'in', ('done', 'cancelled')), ('date_done', '<', limit)])
+        # Les fichiers ne sont liés que par res_model/res_id: pas de suppression en cascade
+        self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_id', 'in', jobs.ids),
+        ]).unlink()
+        jobs.unlink()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Scénarios des tests de charge: (code, libellé, méthode)
+LOAD_TEST_SCENARIOS = [
+    ('roll_call', "Appel d'un créneau", '_scenario_roll_call'),
+    ('grade_entry', "Saisie du carnet de notes d'un cours", '_scenario_grade_entry'),
+    ('bulletin_rendering', "Rendu des bulletins d'une classe", '_scenario_bulletin_rendering'),
+    ('schedule_import', "Génération de l'emploi du temps d'une classe", '_scenario_schedule_import'),
+    ('dashboard', "Chargement du tableau de bord", '_scenario_dashboard'),
+]
+
+
+class LoadTest(models.AbstractModel):
+    """Tests de charge des parcours utilisateurs sur les données en base (par exemple
+    celles du générateur): chaque scénario est rejoué dans un point de sauvegarde annulé
+    ensuite, et les résultats sont produits au format JSON pour comparaison entre versions."""
+    _name = 'school.load.test'
+    _description = 'Tests de charge'
+    
+    @api.model
+    def run(self, repeat=5, scenarios=None):
+        """Rejoue les scénarios et retourne les résultats (dictionnaire sérialisable en JSON)"""
+        if repeat <= 0:
+            raise UserError(_("Le nombre de répétitions doit être positif."))
+        self.env.flush_all()
+        params = self._get_params()
+        results = []
+        for code, label, method in LOAD_TEST_SCENARIOS:
+            if scenarios and code not in scenarios:
+                continue
+            results.append(self._run_scenario(code, label, getattr(self, method), params, repeat))
+        module = self.env['ir.module.module'].sudo().search([('name', '=', 'school_management')], limit=1)
+        return {
+            'module': 'school_management',
+            'version': module.latest_version,
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+            'database': self.env.cr.dbname,
+            'repeat': repeat,
+            'dataset': self._get_dataset_counts(),
+            'class': params['class'].code,
+            'students': len(params['students']),
+            'scenarios': results,
+        }
+    
+    @api.model
+    def _run_scenario(self, code, label, scenario, params, repeat):
+        cr = self.env.cr
+        latencies, queries, rows = [], [], 0
+        for _i in range(repeat):
+            cr.execute("SAVEPOINT school_load_test")
+            try:
+                start_queries = cr.sql_log_count
+                start = time.perf_counter()
+                rows = scenario(params)
+                self.env.flush_all()
+                latencies.append((time.perf_counter() - start) * 1000)
+                queries.append(cr.sql_log_count - start_queries)
+            finally:
+                cr.execute("ROLLBACK TO SAVEPOINT school_load_test")
+                self.env.invalidate_all()
+        latencies.sort()
+        result = {
+            'code': code,
+            'name': label,
+            'rows': rows,
+            'avg_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(latencies[len(latencies) // 2], 3),
+            'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+            'max_ms': round(latencies[-1], 3),
+            'queries': max(queries),
+        }
+        _logger.info("Test de charge %s", json.dumps(result))
+        return result
+    
+    @api.model
+    def _get_params(self):
+        """La classe active la plus nombreuse ayant un emploi du temps, ses étudiants et cours"""
+        self.env.cr.execute("""
+            SELECT c.id
+            FROM school_class c
+            WHERE c.active AND EXISTS (SELECT 1 FROM school_schedule s WHERE s.class_id = c.id AND s.active)
+            ORDER BY c.student_count DESC, c.id
+            LIMIT 1
+        """)
+        row = self.env.cr.fetchone()
+        if not row:
+            raise UserError(_("Aucune classe avec emploi du temps: générez d'abord des données de test."))
+        class_level = self.env['school.class'].browse(row[0])
+        students = self.env['school.student'].search([('class_id', '=', class_level.id)])
+        if not students:
+            raise UserError(_("La classe %s n'a aucun étudiant.") % class_level.name)
+        return {
+            'class': class_level,
+            'students': students,
+            'course': class_level.course_ids[:1],
+            'schedule': class_level.schedule_ids[:1],
+            'date': fields.Date.today() + timedelta(days=1),
+        }
+    
+    @api.model
+    def _get_dataset_counts(self):
+        counts = {}
+        for model in ('school.class', 'school.teacher', 'school.room', 'school.course', 'school.schedule',
+                      'school.student', 'school.grade', 'school.attendance'):
+            counts[model] = self.env[model].with_context(active_test=False).search_count([])
+        return counts
+    
+    # Scénarios: chacun retourne le nombre de lignes traitées
+    
+    @api.model
+    def _scenario_roll_call(self, params):
+        statuses = {
+            student_id: 'absent' if index % 10 == 0 else 'present'
+            for index, student_id in enumerate(params['students'].ids)
+        }
+        self.env['school.attendance'].record_roll_call(params['schedule'].id, params['date'], statuses)
+        return len(statuses)
+    
+    @api.model
+    def _scenario_grade_entry(self, params):
+        cells = [{
+            'student_id': student_id,
+            'evaluation_type': evaluation_type,
+            'grade': 8 + (student_id + index) % 12,
+        } for student_id in params['students'].ids
+            for index, evaluation_type in enumerate(('homework', 'quiz', 'midterm', 'final', 'project', 'presentation'))]
+        self.env['school.grade'].save_gradebook(params['course'].id, '1', cells)
+        return len(cells)
+    
+    @api.model
+    def _scenario_bulletin_rendering(self, params):
+        self.env['ir.actions.report']._render_qweb_html('school_management.report_bulletin', params['students'].ids)
+        return len(params['students'])
+    
+    @api.model
+    def _scenario_schedule_import(self, params):
+        generator = self.env['school.timetable.generator'].create({
+            'class_ids': [params['class'].id],
+            'replace_existing': True,
+            'time_budget': 5,
+        })
+        generator.action_generate()
+        return len(params['class'].schedule_ids)
+    
+    @api.model
+    def _scenario_dashboard(self, params):
+        class_level = params['class']
+        today = fields.Date.today()
+        groups = self.env['school.attendance.report'].read_group(
+            [('class_id', '=', class_level.id), ('date', '>=', today - timedelta(days=30))],
+            ['total:sum'], ['status'])
+        groups += self.env['school.grade'].read_group(
+            [('course_id', 'in', class_level.course_ids.ids)], ['grade:avg'], ['course_id'])
+        students = self.env['school.student'].search_read(
+            [('class_id', '=', class_level.id)],
+            ['name', 'registration_number', 'average_grade', 'attendance_rate', 'status'], limit=80)
+        self.env['school.grade.statistics'].get_statistics('school.class', class_level.id)
+        return len(groups) + len(students)
+    
+    @api.model
+    def _save_results(self, results):
+        """Enregistre les résultats en pièce jointe JSON téléchargeable"""
+        return self.env['ir.attachment'].create({
+            'name': 'school_load_test_%s.json' % results['date'].replace(' ', '_').replace(':', ''),
+            'raw': json.dumps(results, indent=2, ensure_ascii=False).encode(),
+            'mimetype': 'application/json',
+        })
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import json
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+# Profilage des calculs, contraintes et rapports: 'off', 'log' (journal structuré) ou 'db' (table de statistiques)
+PROFILE_MODE_PARAM = 'school_management.profiling'
+# Mesures de la transaction en cours, vidées au commit avec les autres précommit
+PROFILE_DATA_KEY = 'school.profile.stats'
+PROFILE_RETENTION_DAYS = 30
+PROFILE_KINDS = [
+    ('compute', 'Calcul'),
+    ('constraint', 'Contrainte'),
+    ('report', 'Rapport'),
+]
+
+
+def _profile_mode(env):
+    """Le contexte 'school_profile' prime sur le paramètre système"""
+    mode = env.context.get('school_profile')
+    if mode is None:
+        mode = env['ir.config_parameter'].sudo().get_param(PROFILE_MODE_PARAM, 'off')
+    return mode if mode in ('log', 'db') else 'off'
+
+
+def profiled(kind, processed=None):
+    """Mesure durée, requêtes SQL et nombre d'enregistrements traités (taille du lot
+    reçu, pas les lignes lues en base) de la méthode décorée, si le profilage est
+    activé; sinon appel direct.
+    
+    Les mesures sont cumulées par opération sur la transaction puis écrites au commit.
+    Les durées sont inclusives: une opération profilée appelée par une autre est
+    comptée dans les deux.
+    
+    :param kind: 'compute', 'constraint' ou 'report'
+    :param processed: fonction (self, *args, **kwargs) -> nombre d'enregistrements
+                      traités; par défaut len(self)
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            mode = _profile_mode(self.env)
+            if mode == 'off':
+                return method(self, *args, **kwargs)
+            cr = self.env.cr
+            queries = cr.sql_log_count
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                duration = (time.perf_counter() - start) * 1000
+                count = processed(self, *args, **kwargs) if processed else len(self)
+                self.env['school.profile.stat']._record(
+                    mode, f"{self._name}.{method.__name__}", self._name, kind,
+                    count, cr.sql_log_count - queries, duration)
+        return wrapper
+    return decorator
+
+
+class ProfileStat(models.Model):
+    _name = 'school.profile.stat'
+    _description = 'Mesure de profilage'
+    _order = 'id desc'
+    _log_access = False
+    
+    date = fields.Datetime(string='Date', readonly=True, default=fields.Datetime.now)
+    user_id = fields.Many2one('res.users', string='Utilisateur', readonly=True)
+    operation = fields.Char(string='Opération', readonly=True, required=True)
+    model = fields.Char(string='Modèle', readonly=True)
+    kind = fields.Selection(PROFILE_KINDS, string='Type', readonly=True)
+    calls = fields.Integer(string='Appels', readonly=True)
+    processed = fields.Integer(string='Enregistrements traités', readonly=True,
+                               help="Taille des lots reçus par l'opération, pas les lignes lues en base")
+    queries = fields.Integer(string='Requêtes SQL', readonly=True)
+    duration_ms = fields.Float(string='Durée (ms)', readonly=True, digits=(16, 3))
+    max_ms = fields.Float(string='Appel le plus long (ms)', readonly=True, digits=(16, 3))
+    
+    @api.model
+    def _record(self, mode, operation, model, kind, processed, queries, duration):
+        data = self.env.cr.precommit.data
+        if PROFILE_DATA_KEY not in data:
+            data[PROFILE_DATA_KEY] = {}
+            self.env.cr.precommit.add(self._flush_stats)
+        stat = data[PROFILE_DATA_KEY].setdefault((mode, operation, model, kind), [0, 0, 0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += processed
+        stat[2] += queries
+        stat[3] += duration
+        stat[4] = max(stat[4], duration)
+    
+    @api.model
+    def _flush_stats(self):
+        """Une ligne de journal JSON ou une insertion groupée par transaction"""
+        stats = self.env.cr.precommit.data.pop(PROFILE_DATA_KEY, {})
+        rows = [(mode, operation, model, kind) + tuple(values)
+                for (mode, operation, model, kind), values in stats.items()]
+        logged = [row for row in rows if row[0] == 'log']
+        if logged:
+            _logger.info("Profilage %s", json.dumps({
+                'uid': self.env.uid,
+                'operations': [{
+                    'operation': operation, 'kind': kind, 'calls': calls, 'processed': count,
+                    'queries': queries, 'duration_ms': round(duration, 3), 'max_ms': round(longest, 3),
+                } for _mode, operation, _model, kind, calls, count, queries, duration, longest in logged],
+            }))
+        stored = [row[1:] for row in rows if row[0] == 'db']
+        if stored:
+            self.env.cr.execute("""
+                INSERT INTO school_profile_stat (date, user_id, operation, model, kind,
+                                                 calls, processed, queries, duration_ms, max_ms)
+                SELECT now() AT TIME ZONE 'UTC', %s, *
+                FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[],
+                            %s::int[], %s::int[], %s::int[], %s::float[], %s::float[])
+            """, [self.env.uid] + [list(column) for column in zip(*stored)])
+    
+    @api.autovacuum
+    def _gc_profile_stats(self):
+        limit = fields.Datetime.now() - timedelta(days=PROFILE_RETENTION_DAYS)
+        self.env.cr.execute("DELETE FROM school_profile_stat WHERE date < %s", [limit])
+
+
+class ProfileReport(models.Model):
+    _name = 'school.profile.report'
+    _description = 'Opérations les plus lentes'
+    _auto = False
+    _order = 'duration_ms desc'
+    
+    operation = fields.Char(string='Opération', readonly=True)
+    model = fields.Char(string='Modèle', readonly=True)
+    kind = fields.Selection(PROFILE_KINDS, string='Type', readonly=True)
+    calls = fields.Integer(string='Appels', readonly=True)
+    processed = fields.Integer(string='Enregistrements traités', readonly=True)
+    queries = fields.Integer(string='Requêtes SQL', readonly=True)
+    duration_ms = fields.Float(string='Durée totale (ms)', readonly=True, digits=(16, 3))
+    avg_ms = fields.Float(string='Durée moyenne (ms)', readonly=True, digits=(16, 3))
+    max_ms = fields.Float(string='Appel le plus long (ms)', readonly=True, digits=(16, 3))
+    queries_per_call = fields.Float(string='Requêtes par appel', readonly=True, digits=(16, 1))
+    last_date = fields.Datetime(string='Dernière mesure', readonly=True)
+    
+    def init(self):
+        """Cumul des mesures par opération"""
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute("""
+            CREATE VIEW school_profile_report AS (
+                SELECT
+                    MIN(id) AS id,
+                    operation,
+                    model,
+                    kind,
+                    SUM(calls) AS calls,
+                    SUM(processed) AS processed,
+                    SUM(queries) AS queries,
+                    SUM(duration_ms) AS duration_ms,
+                    SUM(duration_ms) / NULLIF(SUM(calls), 0) AS avg_ms,
+                    MAX(max_ms) AS max_ms,
+                    SUM(queries)::float / NULLIF(SUM(calls), 0) AS queries_per_call,
+                    MAX(date) AS last_date
+                FROM school_profile_stat
+                GROUP BY operation, model, kind
+            )
+        """)
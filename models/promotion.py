@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+import time
+from collections import Counter, defaultdict
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import html_escape
+
+PROMOTION_DECISIONS = [
+    ('promote', 'Passage'),
+    ('graduate', 'Diplômé'),
+    ('repeat', 'Redoublement'),
+    ('overflow', 'Passage sans place'),
+]
+
+
+class Promotion(models.TransientModel):
+    """Passage de fin d'année de toute l'école.
+    
+    Le plan est établi en mémoire à partir d'une seule requête: les étudiants dont la
+    moyenne atteint le seuil passent au niveau suivant (même section de préférence,
+    sinon la classe la moins remplie), du meilleur au moins bon, dans la limite de la
+    capacité des classes après départs; ceux du dernier niveau sont diplômés. Les
+    niveaux sont traités du plus haut au plus bas: un étudiant sans place reste dans
+    sa classe et y occupe une place. L'application est un UPDATE ensembliste suivi
+    d'un seul recalcul des effectifs et moyennes des classes touchées, sans message
+    de suivi par étudiant.
+    """
+    _name = 'school.promotion'
+    _description = "Passage en classe supérieure"
+    
+    class_ids = fields.Many2many('school.class', string='Classes',
+                                 default=lambda self: self._default_class_ids(),
+                                 help="Classes dont les étudiants passent; toutes les classes si vide")
+    average_field = fields.Selection([
+        ('average_grade', 'Moyenne générale'),
+        ('weighted_average_grade', 'Moyenne pondérée (crédits)'),
+    ], string='Moyenne retenue', default='weighted_average_grade', required=True)
+    pass_threshold = fields.Float(string='Moyenne de passage', default=10.0, required=True)
+    
+    # Résultat
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('planned', 'Planifié'),
+        ('done', 'Appliqué'),
+    ], default='draft')
+    line_ids = fields.One2many('school.promotion.line', 'promotion_id', string='Mouvements')
+    result_summary = fields.Html(string='Bilan', readonly=True)
+    
+    def _default_class_ids(self):
+        if self.env.context.get('active_model') == 'school.class':
+            return self.env.context.get('active_ids', [])
+        return []
+    
+    def action_plan(self):
+        self.ensure_one()
+        if not 0 <= self.pass_threshold <= 20:
+            raise UserError(_("La moyenne de passage doit être comprise entre 0 et 20."))
+        started = time.monotonic()
+        Class = self.env['school.class']
+        classes = Class.search([])
+        selected = set((self.class_ids or classes).ids)
+        levels = [level for level, _label in Class._fields['level'].selection]
+        next_level = dict(zip(levels, levels[1:]))
+    
+        self.env['school.student'].flush_model(['class_id', 'status', 'active', 'grade_count', self.average_field])
+        classes.flush_recordset(['level', 'section', 'capacity'])
+        self.env.cr.execute(f"""
+            SELECT id, class_id, status, grade_count, {self.average_field} AS average
+            FROM school_student
+            WHERE active AND class_id = ANY(%s)
+            ORDER BY {self.average_field} DESC, id
+        """, [classes.ids])
+        rows = self.env.cr.dictfetchall()
+    
+        # Effectif de chaque classe après départs (passages et diplômés)
+        occupancy = Counter(row['class_id'] for row in rows)
+        candidates = defaultdict(list)
+        lines = []
+        for row in rows:
+            origin = classes.browse(row['class_id'])
+            if row['class_id'] not in selected or row['status'] != 'active':
+                continue
+            line = {
+                'promotion_id': self.id,
+                'student_id': row['id'],
+                'from_class_id': origin.id,
+                'average': row['average'] or 0.0,
+            }
+            lines.append(line)
+            if not row['grade_count'] or (row['average'] or 0.0) < self.pass_threshold:
+                line.update(decision='repeat', to_class_id=origin.id)
+                continue
+            occupancy[origin.id] -= 1
+            if origin.level in next_level:
+                candidates[next_level[origin.level]].append((line, origin))
+            else:
+                line.update(decision='graduate', to_class_id=False)
+    
+        by_level = defaultdict(list)
+        for record in classes:
+            by_level[record.level].append(record)
+        for level in reversed(levels):
+            targets = by_level[level]
+            for line, origin in candidates[level]:
+                free = [record for record in targets if record.capacity - occupancy[record.id] > 0]
+                pool = [record for record in free if record.section == origin.section] or free
+                if not pool:
+                    # Sans place: reste dans sa classe, qui ne libère donc pas sa place
+                    line.update(decision='overflow', to_class_id=origin.id)
+                    occupancy[origin.id] += 1
+                    continue
+                target = max(pool, key=lambda record: (record.capacity - occupancy[record.id], -record.id))
+                line.update(decision='promote', to_class_id=target.id)
+                occupancy[target.id] += 1
+    
+        self.line_ids.unlink()
+        self.env['school.promotion.line'].create(lines)
+        self.write({
+            'state': 'planned',
+            'result_summary': self._render_summary(classes, occupancy, time.monotonic() - started),
+        })
+        return self._action_reopen()
+    
+    def action_apply(self):
+        """Applique le plan en un UPDATE; les étudiants changés de classe depuis le plan,
+        ou que les règles d'accès ne permettent pas de modifier, sont ignorés"""
+        self.ensure_one()
+        if self.state != 'planned':
+            raise UserError(_("Établissez d'abord le plan de passage."))
+        Student = self.env['school.student']
+        Student.check_access('write')
+        # L'UPDATE contourne l'ORM: restreint aux étudiants modifiables selon les règles d'accès
+        allowed = self.line_ids.student_id._filtered_access('write')
+        cr = self.env.cr
+        self.env.flush_all()
+        cr.execute("""
+            UPDATE school_student s
+            SET class_id = CASE WHEN l.decision = 'graduate' THEN NULL ELSE l.to_class_id END,
+                status = CASE WHEN l.decision = 'graduate' THEN 'graduated' ELSE s.status END,
+                write_uid = %(uid)s,
+                write_date = now() AT TIME ZONE 'UTC'
+            FROM school_promotion_line l
+            WHERE l.promotion_id = %(promotion_id)s
+              AND s.id = l.student_id
+              AND s.id = ANY(%(student_ids)s)
+              AND s.class_id = l.from_class_id
+              AND (l.decision = 'graduate' OR (l.decision = 'promote' AND l.to_class_id IS NOT NULL))
+            RETURNING s.id
+        """, {'uid': self.env.uid, 'promotion_id': self.id, 'student_ids': allowed.ids})
+        moved_ids = [row[0] for row in cr.fetchall()]
+        # Classe des résultats et présences (champs liés stockés), comme le ferait l'ORM
+        for table in ('school_grade_summary', 'school_attendance'):
+            cr.execute(f"""
+                UPDATE {table} t
+                SET class_id = s.class_id
+                FROM school_student s
+                WHERE t.student_id = s.id AND s.id = ANY(%s) AND t.class_id IS DISTINCT FROM s.class_id
+            """, [moved_ids])
+        Student.invalidate_model(['class_id', 'status'])
+        self.env['school.grade.summary'].invalidate_model(['class_id'])
+        self.env['school.attendance'].invalidate_model(['class_id'])
+    
+        # Un seul recalcul des effectifs et moyennes des classes touchées
+        Class = self.env['school.class']
+        Class.invalidate_model(['student_ids'])
+        moved = set(moved_ids)
+        moves = self.line_ids.filtered(lambda line: line.student_id.id in moved)
+        classes = (moves.from_class_id | moves.to_class_id).exists()
+        self.env.add_to_compute(Class._fields['student_count'], classes)
+        classes._rebuild_grade_totals()
+        classes.flush_recordset(['student_count', 'average_class_grade'])
+        # Mêmes invalidations qu'un changement de classe par Student.write()
+        cr.execute("SELECT DISTINCT course_id FROM school_grade WHERE student_id = ANY(%s)", [moved_ids])
+        Statistics = self.env['school.grade.statistics']
+        Statistics._bump_revision('school.class', classes.ids)
+        Statistics._bump_revision('school.course', [row[0] for row in cr.fetchall()])
+        self.env['school.dashboard']._invalidate_classes(classes.ids)
+        self.env['school.attendance.report']._trigger_refresh()
+    
+        # Un message par classe plutôt qu'un suivi par étudiant
+        incoming = Counter(moves.filtered(lambda line: line.decision == 'promote').to_class_id.ids)
+        outgoing = Counter(moves.from_class_id.ids)
+        for record in classes:
+            record.message_post(body=_("Passage de fin d'année: %(incoming)s entrants, %(outgoing)s sortants.") % {
+                'incoming': incoming[record.id],
+                'outgoing': outgoing[record.id],
+            })
+    
+        stale = len(self.line_ids.filtered(lambda line: line.decision in ('promote', 'graduate'))) - len(moved_ids)
+        summary = _("<p><strong>Plan appliqué: %s étudiants déplacés.</strong></p>") % len(moved_ids)
+        if stale:
+            summary += _("<p>%s étudiants ignorés (changés de classe depuis le plan).</p>") % stale
+        self.write({'state': 'done', 'result_summary': summary + self.result_summary})
+        return self._action_reopen()
+    
+    def action_print_summary(self):
+        """Bilan imprimable: effectifs prévus, redoublements et étudiants sans place"""
+        self.ensure_one()
+        return self.env.ref('school_management.action_report_promotion').report_action(self)
+    
+    def _action_reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+    
+    def _render_summary(self, classes, occupancy, duration):
+        decisions = Counter(self.line_ids.mapped('decision'))
+        summary = _(
+            "<p>%(promote)s passages, %(graduate)s diplômés, %(repeat)s redoublements, "
+            "%(overflow)s passages sans place (plan établi en %(duration).1f s).</p>"
+        ) % {
+            'promote': decisions['promote'],
+            'graduate': decisions['graduate'],
+            'repeat': decisions['repeat'],
+            'overflow': decisions['overflow'],
+            'duration': duration,
+        }
+        overflow = Counter(line.from_class_id.level for line in self.line_ids if line.decision == 'overflow')
+        if overflow:
+            levels = dict(classes._fields['level'].selection)
+            rows = "".join(
+                f"<tr><td>{html_escape(levels[level])}</td><td>{count}</td></tr>"
+                for level, count in sorted(overflow.items())
+            )
+            summary += _(
+                "<p>Places manquantes au niveau supérieur (augmentez la capacité ou créez une classe, "
+                "puis replanifiez):</p><table class='table table-sm'><thead><tr><th>Niveau actuel</th>"
+                "<th>Étudiants sans place</th></tr></thead><tbody>%s</tbody></table>"
+            ) % rows
+        repeats = Counter(line.from_class_id.id for line in self.line_ids if line.decision == 'repeat')
+        incoming = Counter(line.to_class_id.id for line in self.line_ids if line.decision == 'promote')
+        touched = classes.filtered(lambda record: record.id in incoming or record.id in repeats
+                                   or occupancy[record.id] != record.student_count)
+        # Classes au-delà de leur capacité (redoublants et étudiants sans place) en rouge
+        rows = "".join(
+            ("<tr class='table-danger'>" if occupancy[record.id] > record.capacity else "<tr>")
+            + f"<td>{html_escape(record.name)}</td><td>{record.capacity}</td><td>{record.student_count}</td>"
+            f"<td>{occupancy[record.id]}</td><td>{incoming[record.id]}</td><td>{repeats[record.id]}</td></tr>"
+            for record in touched.sorted(lambda record: (record.level, record.name))
+        )
+        if rows:
+            summary += _(
+                "<table class='table table-sm'><thead><tr><th>Classe</th><th>Capacité</th><th>Effectif actuel</th>"
+                "<th>Effectif prévu</th><th>Entrants</th><th>Redoublants</th></tr></thead><tbody>%s</tbody></table>"
+            ) % rows
+        return summary
+
+
+class PromotionLine(models.TransientModel):
+    _name = 'school.promotion.line'
+    _description = 'Mouvement de passage'
+    _order = 'decision, from_class_id, average desc'
+    
+    promotion_id = fields.Many2one('school.promotion', required=True, ondelete='cascade', index=True)
+    student_id = fields.Many2one('school.student', string='Étudiant', required=True, ondelete='cascade')
+    from_class_id = fields.Many2one('school.class', string='Classe actuelle', readonly=True)
+    to_class_id = fields.Many2one('school.class', string='Nouvelle classe')
+    decision = fields.Selection(PROMOTION_DECISIONS, string='Décision', required=True)
+    average = fields.Float(string='Moyenne', readonly=True)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+from .profiling import profiled
+
+
+class Room(models.Model):
+    _name = 'school.room'
+    _description = 'Salle'
+    _order = 'name'
+    
+    name = fields.Char(string='Nom de la salle', required=True)
+    code = fields.Char(string='Code')
+    building = fields.Char(string='Bâtiment')
+    capacity = fields.Integer(string='Capacité', default=30)
+    room_type = fields.Selection([
+        ('classroom', 'Salle de classe'),
+        ('lab', 'Laboratoire'),
+        ('amphitheater', 'Amphithéâtre'),
+        ('gym', 'Gymnase'),
+        ('other', 'Autre'),
+    ], string='Type de salle', default='classroom')
+    
+    # Relations
+    schedule_ids = fields.One2many('school.schedule', 'room_id', string='Emploi du temps')
+    schedule_revision = fields.Integer(string='Révision des horaires', readonly=True, copy=False,
+                                       help="Change à chaque modification des horaires; clé du cache des grilles hebdomadaires")
+    
+    # Actif
+    active = fields.Boolean(string='Actif', default=True)
+    
+    # Notes
+    notes = fields.Text(string='Notes')
+    
+    @api.constrains('capacity')
+    def _check_capacity(self):
+        for record in self:
+            if record.capacity < 0:
+                raise ValidationError(_("La capacité ne peut pas être négative."))
+    
+    @api.model
+    def find_free_rooms(self, day_of_week, start_time, end_time, min_capacity=0):
+        """Salles actives libres sur un créneau, triées par capacité"""
+        room_ids = self.env['school.schedule']._get_free_resource_ids(
+            'room_id', day_of_week, start_time, end_time,
+            "capacity >= %s", [min_capacity],
+        )
+        return self.browse(room_ids).sorted(lambda room: (room.capacity, room.name))
+    
+    _sql_constraints = [
+        ('name_unique', 'unique(name)', 'Le nom de la salle doit être unique!')
+    ]
+
+
+class RoomFinder(models.TransientModel):
+    _name = 'school.room.finder'
+    _description = 'Recherche de salles et enseignants libres'
+    
+    day_of_week = fields.Selection([
+        ('monday', 'Lundi'),
+        ('tuesday', 'Mardi'),
+        ('wednesday', 'Mercredi'),
+        ('thursday', 'Jeudi'),
+        ('friday', 'Vendredi'),
+        ('saturday', 'Samedi'),
+        ('sunday', 'Dimanche'),
+    ], string='Jour', required=True, default='monday')
+    start_time = fields.Float(string='Heure de début', required=True, default=8.0)
+    end_time = fields.Float(string='Heure de fin', required=True, default=10.0)
+    min_capacity = fields.Integer(string='Capacité minimale')
+    
+    room_ids = fields.Many2many('school.room', string='Salles libres', compute='_compute_free_resources')
+    teacher_ids = fields.Many2many('school.teacher', string='Enseignants libres', compute='_compute_free_resources')
+    
+    @api.depends('day_of_week', 'start_time', 'end_time', 'min_capacity')
+    @profiled('compute')
+    def _compute_free_resources(self):
+        for record in self:
+            if record.day_of_week and record.start_time < record.end_time:
+                args = (record.day_of_week, record.start_time, record.end_time)
+                record.room_ids = self.env['school.room'].find_free_rooms(*args, min_capacity=record.min_capacity)
+                record.teacher_ids = self.env['school.teacher'].find_free_teachers(*args)
+            else:
+                record.room_ids = False
+                record.teacher_ids = False
@@ -1,8 +1,43 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+import heapq
+import logging
+from collections import defaultdict
+
+import psycopg2
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
+from .profiling import profiled
+
+_logger = logging.getLogger(__name__)
+
+# Dimensions contrôlées par le moteur de conflits: (champ, libellé)
+CONFLICT_DIMENSIONS = [
+    ('class_id', 'la classe'),
+    ('teacher_id', "l'enseignant"),
+    ('room_id', 'la salle'),
+]
+# Champs affichés dans les grilles hebdomadaires: leur modification change la révision des grilles
+GRID_FIELDS = {'class_id', 'course_id', 'teacher_id', 'room_id', 'day_of_week', 'start_time', 'end_time',
+               'session_type', 'active'}
+# Jours toujours affichés dans les grilles hebdomadaires (samedi et dimanche seulement s'ils sont occupés)
+GRID_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+
+def _sweep_overlaps(slots):
+    """Balayage trié d'intervalles: renvoie les paires de créneaux qui se chevauchent.
+    O(n log n + k) pour n créneaux et k conflits."""
+    overlaps = []
+    ongoing = []  # tas (fin, id, créneau) des créneaux encore ouverts
+    for slot in sorted(slots, key=lambda s: (s['start_time'], s['end_time'])):
+        while ongoing and ongoing[0][0] <= slot['start_time']:
+            heapq.heappop(ongoing)
+        overlaps.extend((other, slot) for _end, _id, other in ongoing)
+        heapq.heappush(ongoing, (slot['end_time'], slot['id'], slot))
+    return overlaps
+
 
 class Schedule(models.Model):
     _name = 'school.schedule'
@@ -31,7 +66,7 @@ class Schedule(models.Model):
     duration = fields.Float(string='Durée (heures)', compute='_compute_duration', store=True)
     
     # Salle
-    room = fields.Char(string='Salle', tracking=True)
+    room_id = fields.Many2one('school.room', string='Salle', tracking=True)
     
     # Période
     start_date = fields.Date(string='Date de début', required=True, default=fields.Date.today)
@@ -55,11 +90,13 @@ class Schedule(models.Model):
     display_name = fields.Char(string='Nom', compute='_compute_display_name', store=True)
     
     @api.depends('start_time', 'end_time')
+    @profiled('compute')
     def _compute_duration(self):
         for record in self:
             record.duration = record.end_time - record.start_time
     
     @api.depends('day_of_week', 'start_time', 'course_id')
+    @profiled('compute')
     def _compute_display_name(self):
         for record in self:
             day_names = dict(self._fields['day_of_week'].selection)
@@ -90,32 +127,216 @@ class Schedule(models.Model):
             if record.end_date and record.start_date > record.end_date:
                 raise ValidationError(_("La date de fin doit être après la date de début."))
     
-    @api.constrains('class_id', 'teacher_id', 'day_of_week', 'start_time', 'end_time')
+    @api.constrains('class_id', 'teacher_id', 'room_id', 'day_of_week', 'start_time', 'end_time', 'active')
+    @profiled('constraint')
     def _check_conflicts(self):
-        """Vérifie les conflits d'horaire pour la classe et l'enseignant"""
-        for record in self:
-            # Vérifier les conflits pour la classe
-            conflict = self.search([
-                ('id', '!=', record.id),
-                ('class_id', '=', record.class_id.id),
-                ('day_of_week', '=', record.day_of_week),
-                ('active', '=', True),
-                '|',
-                '&', ('start_time', '<=', record.start_time), ('end_time', '>', record.start_time),
-                '&', ('start_time', '<', record.end_time), ('end_time', '>=', record.end_time),
-            ])
-            if conflict:
-                raise ValidationError(_("Conflit d'horaire détecté pour la classe %s.") % record.class_id.name)
-            
-            # Vérifier les conflits pour l'enseignant
-            conflict = self.search([
-                ('id', '!=', record.id),
-                ('teacher_id', '=', record.teacher_id.id),
-                ('day_of_week', '=', record.day_of_week),
-                ('active', '=', True),
-                '|',
-                '&', ('start_time', '<=', record.start_time), ('end_time', '>', record.start_time),
-                '&', ('start_time', '<', record.end_time), ('end_time', '>=', record.end_time),
-            ])
-            if conflict:
-                raise ValidationError(_("Conflit d'horaire détecté pour l'enseignant %s.") % record.teacher_id.name)
+        """Vérifie les conflits d'horaire pour la classe, l'enseignant et la salle.
+        Tous les conflits du lot sont signalés en une seule fois."""
+        conflicts = self._find_conflicts()
+        if not conflicts:
+            return
+        schedules = self.browse({slot_id for _field, a, b in conflicts for slot_id in (a, b)})
+        names = {schedule.id: schedule.display_name for schedule in schedules}
+        labels = dict(CONFLICT_DIMENSIONS)
+        messages = []
+        for field, first_id, second_id in conflicts:
+            target = self.browse(first_id)[field]
+            messages.append(_("Conflit d'horaire détecté pour %(target)s %(name)s: %(first)s / %(second)s") % {
+                'target': labels[field],
+                'name': target.name,
+                'first': names[first_id],
+                'second': names[second_id],
+            })
+        raise ValidationError("\n".join(messages))
+    
+    def _find_conflicts(self):
+        """Charge en une requête tous les créneaux actifs des classes, enseignants,
+        salles et jours concernés, puis détecte les chevauchements en mémoire.
+        
+        :return: liste de (champ, id du créneau, id du créneau en conflit)
+        """
+        records = self.filtered('active')
+        if not records:
+            return []
+        self.flush_model([field for field, _label in CONFLICT_DIMENSIONS]
+                         + ['day_of_week', 'start_time', 'end_time', 'active'])
+        conditions = " OR ".join(f"{field} = ANY(%s)" for field, _label in CONFLICT_DIMENSIONS)
+        self.env.cr.execute(f"""
+            SELECT id, {", ".join(field for field, _label in CONFLICT_DIMENSIONS)},
+                   day_of_week, start_time, end_time
+            FROM school_schedule
+            WHERE active
+              AND day_of_week = ANY(%s)
+              AND ({conditions})
+        """, [list(set(records.mapped('day_of_week')))]
+             + [records.mapped(field).ids for field, _label in CONFLICT_DIMENSIONS])
+        slots = self.env.cr.dictfetchall()
+        checked = set(records.ids)
+        conflicts = []
+        for field, _label in CONFLICT_DIMENSIONS:
+            buckets = defaultdict(list)
+            for slot in slots:
+                if slot[field]:
+                    buckets[(slot[field], slot['day_of_week'])].append(slot)
+            for bucket in buckets.values():
+                conflicts.extend(
+                    (field, first['id'], second['id'])
+                    for first, second in _sweep_overlaps(bucket)
+                    if first['id'] in checked or second['id'] in checked
+                )
+        return conflicts
+    
+    @api.model
+    def _get_free_resource_ids(self, field, day_of_week, start_time, end_time, where='TRUE', params=()):
+        """Ressources actives (salles, enseignants...) sans créneau chevauchant
+        [start_time, end_time[: une requête servie par l'index d'occupation"""
+        comodel = self.env[self._fields[field].comodel_name]
+        self.flush_model([field, 'day_of_week', 'start_time', 'end_time', 'active'])
+        comodel.flush_model()
+        self.env.cr.execute(f"""
+            SELECT r.id
+            FROM {comodel._table} r
+            WHERE r.active
+              AND ({where})
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM school_schedule s
+                  WHERE s.{field} = r.id
+                    AND s.active
+                    AND s.day_of_week = %s
+                    AND s.start_time < %s
+                    AND s.end_time > %s
+              )
+        """, [*params, day_of_week, end_time, start_time])
+        return [row[0] for row in self.env.cr.fetchall()]
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(Schedule, self).create(vals_list)
+        self._bump_grid_revisions(records._get_grid_resources())
+        return records
+    
+    def write(self, vals):
+        if not GRID_FIELDS & vals.keys():
+            return super(Schedule, self).write(vals)
+        resources = self._get_grid_resources()
+        result = super(Schedule, self).write(vals)
+        for model, ids in self._get_grid_resources().items():
+            resources[model] |= ids
+        self._bump_grid_revisions(resources)
+        return result
+    
+    def unlink(self):
+        resources = self._get_grid_resources()
+        result = super(Schedule, self).unlink()
+        self._bump_grid_revisions(resources)
+        return result
+    
+    def _get_grid_resources(self):
+        """Classes, enseignants et salles dont ces créneaux apparaissent dans la grille"""
+        return {
+            self._fields[field].comodel_name: set(self.mapped(field).ids)
+            for field, _label in CONFLICT_DIMENSIONS
+        }
+    
+    @api.model
+    def _bump_grid_revisions(self, resources):
+        """Nouvelle révision des grilles en cache: seules les grilles de ces ressources
+        sont recalculées, et une révision annulée avec la transaction n'est jamais réutilisée"""
+        Statistics = self.env['school.grade.statistics']
+        for model, ids in resources.items():
+            Statistics._bump_revision(model, list(ids), 'schedule_revision')
+    
+    @api.model
+    def get_weekly_grids(self, field, res_ids):
+        """Grilles hebdomadaires (jour x créneau) des classes, enseignants ou salles donnés,
+        construites en une requête pour toute la sélection et gardées en cache tant que la
+        révision des horaires (schedule_revision) des ressources ne change pas.
+        
+        :param field: 'class_id', 'teacher_id' ou 'room_id'
+        :return: {res_id: {'days': [(jour, libellé)], 'rows': [{'start', 'end', 'label', 'cells'}],
+                  'hours': total d'heures}}; chaque case est une liste de créneaux
+                  {'id', 'class_id', 'course_id', 'teacher_id', 'room_id', 'session_type'}
+        """
+        if field not in dict(CONFLICT_DIMENSIONS):
+            raise ValidationError(_("Grille hebdomadaire inconnue: %s") % field)
+        self.check_access('read')
+        res_ids = tuple(sorted(set(res_ids)))
+        resources = self.env[self._fields[field].comodel_name].sudo().browse(res_ids).exists()
+        revisions = tuple((resource.id, resource.schedule_revision) for resource in resources)
+        return self._get_weekly_grids(field, res_ids, revisions)
+    
+    @tools.ormcache('field', 'res_ids', 'revisions')
+    def _get_weekly_grids(self, field, res_ids, revisions):
+        self.flush_model()
+        self.env.cr.execute(f"""
+            SELECT id, class_id, course_id, teacher_id, room_id, day_of_week, start_time, end_time, session_type
+            FROM school_schedule
+            WHERE active AND {field} = ANY(%s)
+            ORDER BY start_time, end_time, id
+        """, [list(res_ids)])
+        slots = defaultdict(list)
+        for slot in self.env.cr.dictfetchall():
+            slots[slot[field]].append(slot)
+        day_names = dict(self._fields['day_of_week'].selection)
+        grids = {}
+        for res_id in res_ids:
+            used_days = {slot['day_of_week'] for slot in slots[res_id]}
+            days = [day for day in day_names if day in GRID_DAYS or day in used_days]
+            columns = {day: index for index, day in enumerate(days)}
+            rows = {}
+            for slot in slots[res_id]:
+                key = (slot['start_time'], slot['end_time'])
+                if key not in rows:
+                    rows[key] = {
+                        'start': slot['start_time'],
+                        'end': slot['end_time'],
+                        'label': f"{self._format_time(slot['start_time'])} - {self._format_time(slot['end_time'])}",
+                        'cells': [[] for _day in days],
+                    }
+                rows[key]['cells'][columns[slot['day_of_week']]].append({
+                    name: slot[name] for name in ('id', 'class_id', 'course_id', 'teacher_id', 'room_id', 'session_type')
+                })
+            grids[res_id] = {
+                'days': [(day, day_names[day]) for day in days],
+                'rows': list(rows.values()),
+                'hours': sum(slot['end_time'] - slot['start_time'] for slot in slots[res_id]),
+            }
+        return grids
+    
+    def init(self):
+        """Index d'occupation par ressource et par jour, et garde-fou base de données:
+        contraintes d'exclusion GiST sur les chevauchements"""
+        cr = self.env.cr
+        for field in ('room_id', 'teacher_id', 'class_id'):
+            cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS school_schedule_{field}_occupancy_idx
+                ON school_schedule ({field}, day_of_week, start_time, end_time)
+                WHERE active
+            """)
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error:
+            _logger.warning("Extension btree_gist indisponible: contraintes d'exclusion des horaires non créées.")
+            return
+        for field, _label in CONFLICT_DIMENSIONS:
+            name = f"school_schedule_{field}_no_overlap"
+            cr.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [name])
+            if cr.fetchone():
+                continue
+            try:
+                with cr.savepoint():
+                    cr.execute(f"""
+                        ALTER TABLE school_schedule ADD CONSTRAINT {name}
+                        EXCLUDE USING gist (
+                            {field} WITH =,
+                            day_of_week WITH =,
+                            numrange(LEAST(start_time, end_time)::numeric,
+                                     GREATEST(start_time, end_time)::numeric) WITH &&
+                        )
+                        WHERE (active)
+                        DEFERRABLE INITIALLY DEFERRED
+                    """)
+            except psycopg2.Error:
+                _logger.warning("Chevauchements existants: contrainte %s non créée.", name)
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import io
+import logging
+import time
+from datetime import datetime
+
+import psycopg2
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+_logger = logging.getLogger(__name__)
+
+# Colonnes acceptées par type d'import (en-têtes = noms techniques des champs)
+IMPORT_COLUMNS = {
+    'school.student': [
+        'name', 'email', 'phone', 'mobile', 'date_of_birth', 'gender', 'class_code',
+        'admission_date', 'status', 'guardian_name', 'guardian_phone', 'guardian_email',
+        'guardian_relation', 'street', 'city', 'zip',
+    ],
+    'school.teacher': [
+        'name', 'email', 'phone', 'mobile', 'date_of_birth', 'gender', 'hire_date',
+        'department', 'specialization', 'qualification', 'status', 'street', 'city', 'zip',
+    ],
+}
+DATE_COLUMNS = {'date_of_birth', 'admission_date', 'hire_date'}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+class SchoolImport(models.TransientModel):
+    _name = 'school.import'
+    _description = 'Import en masse des étudiants et enseignants'
+    
+    target_model = fields.Selection([
+        ('school.student', 'Étudiants'),
+        ('school.teacher', 'Enseignants'),
+    ], string='Importer', required=True, default='school.student')
+    file = fields.Binary(string='Fichier (CSV ou XLSX)', required=True)
+    filename = fields.Char(string='Nom du fichier')
+    chunk_size = fields.Integer(string='Taille des lots', default=1000, required=True)
+    background = fields.Boolean(string='Exécuter en arrière-plan', default=True,
+                                help="L'import est exécuté par une tâche en arrière-plan, sans limite de durée de la requête")
+    job_id = fields.Many2one('school.job', string='Tâche', readonly=True)
+    
+    # Résultat
+    state = fields.Selection([('draft', 'Brouillon'), ('queued', 'En file'), ('done', 'Terminé')], default='draft')
+    rows_read = fields.Integer(string='Lignes lues', readonly=True)
+    rows_created = fields.Integer(string='Fiches créées', readonly=True)
+    rows_duplicate = fields.Integer(string='Doublons (email)', readonly=True)
+    rows_invalid = fields.Integer(string='Lignes invalides', readonly=True)
+    duration = fields.Float(string='Durée (s)', readonly=True)
+    throughput = fields.Float(string='Débit (lignes/s)', readonly=True)
+    error_log = fields.Text(string='Erreurs', readonly=True)
+    
+    @api.model
+    def _open_attachment(self, attachment):
+        """Contenu d'une pièce jointe en lecture binaire: lu directement depuis le
+        filestore, décodé en mémoire seulement si la pièce jointe est en base"""
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw or b'')
+    
+    def _open_file(self):
+        """Fichier téléversé dans le formulaire, via sa pièce jointe"""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_id', '=', self.id), ('res_field', '=', 'file'),
+        ], limit=1)
+        if not attachment:
+            return io.BytesIO(base64.b64decode(self.file or b''))
+        return self._open_attachment(attachment)
+    
+    def _read_rows(self, file):
+        """Itère sur les lignes du fichier (ouvert en binaire) sous forme de dictionnaires,
+        au fil de la lecture"""
+        if (self.filename or '').lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError(_("La bibliothèque openpyxl est requise pour importer des fichiers XLSX."))
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell or '').strip().lower() for cell in next(rows, [])]
+            for row in rows:
+                yield dict(zip(header, row))
+            workbook.close()
+        else:
+            text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+            sample = text.read(4096)
+            text.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t') if sample else csv.excel
+            reader = csv.DictReader(text, dialect=dialect)
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+            yield from reader
+    
+    def _prepare_values(self, row, classes):
+        """Valide une ligne et la convertit en valeurs de création; lève ValueError"""
+        Model = self.env[self.target_model]
+        vals = {}
+        for column in IMPORT_COLUMNS[self.target_model]:
+            value = row.get(column)
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ''):
+                continue
+            if column == 'class_code':
+                if value not in classes:
+                    raise ValueError(_("classe inconnue: %s") % value)
+                vals['class_id'] = classes[value]
+            elif column in DATE_COLUMNS:
+                vals[column] = self._parse_date(value)
+            elif Model._fields[column].type == 'selection':
+                allowed = [key for key, _label in Model._fields[column].selection]
+                if value not in allowed:
+                    raise ValueError(_("valeur invalide pour %s: %s") % (column, value))
+                vals[column] = value
+            else:
+                vals[column] = str(value)
+        if not vals.get('name'):
+            raise ValueError(_("nom manquant"))
+        if 'email' in vals and '@' not in vals['email']:
+            raise ValueError(_("email invalide: %s") % vals['email'])
+        if self.target_model == 'school.teacher' and not vals.get('email'):
+            raise ValueError(_("email manquant"))
+        return vals
+    
+    def _parse_date(self, value):
+        if isinstance(value, datetime):
+            return value.date()
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(str(value), date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(_("date invalide: %s") % value)
+    
+    def _create_chunk(self, Model, rows, errors):
+        """Crée un lot dans un point de sauvegarde; en cas d'échec (contrainte, valeur
+        refusée par la base), le lot est repris ligne par ligne et les lignes en erreur
+        sont consignées.
+        
+        :param rows: liste de (numéro de ligne, valeurs)
+        :return: nombre de fiches créées
+        """
+        try:
+            with self.env.cr.savepoint():
+                Model.create([vals for _line, vals in rows])
+            return len(rows)
+        except (psycopg2.Error, ValidationError, UserError):
+            self.env.invalidate_all()
+        created = 0
+        for line, vals in rows:
+            try:
+                with self.env.cr.savepoint():
+                    Model.create(vals)
+                created += 1
+            except (psycopg2.Error, ValidationError, UserError) as error:
+                self.env.invalidate_all()
+                _logger.info("Import %s, ligne %s rejetée: %s", Model._name, line, error)
+                errors.append(_("Ligne %s: %s") % (line, error))
+        return created
+    
+    def _existing_emails(self, emails):
+        """Emails déjà présents en base (insensible à la casse), en une requête"""
+        if not emails:
+            return set()
+        table = self.env[self.target_model]._table
+        self.env.cr.execute(f"SELECT LOWER(email) FROM {table} WHERE LOWER(email) = ANY(%s)", [list(emails)])
+        return {row[0] for row in self.env.cr.fetchall()}
+    
+    def action_import(self):
+        self.ensure_one()
+        if self.chunk_size <= 0:
+            raise UserError(_("La taille des lots doit être positive."))
+        if self.background:
+            # Le fichier appartient à la tâche: le formulaire transitoire peut être
+            # supprimé par le nettoyage avant que la tâche ne s'exécute
+            attachment = self.env['ir.attachment'].sudo().create({
+                'name': self.filename or _("import"),
+                'datas': self.file,
+                'res_model': 'school.job',
+            })
+            job = self.env['school.job']._enqueue(
+                self.browse(), '_job_import', _("Import: %s") % (self.filename or self.target_model),
+                kwargs={
+                    'attachment_id': attachment.id,
+                    'wizard_id': self.id,
+                    'options': {
+                        'target_model': self.target_model,
+                        'filename': self.filename,
+                        'chunk_size': self.chunk_size,
+                    },
+                })
+            attachment.res_id = job.id
+            self.write({'state': 'queued', 'job_id': job.id})
+        else:
+            with self._open_file() as file:
+                self._import(file)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+    
+    @api.model
+    def _job_import(self, attachment_id, wizard_id, options):
+        """Import d'une tâche en arrière-plan, à partir du fichier joint à la tâche. Le
+        résultat est reporté sur le formulaire d'origine s'il existe encore (sinon sur un
+        formulaire recréé sans le fichier), et joint à la tâche."""
+        wizard = self.browse(wizard_id).exists() or self.create(dict(options, background=False))
+        attachment = self.env['ir.attachment'].sudo().browse(attachment_id)
+        with self._open_attachment(attachment) as file:
+            wizard._import(file)
+        report = _("%(read)s lignes lues, %(created)s fiches créées, %(duplicate)s doublons, "
+                   "%(invalid)s lignes invalides en %(duration).1f s.") % {
+            'read': wizard.rows_read,
+            'created': wizard.rows_created,
+            'duplicate': wizard.rows_duplicate,
+            'invalid': wizard.rows_invalid,
+            'duration': wizard.duration,
+        }
+        return self.env['ir.attachment'].create({
+            'name': _("rapport-import.txt"),
+            'raw': "\n".join(filter(None, [report, wizard.error_log])).encode(),
+            'mimetype': 'text/plain',
+        })
+    
+    def _import(self, file):
+        self.ensure_one()
+        Model = self.env[self.target_model].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+        Model.check_access('create')
+        started = time.perf_counter()
+        classes = {}
+        if self.target_model == 'school.student':
+            classes = {c.code: c.id for c in self.env['school.class'].with_context(active_test=False).search([])}
+    
+        rows_read = created = duplicates = 0
+        errors = []
+        seen = set()
+        for chunk in split_every(self.chunk_size, enumerate(self._read_rows(file), start=2)):
+            rows_read += len(chunk)
+            valid = []
+            for line, row in chunk:
+                try:
+                    valid.append((line, self._prepare_values(row, classes)))
+                except ValueError as error:
+                    errors.append(_("Ligne %s: %s") % (line, error))
+            existing = self._existing_emails({vals['email'].lower() for _line, vals in valid if vals.get('email')})
+            rows = []
+            for line, vals in valid:
+                email = vals.get('email', '').lower()
+                if email and (email in seen or email in existing):
+                    duplicates += 1
+                    continue
+                if email:
+                    seen.add(email)
+                rows.append((line, vals))
+            created += self._create_chunk(Model, rows, errors)
+    
+        duration = time.perf_counter() - started
+        self.write({
+            'state': 'done',
+            'rows_read': rows_read,
+            'rows_created': created,
+            'rows_duplicate': duplicates,
+            'rows_invalid': len(errors),
+            'duration': duration,
+            'throughput': rows_read / duration if duration else 0.0,
+            'error_log': "\n".join(errors),
+        })
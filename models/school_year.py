@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class SchoolYear(models.Model):
+    """Année scolaire. La clôture déplace les notes et présences de l'année dans des
+    tables d'archive partitionnées par année (une partition par année close) et fige
+    les résultats annuels des étudiants: les tables courantes ne gardent que l'année
+    en cours, et les bulletins des années closes restent reproductibles."""
+    _name = 'school.year'
+    _description = 'Année scolaire'
+    _order = 'date_start desc'
+    
+    name = fields.Char(string='Nom', required=True)
+    date_start = fields.Date(string='Début', required=True)
+    date_end = fields.Date(string='Fin', required=True)
+    state = fields.Selection([
+        ('open', 'En cours'),
+        ('closed', 'Close'),
+    ], string='État', default='open', required=True, readonly=True)
+    archive_graduates = fields.Boolean(string='Archiver les diplômés à la clôture', default=True)
+    closed_on = fields.Datetime(string='Close le', readonly=True)
+    archived_grades = fields.Integer(string='Notes archivées', readonly=True)
+    archived_attendances = fields.Integer(string='Présences archivées', readonly=True)
+    close_duration = fields.Float(string='Durée de clôture (s)', readonly=True)
+    result_ids = fields.One2many('school.student.year', 'year_id', string='Résultats annuels')
+    
+    _sql_constraints = [
+        ('name_unique', 'unique(name)', "Le nom de l'année scolaire doit être unique!"),
+        ('dates_check', 'CHECK(date_start < date_end)', "L'année doit commencer avant de finir!"),
+    ]
+    
+    @api.constrains('date_start', 'date_end')
+    def _check_overlap(self):
+        for record in self:
+            overlapping = self.search_count([
+                ('id', '!=', record.id),
+                ('date_start', '<=', record.date_end),
+                ('date_end', '>=', record.date_start),
+            ])
+            if overlapping:
+                raise ValidationError(_("L'année %s chevauche une autre année scolaire.") % record.name)
+    
+    def unlink(self):
+        if any(record.state == 'closed' for record in self):
+            raise UserError(_("Une année close ne peut pas être supprimée: ses archives en dépendent."))
+        return super(SchoolYear, self).unlink()
+    
+    @api.model
+    def _check_open_dates(self, dates):
+        """Refuse les notes et présences datées d'une année close (déjà archivée)"""
+        dates = [day for day in dates if day]
+        if not dates:
+            return
+        # Clôturer une année archive tout ce qui précède sa fin
+        self.env.cr.execute("""
+            SELECT name FROM school_year
+            WHERE state = 'closed' AND date_end >= %s
+            ORDER BY date_end DESC LIMIT 1
+        """, [min(dates)])
+        row = self.env.cr.fetchone()
+        if row:
+            raise ValidationError(_("L'année scolaire %s est close: ses notes et présences sont archivées.") % row[0])
+    
+    def action_close(self):
+        """Clôture: résultats annuels figés, puis notes et présences jusqu'à la fin de
+        l'année déplacées vers leur partition d'archive, en requêtes ensemblistes"""
+        self.ensure_one()
+        if self.state == 'closed':
+            raise UserError(_("L'année %s est déjà close.") % self.name)
+        if self.date_end >= fields.Date.context_today(self):
+            raise UserError(_("L'année %s n'est pas terminée.") % self.name)
+        started = time.perf_counter()
+        cr = self.env.cr
+        self.env.flush_all()
+        params = {'date_end': self.date_end}
+    
+        self.env['school.student.year']._freeze(self)
+        cr.execute("""
+            SELECT DISTINCT student_id FROM school_grade WHERE date <= %(date_end)s
+            UNION
+            SELECT DISTINCT student_id FROM school_attendance WHERE date <= %(date_end)s
+        """, params)
+        students = self.env['school.student'].browse([row[0] for row in cr.fetchall()])
+        cr.execute("SELECT DISTINCT course_id FROM school_grade WHERE date <= %(date_end)s", params)
+        courses = self.env['school.course'].browse([row[0] for row in cr.fetchall()])
+    
+        grades = self.env['school.grade.archive']._archive(self)
+        attendances = self.env['school.attendance.archive']._archive(self)
+        self.env.invalidate_all()
+    
+        # Cumuls des tables courantes reconstruits sans l'année archivée
+        students = students.exists()
+        students._recompute_statistics()
+        self.env['school.grade.summary']._rebuild(students)
+        classes = students.with_context(active_test=False).class_id
+        courses = courses.exists()
+        classes._rebuild_grade_totals()
+        courses._rebuild_grade_totals()
+        Statistics = self.env['school.grade.statistics']
+        Statistics._bump_revision('school.class', classes.ids)
+        Statistics._bump_revision('school.course', courses.ids)
+        self.env['school.dashboard']._invalidate_classes(classes.ids)
+        self.env['school.attendance.report']._refresh()
+        if self.archive_graduates:
+            self.env['school.student'].search([('status', '=', 'graduated')]).write({'active': False})
+        for table in ('school_grade', 'school_attendance'):
+            cr.execute(f"ANALYZE {table}")
+    
+        self.write({
+            'state': 'closed',
+            'closed_on': fields.Datetime.now(),
+            'archived_grades': grades,
+            'archived_attendances': attendances,
+            'close_duration': time.perf_counter() - started,
+        })
+        _logger.info("Année %s close: %s notes et %s présences archivées en %.1f s",
+                     self.name, grades, attendances, self.close_duration)
+        return True
+
+
+class ArchiveMixin(models.AbstractModel):
+    """Table d'archive en lecture seule, partitionnée par année (LIST sur year_id).
+    
+    Toutes les colonnes métier de la table courante sont archivées; seules les colonnes
+    techniques (create/write_uid/date) et les champs calculés à l'affichage sont omis.
+    Les lignes gardent leur identifiant: messages, abonnés et activités restent en base,
+    rattachés au même (modèle, res_id)."""
+    _name = 'school.archive.mixin'
+    _description = "Archive annuelle"
+    _source_model = None
+    # Colonnes copiées telles quelles depuis la table courante
+    _archive_columns = []
+    # Colonnes ajoutées à la table d'archive après sa création: {colonne: type SQL}
+    _archive_added_columns = {}
+    
+    @api.model
+    def _create_partition(self, year):
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self._table}_{int(year.id)}
+            PARTITION OF {self._table} FOR VALUES IN ({int(year.id)})
+        """)
+    
+    @api.model
+    def _archive(self, year):
+        """Déplace (DELETE ... RETURNING puis INSERT, en une instruction) les lignes
+        jusqu'à la fin de l'année; retourne le nombre de lignes archivées"""
+        self._create_partition(year)
+        source = self.env[self._source_model]._table
+        cr = self.env.cr
+        extra = self._archive_extra_columns()
+        columns = ", ".join(self._archive_columns + list(extra))
+        cr.execute(f"""
+            WITH moved AS (
+                DELETE FROM {source} r
+                USING school_student s
+                WHERE s.id = r.student_id AND r.date <= %(date_end)s
+                RETURNING r.id, s.class_id AS student_class_id, {", ".join(f"r.{column}" for column in self._archive_columns)}
+            )
+            INSERT INTO {self._table} (id, year_id, {columns})
+            SELECT id, %(year_id)s, {", ".join(self._archive_columns + list(extra.values()))}
+            FROM moved
+        """, {'year_id': year.id, 'date_end': year.date_end})
+        return cr.rowcount
+    
+    @api.model
+    def _archive_extra_columns(self):
+        """Colonnes de l'archive absentes de la table courante: {colonne: expression}"""
+        return {}
+    
+    def _add_archive_columns(self):
+        """Ajoute aux archives existantes les colonnes apparues depuis leur création
+        (propagées aux partitions par PostgreSQL)"""
+        for column, column_type in self._archive_added_columns.items():
+            self.env.cr.execute(f"ALTER TABLE {self._table} ADD COLUMN IF NOT EXISTS {column} {column_type}")
+    
+    def write(self, vals):
+        raise UserError(_("Les archives ne peuvent pas être modifiées."))
+
+
+class GradeArchive(models.Model):
+    _name = 'school.grade.archive'
+    _inherit = 'school.archive.mixin'
+    _description = 'Note archivée'
+    _auto = False
+    _log_access = False
+    _order = 'date desc, id'
+    _source_model = 'school.grade'
+    _archive_columns = ['student_id', 'course_id', 'grade', 'max_grade', 'evaluation_type',
+                        'date', 'semester', 'percentage', 'grade_letter', 'remarks', 'graded_by']
+    _archive_added_columns = {
+        'graded_by': 'integer REFERENCES school_teacher (id) ON DELETE SET NULL',
+    }
+    
+    year_id = fields.Many2one('school.year', string='Année scolaire', readonly=True)
+    student_id = fields.Many2one('school.student', string='Étudiant', readonly=True)
+    course_id = fields.Many2one('school.course', string='Cours', readonly=True)
+    class_id = fields.Many2one('school.class', string='Classe', readonly=True)
+    grade = fields.Float(string='Note', readonly=True)
+    max_grade = fields.Float(string='Note maximale', readonly=True)
+    evaluation_type = fields.Selection(
+        selection=lambda self: self.env['school.grade']._fields['evaluation_type'].selection,
+        string="Type d'évaluation", readonly=True)
+    date = fields.Date(string='Date', readonly=True)
+    semester = fields.Selection([
+        ('1', 'Semestre 1'),
+        ('2', 'Semestre 2'),
+    ], string='Semestre', readonly=True)
+    percentage = fields.Float(string='Pourcentage', readonly=True)
+    grade_letter = fields.Selection(
+        selection=lambda self: self.env['school.grade']._fields['grade_letter'].selection,
+        string='Lettre', readonly=True)
+    remarks = fields.Text(string='Remarques', readonly=True)
+    graded_by = fields.Many2one('school.teacher', string='Noté par', readonly=True)
+    
+    def init(self):
+        cr = self.env.cr
+        cr.execute("""
+            CREATE TABLE IF NOT EXISTS school_grade_archive (
+                id integer NOT NULL,
+                year_id integer NOT NULL REFERENCES school_year (id) ON DELETE RESTRICT,
+                student_id integer REFERENCES school_student (id) ON DELETE CASCADE,
+                course_id integer REFERENCES school_course (id) ON DELETE SET NULL,
+                class_id integer REFERENCES school_class (id) ON DELETE SET NULL,
+                grade double precision,
+                max_grade double precision,
+                evaluation_type varchar,
+                date date,
+                semester varchar,
+                percentage double precision,
+                grade_letter varchar,
+                remarks text,
+                PRIMARY KEY (year_id, id)
+            ) PARTITION BY LIST (year_id)
+        """)
+        self._add_archive_columns()
+        cr.execute("CREATE INDEX IF NOT EXISTS school_grade_archive_student_idx ON school_grade_archive (student_id, year_id)")
+        cr.execute("CREATE INDEX IF NOT EXISTS school_grade_archive_course_idx ON school_grade_archive (course_id, year_id)")
+    
+    @api.model
+    def _archive_extra_columns(self):
+        # Classe de l'étudiant au moment de la clôture
+        return {'class_id': 'student_class_id'}
+
+
+class AttendanceArchive(models.Model):
+    _name = 'school.attendance.archive'
+    _inherit = 'school.archive.mixin'
+    _description = 'Présence archivée'
+    _auto = False
+    _log_access = False
+    _order = 'date desc, id'
+    _source_model = 'school.attendance'
+    # display_name n'est pas archivé: il est recalculé à partir de l'étudiant et de la date
+    _archive_columns = ['student_id', 'class_id', 'course_id', 'schedule_id', 'date', 'check_in', 'check_out',
+                        'status', 'reason', 'remarks', 'marked_by', 'alert_date']
+    _archive_added_columns = {
+        'schedule_id': 'integer REFERENCES school_schedule (id) ON DELETE SET NULL',
+        'check_in': 'timestamp',
+        'check_out': 'timestamp',
+        'remarks': 'text',
+        'marked_by': 'integer REFERENCES res_users (id) ON DELETE SET NULL',
+        'alert_date': 'timestamp',
+    }
+    
+    year_id = fields.Many2one('school.year', string='Année scolaire', readonly=True)
+    student_id = fields.Many2one('school.student', string='Étudiant', readonly=True)
+    class_id = fields.Many2one('school.class', string='Classe', readonly=True)
+    course_id = fields.Many2one('school.course', string='Cours', readonly=True)
+    date = fields.Date(string='Date', readonly=True)
+    status = fields.Selection(
+        selection=lambda self: self.env['school.attendance']._fields['status'].selection,
+        string='Statut', readonly=True)
+    reason = fields.Text(string="Raison de l'absence", readonly=True)
+    schedule_id = fields.Many2one('school.schedule', string='Emploi du temps', readonly=True)
+    check_in = fields.Datetime(string="Heure d'arrivée", readonly=True)
+    check_out = fields.Datetime(string='Heure de départ', readonly=True)
+    remarks = fields.Text(string='Remarques', readonly=True)
+    marked_by = fields.Many2one('res.users', string='Marqué par', readonly=True)
+    alert_date = fields.Datetime(string='Alerte envoyée le', readonly=True)
+    
+    def init(self):
+        cr = self.env.cr
+        cr.execute("""
+            CREATE TABLE IF NOT EXISTS school_attendance_archive (
+                id integer NOT NULL,
+                year_id integer NOT NULL REFERENCES school_year (id) ON DELETE RESTRICT,
+                student_id integer REFERENCES school_student (id) ON DELETE CASCADE,
+                class_id integer REFERENCES school_class (id) ON DELETE SET NULL,
+                course_id integer REFERENCES school_course (id) ON DELETE SET NULL,
+                date date,
+                status varchar,
+                reason text,
+                PRIMARY KEY (year_id, id)
+            ) PARTITION BY LIST (year_id)
+        """)
+        self._add_archive_columns()
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_attendance_archive_student_idx
+            ON school_attendance_archive (student_id, year_id, date)
+        """)
+
+
+class StudentYear(models.Model):
+    _name = 'school.student.year'
+    _description = "Résultat annuel d'un étudiant"
+    _order = 'year_id desc, class_id, class_rank'
+    
+    student_id = fields.Many2one('school.student', string='Étudiant', required=True, readonly=True,
+                                 ondelete='cascade', index=True)
+    year_id = fields.Many2one('school.year', string='Année scolaire', required=True, readonly=True,
+                              ondelete='restrict')
+    class_id = fields.Many2one('school.class', string='Classe', readonly=True)
+    grade_count = fields.Integer(string='Nombre de notes', readonly=True)
+    average_grade = fields.Float(string='Moyenne', readonly=True)
+    weighted_average_grade = fields.Float(string='Moyenne pondérée', readonly=True)
+    score = fields.Float(string='Score (/20)', readonly=True)
+    class_rank = fields.Integer(string='Rang', readonly=True)
+    class_size = fields.Integer(string='Étudiants classés', readonly=True)
+    attendance_rate = fields.Float(string='Taux de présence (%)', readonly=True)
+    absence_count = fields.Integer(string='Absences', readonly=True)
+    late_count = fields.Integer(string='Retards', readonly=True)
+    
+    _sql_constraints = [
+        ('student_year_unique', 'unique(student_id, year_id)', 'Un seul résultat par étudiant et par année!'),
+    ]
+    
+    @api.model
+    def _freeze(self, year):
+        """Fige en deux requêtes les résultats de l'année, calculés comme les cumuls
+        courants (moyenne, moyenne pondérée par crédits, score et rang de classe)"""
+        cr = self.env.cr
+        params = {'year_id': year.id, 'date_end': year.date_end, 'uid': self.env.uid}
+        cr.execute("DELETE FROM school_student_year WHERE year_id = %(year_id)s", params)
+        cr.execute("""
+            WITH grades AS (
+                SELECT student_id, COUNT(*) AS count, AVG(grade) AS average,
+                       SUM(grade) / NULLIF(SUM(max_grade), 0) * 20 AS score
+                FROM school_grade
+                WHERE date <= %(date_end)s
+                GROUP BY student_id
+            ), weighted AS (
+                SELECT student_id, SUM(average * credits) / NULLIF(SUM(credits), 0) AS average
+                FROM (
+                    SELECT g.student_id, c.credits,
+                           CASE WHEN SUM(g.max_grade) > 0 THEN SUM(g.grade) / SUM(g.max_grade) * 20 ELSE 0 END AS average
+                    FROM school_grade g
+                    JOIN school_course c ON c.id = g.course_id
+                    WHERE g.date <= %(date_end)s
+                    GROUP BY g.student_id, g.course_id, g.semester, c.credits
+                ) results
+                GROUP BY student_id
+            ), attendances AS (
+                SELECT student_id,
+                       COUNT(*) FILTER (WHERE status = 'present') AS present,
+                       COUNT(*) FILTER (WHERE status = 'absent') AS absent,
+                       COUNT(*) FILTER (WHERE status = 'late') AS late,
+                       COUNT(*) AS total
+                FROM school_attendance
+                WHERE date <= %(date_end)s
+                GROUP BY student_id
+            )
+            INSERT INTO school_student_year (
+                student_id, year_id, class_id, grade_count, average_grade, weighted_average_grade, score,
+                attendance_rate, absence_count, late_count, create_uid, write_uid, create_date, write_date
+            )
+            SELECT s.id, %(year_id)s, s.class_id, COALESCE(g.count, 0), COALESCE(g.average, 0),
+                   COALESCE(w.average, 0), g.score,
+                   COALESCE(a.present * 100.0 / NULLIF(a.total, 0), 0), COALESCE(a.absent, 0), COALESCE(a.late, 0),
+                   %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+            FROM school_student s
+            LEFT JOIN grades g ON g.student_id = s.id
+            LEFT JOIN weighted w ON w.student_id = s.id
+            LEFT JOIN attendances a ON a.student_id = s.id
+            WHERE g.student_id IS NOT NULL OR a.student_id IS NOT NULL
+        """, params)
+        # Rang 1 pour le meilleur score, ex aequo partagés (comme les statistiques courantes)
+        cr.execute("""
+            UPDATE school_student_year r
+            SET class_rank = ranked.rank, class_size = ranked.size
+            FROM (
+                SELECT id, rank() OVER (PARTITION BY class_id ORDER BY score DESC) AS rank,
+                       COUNT(*) OVER (PARTITION BY class_id) AS size
+                FROM school_student_year
+                WHERE year_id = %(year_id)s AND score IS NOT NULL
+            ) ranked
+            WHERE r.id = ranked.id
+        """, params)
+        self.invalidate_model()
+    
+    def action_print_bulletin(self):
+        """Bulletin de l'année reproduit à partir des archives"""
+        year = self.year_id
+        if len(year) != 1:
+            raise UserError(_("Sélectionnez les résultats d'une seule année."))
+        return self.env.ref('school_management.action_report_bulletin').report_action(
+            self.student_id, data={'year_id': year.id})
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import time
+
+import psycopg2
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# En dessous de 3 caractères, un index trigramme n'apporte rien: recherche classique
+TRIGRAM_MIN_LENGTH = 3
+
+
+class SearchMixin(models.AbstractModel):
+    """Recherche rapide insensible aux accents sur plusieurs champs texte.
+    
+    Chaque champ listé dans `_search_document_fields` est passé en minuscules et sans
+    accents (unaccent) dans une expression indexée par un index GIN trigramme (pg_trgm);
+    le champ `search_text` interroge ces expressions avec LIKE '%terme%', champ par champ
+    (un terme ne peut pas chevaucher deux champs), dans une sous-requête. Sans les
+    extensions PostgreSQL, on retombe sur des ilike classiques.
+    """
+    _name = 'school.search.mixin'
+    _description = 'Recherche trigramme'
+    _search_document_fields = ['name']
+    
+    search_text = fields.Char(string='Recherche', compute='_compute_search_text', search='_search_search_text')
+    
+    def _compute_search_text(self):
+        for record in self:
+            record.search_text = False
+    
+    @api.model
+    def _search_expression(self, fname):
+        """Expression SQL indexée d'un champ; doit rester identique entre l'index et les requêtes"""
+        return f"school_unaccent(lower({fname}))"
+    
+    def init(self):
+        if self._abstract:
+            return
+        cr = self.env.cr
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cr.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+                # unaccent() n'est pas IMMUTABLE: enveloppe utilisable dans un index
+                cr.execute("""
+                    CREATE OR REPLACE FUNCTION school_unaccent(text) RETURNS text
+                    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+                """)
+        except psycopg2.Error:
+            _logger.warning("Extensions pg_trgm/unaccent indisponibles: recherche trigramme de %s désactivée.",
+                            self._name)
+            return
+        # Ancien index sur la concaténation des champs
+        cr.execute(f"DROP INDEX IF EXISTS {self._table}_search_trgm_idx")
+        for fname in self._search_document_fields:
+            cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS {self._table}_{fname}_search_trgm_idx
+                ON {self._table} USING gin (({self._search_expression(fname)}) gin_trgm_ops)
+            """)
+    
+    @api.model
+    @tools.ormcache('self._table')
+    def _trigram_index_exists(self):
+        self.env.cr.execute("SELECT COUNT(*) FROM pg_indexes WHERE indexname = ANY(%s)", [[
+            f"{self._table}_{fname}_search_trgm_idx" for fname in self._search_document_fields
+        ]])
+        return self.env.cr.fetchone()[0] == len(self._search_document_fields)
+    
+    @api.model
+    def _use_trigram_search(self, value):
+        if self.env.context.get('school_search_mode') == 'ilike':
+            return False
+        return len(value.strip()) >= TRIGRAM_MIN_LENGTH and self._trigram_index_exists()
+    
+    def _search_search_text(self, operator, value):
+        if operator not in ('ilike', 'like', '=ilike', '=like') or not isinstance(value, str):
+            raise UserError(_("Opérateur de recherche non supporté: %s") % operator)
+        if not self._use_trigram_search(value):
+            return expression.OR([[(fname, 'ilike', value)] for fname in self._search_document_fields])
+        pattern = '%{}%'.format(value.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+        self.flush_model(self._search_document_fields)
+        # Un OR de conditions indexées: PostgreSQL combine les index (BitmapOr)
+        conditions = SQL(" OR ").join(
+            SQL(f"{self._search_expression(fname)} LIKE school_unaccent(lower(%s))", pattern)
+            for fname in self._search_document_fields
+        )
+        return [('id', 'in', SQL("(SELECT id FROM %s WHERE %s)", SQL.identifier(self._table), conditions))]
+    
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        if name and operator == 'ilike':
+            domain = expression.AND([domain or [], [('search_text', 'ilike', name)]])
+            return self._search(domain, limit=limit, order=order)
+        return super(SearchMixin, self)._name_search(name, domain, operator, limit, order)
+    
+    @api.model
+    def action_benchmark_search(self, samples=200, limit=8):
+        """Latences (p50, p95 en ms) de l'autocomplétion sur des fragments de noms
+        existants, recherche trigramme contre ilike classiques"""
+        self.env.cr.execute(f"SELECT name FROM {self._table} WHERE name IS NOT NULL ORDER BY random() LIMIT %s",
+                            [samples])
+        names = [row[0] for row in self.env.cr.fetchall()]
+        if not names:
+            raise UserError(_("Aucun enregistrement pour la mesure."))
+        rng = random.Random(42)
+        terms = []
+        for name in names:
+            size = min(len(name), rng.randint(TRIGRAM_MIN_LENGTH, 6))
+            start = rng.randint(0, len(name) - size)
+            terms.append(name[start:start + size])
+        results = {}
+        for mode in ('trigram', 'ilike'):
+            records = self.with_context(school_search_mode=mode)
+            latencies = []
+            for term in terms:
+                start = time.perf_counter()
+                records.name_search(term, limit=limit)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            results[mode] = {
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            }
+        _logger.info("Recherche %s (%s termes): %s", self._name, len(terms), results)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Latence de recherche (%s termes)") % len(terms),
+                'message': "\n".join(
+                    _("%(mode)s: p50 %(p50).1f ms, p95 %(p95).1f ms") % dict(values, mode=mode)
+                    for mode, values in results.items()),
+                'sticky': True,
+            },
+        }
@@ -2,15 +2,28 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
-from datetime import date
+from odoo.tools import split_every
+from datetime import date, timedelta
+import calendar
+
+from .profiling import profiled
+
+# Nombre d'étudiants agrégés par requête SQL lors des recalculs en masse
+STATISTICS_BATCH_SIZE = 1000
+
+# Dernier jour traité par la mise à jour quotidienne des âges
+AGE_WATERMARK_PARAM = 'school_management.age_refreshed_on'
 
 
 class Student(models.Model):
     _name = 'school.student'
     _description = 'Étudiant'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'school.search.mixin']
     _order = 'name'
-
+    _search_document_fields = [
+        'name', 'registration_number', 'email', 'phone', 'mobile', 'guardian_name', 'guardian_phone',
+    ]
+    
     # Informations de base
     name = fields.Char(string='Nom complet', required=True, tracking=True)
     registration_number = fields.Char(
@@ -75,9 +88,13 @@ class Student(models.Model):
     # Notes et présence
     grade_ids = fields.One2many('school.grade', 'student_id', string='Notes')
     attendance_ids = fields.One2many('school.attendance', 'student_id', string='Présences')
+    summary_ids = fields.One2many('school.grade.summary', 'student_id', string='Résultats')
     
     # Statistiques
+    grade_sum = fields.Float(string='Somme des notes', readonly=True, copy=False)
+    grade_count = fields.Integer(string='Nombre de notes', readonly=True, copy=False)
     average_grade = fields.Float(string='Moyenne générale', compute='_compute_average_grade', store=True)
+    weighted_average_grade = fields.Float(string='Moyenne pondérée (crédits)', compute='_compute_weighted_average_grade', store=True)
     attendance_rate = fields.Float(string="Taux de présence", compute='_compute_attendance_rate', store=True)
     
     # Image
@@ -89,13 +106,20 @@ class Student(models.Model):
     # Actif
     active = fields.Boolean(string='Actif', default=True)
     
-    @api.model
-    def create(self, vals):
-        if vals.get('registration_number', _('New')) == _('New'):
-            vals['registration_number'] = self.env['ir.sequence'].next_by_code('school.student') or _('New')
-        return super(Student, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        new = _('New')
+        pending = [vals for vals in vals_list if vals.get('registration_number', new) == new]
+        # Un seul aller-retour vers la séquence pour tout le lot
+        numbers = self.env['ir.sequence']._next_block_by_code('school.student', len(pending))
+        for vals, number in zip(pending, numbers):
+            vals['registration_number'] = number or new
+        records = super(Student, self).create(vals_list)
+        self.env['school.dashboard']._invalidate_classes(records.class_id.ids)
+        return records
     
     @api.depends('date_of_birth')
+    @profiled('compute')
     def _compute_age(self):
         for record in self:
             if record.date_of_birth:
@@ -106,18 +130,32 @@ class Student(models.Model):
             else:
                 record.age = 0
     
-    @api.depends('grade_ids.grade')
+    @api.depends('grade_sum', 'grade_count')
+    @profiled('compute')
     def _compute_average_grade(self):
         for record in self:
-            if record.grade_ids:
-                total = sum(record.grade_ids.mapped('grade'))
-                record.average_grade = total / len(record.grade_ids)
+            record.average_grade = record.grade_sum / record.grade_count if record.grade_count else 0.0
+    
+    @api.depends('summary_ids.weighted_average', 'summary_ids.credits')
+    @profiled('compute')
+    def _compute_weighted_average_grade(self):
+        for record in self:
+            credits = sum(record.summary_ids.mapped('credits'))
+            if credits:
+                total = sum(summary.weighted_average * summary.credits for summary in record.summary_ids)
+                record.weighted_average_grade = total / credits
             else:
-                record.average_grade = 0.0
+                record.weighted_average_grade = 0.0
     
-    @api.depends('attendance_ids')
+    @api.depends('attendance_ids.status')
+    @profiled('compute')
     def _compute_attendance_rate(self):
-        for record in self:
+        stored = self.filtered('id')
+        totals = stored._get_attendance_totals()
+        for record in stored:
+            present, count = totals.get(record.id, (0, 0))
+            record.attendance_rate = (present / count) * 100 if count else 0.0
+        for record in self - stored:
             if record.attendance_ids:
                 present = len(record.attendance_ids.filtered(lambda a: a.status == 'present'))
                 total = len(record.attendance_ids)
@@ -125,7 +163,142 @@ class Student(models.Model):
             else:
                 record.attendance_rate = 0.0
     
+    def _get_attendance_totals(self):
+        """Nombre de présences et total des appels par étudiant: une requête groupée par lot"""
+        self.env['school.attendance'].flush_model(['student_id', 'status'])
+        totals = {}
+        for ids in split_every(STATISTICS_BATCH_SIZE, self.ids, list):
+            self.env.cr.execute("""
+                SELECT student_id, COUNT(*) FILTER (WHERE status = 'present'), COUNT(*)
+                FROM school_attendance
+                WHERE student_id = ANY(%s)
+                GROUP BY student_id
+            """, [ids])
+            for student_id, present, count in self.env.cr.fetchall():
+                totals[student_id] = (present, count)
+        return totals
+    
+    def _recompute_statistics(self):
+        """Reconstruit sommes de notes, moyenne et taux de présence directement
+        en SQL, par lots, sans charger les notes ni les présences dans le cache de l'ORM"""
+        self.env['school.grade'].flush_model(['student_id', 'grade'])
+        self.env['school.attendance'].flush_model(['student_id', 'status'])
+        self.flush_model(['grade_sum', 'grade_count', 'average_grade', 'attendance_rate'])
+        for ids in split_every(STATISTICS_BATCH_SIZE, self.ids, list):
+            self.env.cr.execute("""
+                WITH stats AS (
+                    SELECT t.id,
+                           COALESCE(g.total, 0.0) AS grade_sum,
+                           COALESCE(g.count, 0) AS grade_count,
+                           COALESCE(g.total / g.count, 0.0) AS average_grade,
+                           COALESCE(a.present * 100.0 / a.count, 0.0) AS attendance_rate
+                    FROM unnest(%s) AS t(id)
+                    LEFT JOIN (
+                        SELECT student_id, SUM(grade) AS total, COUNT(*) AS count
+                        FROM school_grade
+                        WHERE student_id = ANY(%s)
+                        GROUP BY student_id
+                    ) g ON g.student_id = t.id
+                    LEFT JOIN (
+                        SELECT student_id,
+                               COUNT(*) FILTER (WHERE status = 'present') AS present,
+                               COUNT(*) AS count
+                        FROM school_attendance
+                        WHERE student_id = ANY(%s)
+                        GROUP BY student_id
+                    ) a ON a.student_id = t.id
+                )
+                UPDATE school_student s
+                SET grade_sum = stats.grade_sum,
+                    grade_count = stats.grade_count,
+                    average_grade = stats.average_grade,
+                    attendance_rate = stats.attendance_rate
+                FROM stats
+                WHERE s.id = stats.id
+                  AND (s.grade_count IS DISTINCT FROM stats.grade_count
+                       OR s.grade_sum IS DISTINCT FROM stats.grade_sum
+                       OR s.average_grade IS DISTINCT FROM stats.average_grade
+                       OR s.attendance_rate IS DISTINCT FROM stats.attendance_rate)
+            """, [ids, ids, ids])
+        self.invalidate_model(['grade_sum', 'grade_count', 'average_grade', 'attendance_rate'])
+        # Les moyennes de classe cumulent les moyennes étudiantes
+        self.mapped('class_id')._rebuild_grade_totals()
+    
+    @api.model
+    def _cron_recompute_statistics(self):
+        """Recalcul nocturne complet: corrige toute dérive des sommes courantes"""
+        self.with_context(active_test=False).search([])._recompute_statistics()
+        self.env['school.grade.summary']._rebuild()
+        self.env['school.course'].with_context(active_test=False).search([])._rebuild_grade_totals()
+        self.env['school.class'].with_context(active_test=False).search([])._rebuild_grade_totals()
+    
+    def init(self):
+        """Index d'expression (mois, jour) de naissance pour la mise à jour quotidienne des âges"""
+        super(Student, self).init()
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS school_student_birthday_idx
+            ON school_student ((EXTRACT(MONTH FROM date_of_birth)), (EXTRACT(DAY FROM date_of_birth)))
+            WHERE date_of_birth IS NOT NULL
+        """)
+    
+    @api.model
+    def _cron_refresh_ages(self):
+        """Met à jour l'âge des seuls étudiants dont l'anniversaire est tombé depuis le
+        dernier passage: une requête par jour écoulé, via l'index (mois, jour).
+        Sans passage antérieur connu (ou après plus d'un an), recalcul complet en une requête."""
+        today = date.today()
+        Param = self.env['ir.config_parameter'].sudo()
+        last_run = fields.Date.to_date(Param.get_param(AGE_WATERMARK_PARAM) or False)
+        self.flush_model(['date_of_birth', 'age'])
+        if not last_run or last_run > today or (today - last_run).days > 366:
+            self.env.cr.execute("""
+                UPDATE school_student
+                SET age = COALESCE(date_part('year', age(%(today)s, date_of_birth))::int, 0)
+                WHERE age IS DISTINCT FROM COALESCE(date_part('year', age(%(today)s, date_of_birth))::int, 0)
+            """, {'today': today})
+        else:
+            day = last_run + timedelta(days=1)
+            while day <= today:
+                # Nés un 29 février: l'anniversaire compte le 1er mars les années non bissextiles
+                leap_day = day.month == 3 and day.day == 1 and not calendar.isleap(day.year)
+                self.env.cr.execute("""
+                    UPDATE school_student
+                    SET age = date_part('year', age(%(today)s, date_of_birth))::int
+                    WHERE date_of_birth IS NOT NULL
+                      AND ((EXTRACT(MONTH FROM date_of_birth) = %(month)s AND EXTRACT(DAY FROM date_of_birth) = %(day)s)
+                           OR (%(leap_day)s AND EXTRACT(MONTH FROM date_of_birth) = 2 AND EXTRACT(DAY FROM date_of_birth) = 29))
+                      AND age IS DISTINCT FROM date_part('year', age(%(today)s, date_of_birth))::int
+                """, {'today': today, 'month': day.month, 'day': day.day, 'leap_day': leap_day})
+                day += timedelta(days=1)
+        self.invalidate_model(['age'])
+        Param.set_param(AGE_WATERMARK_PARAM, fields.Date.to_string(today))
+    
+    def write(self, vals):
+        if 'class_id' not in vals and 'active' not in vals:
+            res = super(Student, self).write(vals)
+            if 'name' in vals:
+                self.env['school.dashboard']._invalidate_classes(self.class_id.ids)
+            return res
+        classes = self.mapped('class_id')
+        res = super(Student, self).write(vals)
+        # Changement de classe ou archivage: on recalcule les cumuls des classes touchées
+        classes |= self.mapped('class_id')
+        classes._rebuild_grade_totals()
+        self.env['school.grade.statistics']._bump_revision('school.class', classes.ids)
+        self.env['school.grade.statistics']._bump_revision('school.course', self.grade_ids.course_id.ids)
+        self.env['school.dashboard']._invalidate_classes(classes.ids)
+        return res
+    
+    def unlink(self):
+        classes = self.mapped('class_id')
+        res = super(Student, self).unlink()
+        classes._rebuild_grade_totals()
+        self.env['school.grade.statistics']._bump_revision('school.class', classes.ids)
+        self.env['school.dashboard']._invalidate_classes(classes.ids)
+        return res
+    
     @api.constrains('email')
+    @profiled('constraint')
     def _check_email(self):
         for record in self:
             if record.email:
@@ -140,10 +313,32 @@ class Student(models.Model):
                     raise ValidationError(_("La date de naissance ne peut pas être dans le futur."))
     
     def action_set_active(self):
-        self.write({'status': 'active'})
+        return self._set_status('active')
     
     def action_set_graduated(self):
-        self.write({'status': 'graduated'})
+        return self._set_status('graduated')
     
     def action_set_suspended(self):
-        self.write({'status': 'suspended'})
+        return self._set_status('suspended')
+    
+    def _set_status(self, status):
+        """Changement de statut; mis en file au-delà du seuil des tâches en arrière-plan"""
+        Job = self.env['school.job']
+        if Job._should_enqueue(len(self)):
+            label = dict(self._fields['status'].selection)[status]
+            return Job._enqueue(
+                self, '_job_set_status', _("Statut « %s » pour %s étudiants") % (label, len(self)),
+                kwargs={'status': status})._action_open()
+        self._job_set_status(status)
+    
+    def _job_set_status(self, status):
+        self.write({'status': status})
+    
+    def _job_print_bulletins(self):
+        """Lot de bulletins d'une tâche en arrière-plan: un PDF par lot"""
+        pdf, _format = self.env['ir.actions.report']._render_qweb_pdf('school_management.report_bulletin', self.ids)
+        return self.env['ir.attachment'].create({
+            'name': _('bulletins-%04d.pdf') % self.env.context.get('school_job_chunk', 1),
+            'raw': pdf,
+            'mimetype': 'application/pdf',
+        })
@@ -3,13 +3,16 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .profiling import profiled
+
 
 class Teacher(models.Model):
     _name = 'school.teacher'
     _description = 'Enseignant'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'school.search.mixin']
     _order = 'name'
-
+    _search_document_fields = ['name', 'employee_number', 'email', 'phone', 'mobile']
+    
     # Informations de base
     name = fields.Char(string='Nom complet', required=True, tracking=True)
     employee_number = fields.Char(
@@ -63,6 +66,8 @@ class Teacher(models.Model):
     # Relations
     course_ids = fields.One2many('school.course', 'teacher_id', string='Cours')
     schedule_ids = fields.One2many('school.schedule', 'teacher_id', string='Emploi du temps')
+    schedule_revision = fields.Integer(string='Révision des horaires', readonly=True, copy=False,
+                                       help="Change à chaque modification des horaires; clé du cache des grilles hebdomadaires")
     
     # Statistiques
     total_courses = fields.Integer(string='Nombre de cours', compute='_compute_total_courses', store=True)
@@ -76,24 +81,39 @@ class Teacher(models.Model):
     # Actif
     active = fields.Boolean(string='Actif', default=True)
     
-    @api.model
-    def create(self, vals):
-        if vals.get('employee_number', _('New')) == _('New'):
-            vals['employee_number'] = self.env['ir.sequence'].next_by_code('school.teacher') or _('New')
-        return super(Teacher, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        new = _('New')
+        pending = [vals for vals in vals_list if vals.get('employee_number', new) == new]
+        # Un seul aller-retour vers la séquence pour tout le lot
+        numbers = self.env['ir.sequence']._next_block_by_code('school.teacher', len(pending))
+        for vals, number in zip(pending, numbers):
+            vals['employee_number'] = number or new
+        return super(Teacher, self).create(vals_list)
     
     @api.depends('course_ids')
+    @profiled('compute')
     def _compute_total_courses(self):
         for record in self:
             record.total_courses = len(record.course_ids)
     
     @api.constrains('email')
+    @profiled('constraint')
     def _check_email(self):
         for record in self:
             if record.email:
                 if not '@' in record.email:
                     raise ValidationError(_("L'adresse email n'est pas valide."))
     
+    @api.model
+    def find_free_teachers(self, day_of_week, start_time, end_time):
+        """Enseignants disponibles (ni en congé ni partis) sans cours sur le créneau"""
+        teacher_ids = self.env['school.schedule']._get_free_resource_ids(
+            'teacher_id', day_of_week, start_time, end_time,
+            "status NOT IN ('on_leave', 'terminated')",
+        )
+        return self.browse(teacher_ids)
+    
     def action_set_active(self):
         self.write({'status': 'active'})
     
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+import time
+from collections import Counter, defaultdict
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import html_escape
+
+# Budget de temps par défaut du générateur (secondes), surchargeable par paramètre système
+DEFAULT_TIME_BUDGET = 50
+
+
+class TimetableSolver:
+    """Placement des séances hebdomadaires sur une grille de créneaux.
+    
+    Les séances sont placées de la plus contrainte à la moins contrainte
+    (enseignants les plus chargés, classes avec le moins de salles possibles).
+    Quand une séance n'a plus de créneau compatible, on tente une réparation:
+    déplacer l'unique séance qui bloque un créneau vers un autre créneau libre.
+    Tout s'arrête à l'échéance du budget de temps.
+    """
+    
+    def __init__(self, slots, sessions, class_busy, teacher_busy, room_busy):
+        self.slots = slots
+        self.sessions = sessions
+        self.class_busy = defaultdict(set, class_busy)
+        self.teacher_busy = defaultdict(set, teacher_busy)
+        self.room_busy = defaultdict(set, room_busy)
+        self.assignment = {}
+        self.occupant = {}
+        self.course_days = defaultdict(Counter)
+    
+    def _room_for(self, session, slot):
+        """Plus petite salle libre assez grande; False si les salles ne sont pas gérées"""
+        if session['rooms'] is None:
+            return False
+        for room in session['rooms']:
+            if slot not in self.room_busy[room]:
+                return room
+        return None
+    
+    def _is_free(self, session, slot):
+        return (slot not in self.class_busy[session['class_id']]
+                and slot not in self.teacher_busy[session['teacher_id']])
+    
+    def _place(self, index, slot, room):
+        session = self.sessions[index]
+        self.class_busy[session['class_id']].add(slot)
+        self.teacher_busy[session['teacher_id']].add(slot)
+        self.occupant[('class', session['class_id'], slot)] = index
+        self.occupant[('teacher', session['teacher_id'], slot)] = index
+        if room:
+            self.room_busy[room].add(slot)
+            self.occupant[('room', room, slot)] = index
+        self.course_days[(session['class_id'], session['course_id'])][self.slots[slot][0]] += 1
+        self.assignment[index] = (slot, room)
+    
+    def _unplace(self, index):
+        session = self.sessions[index]
+        slot, room = self.assignment.pop(index)
+        self.class_busy[session['class_id']].discard(slot)
+        self.teacher_busy[session['teacher_id']].discard(slot)
+        del self.occupant[('class', session['class_id'], slot)]
+        del self.occupant[('teacher', session['teacher_id'], slot)]
+        if room:
+            self.room_busy[room].discard(slot)
+            del self.occupant[('room', room, slot)]
+        self.course_days[(session['class_id'], session['course_id'])][self.slots[slot][0]] -= 1
+        return slot, room
+    
+    def _best_slot(self, index, exclude=None):
+        """Créneau compatible qui étale le cours sur la semaine, au plus tôt dans la journée"""
+        session = self.sessions[index]
+        days = self.course_days[(session['class_id'], session['course_id'])]
+        best = None
+        for slot, (day, _start, _end) in enumerate(self.slots):
+            if slot == exclude or not self._is_free(session, slot):
+                continue
+            room = self._room_for(session, slot)
+            if room is None:
+                continue
+            score = (days[day], slot)
+            if best is None or score < best[0]:
+                best = (score, slot, room)
+        return best and best[1:]
+    
+    def _repair(self, index, deadline):
+        """Libère un créneau en déplaçant l'unique séance générée qui le bloque"""
+        session = self.sessions[index]
+        for slot in range(len(self.slots)):
+            if time.monotonic() > deadline:
+                return False
+            blockers = {
+                self.occupant.get((kind, session[field], slot))
+                for kind, field in (('class', 'class_id'), ('teacher', 'teacher_id'))
+                if slot in (self.class_busy if kind == 'class' else self.teacher_busy)[session[field]]
+            }
+            if len(blockers) != 1 or None in blockers:
+                continue  # créneau libre, bloqué par plusieurs séances ou par un horaire existant
+            blocker = blockers.pop()
+            origin = self._unplace(blocker)
+            room = self._room_for(session, slot) if self._is_free(session, slot) else None
+            if room is not None:
+                self._place(index, slot, room)
+                target = self._best_slot(blocker, exclude=origin[0])
+                if target:
+                    self._place(blocker, *target)
+                    return True
+                self._unplace(index)
+            self._place(blocker, *origin)
+        return False
+    
+    def _diagnose(self, index):
+        session = self.sessions[index]
+        if session['rooms'] == []:
+            return _("aucune salle de capacité suffisante")
+        if len(self.teacher_busy[session['teacher_id']]) >= len(self.slots):
+            return _("enseignant sans disponibilité")
+        if len(self.class_busy[session['class_id']]) >= len(self.slots):
+            return _("grille de la classe complète")
+        return _("aucun créneau commun classe, enseignant et salle")
+    
+    def solve(self, time_budget):
+        """:return: (affectations {séance: (créneau, salle)}, [(séance, raison)])"""
+        deadline = time.monotonic() + time_budget
+        teacher_load = Counter(session['teacher_id'] for session in self.sessions)
+        order = sorted(range(len(self.sessions)), key=lambda i: (
+            -teacher_load[self.sessions[i]['teacher_id']],
+            len(self.sessions[i]['rooms']) if self.sessions[i]['rooms'] is not None else float('inf'),
+            self.sessions[i]['class_id'],
+            self.sessions[i]['course_id'],
+        ))
+        unplaced = []
+        for index in order:
+            if time.monotonic() > deadline:
+                unplaced.append((index, _("budget de temps épuisé")))
+                continue
+            best = self._best_slot(index)
+            if best:
+                self._place(index, *best)
+            elif not self._repair(index, deadline):
+                unplaced.append((index, self._diagnose(index)))
+        return self.assignment, unplaced
+
+
+class TimetableGenerator(models.TransientModel):
+    _name = 'school.timetable.generator'
+    _description = "Générateur d'emploi du temps"
+    
+    class_ids = fields.Many2many('school.class', string='Classes', required=True,
+                                 default=lambda self: self._default_class_ids())
+    
+    # Grille hebdomadaire
+    include_saturday = fields.Boolean(string='Inclure le samedi')
+    day_start = fields.Float(string='Début de journée', default=8.0, required=True)
+    day_end = fields.Float(string='Fin de journée', default=17.0, required=True)
+    lunch_start = fields.Float(string='Début de pause', default=12.0)
+    lunch_end = fields.Float(string='Fin de pause', default=13.0)
+    session_duration = fields.Float(string='Durée d\'une séance (heures)', default=1.0, required=True)
+    
+    # Options
+    replace_existing = fields.Boolean(string="Remplacer l'emploi du temps existant", default=True)
+    time_budget = fields.Integer(string='Budget de temps (secondes)', default=lambda self: int(
+        self.env['ir.config_parameter'].sudo().get_param('school_management.timetable_time_budget', DEFAULT_TIME_BUDGET)))
+    start_date = fields.Date(string='Date de début', default=fields.Date.today, required=True)
+    
+    # Résultat
+    result_summary = fields.Html(string='Résultat', readonly=True)
+    
+    def _default_class_ids(self):
+        if self.env.context.get('active_model') == 'school.class':
+            return self.env.context.get('active_ids', [])
+        return []
+    
+    def _get_slots(self):
+        """Créneaux (jour, début, fin) de la grille hebdomadaire"""
+        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+        if self.include_saturday:
+            days.append('saturday')
+        slots = []
+        for day in days:
+            start = self.day_start
+            while start + self.session_duration <= self.day_end + 1e-6:
+                end = start + self.session_duration
+                if not (self.lunch_start < self.lunch_end and start < self.lunch_end and self.lunch_start < end):
+                    slots.append((day, start, end))
+                    start = end
+                else:
+                    start = self.lunch_end
+        return slots
+    
+    def _get_busy_slots(self, slots, schedules):
+        """Créneaux de la grille occupés par des horaires existants, par ressource"""
+        by_day = defaultdict(list)
+        for index, (day, start, end) in enumerate(slots):
+            by_day[day].append((index, start, end))
+        busy = {'class_id': defaultdict(set), 'teacher_id': defaultdict(set), 'room_id': defaultdict(set)}
+        for schedule in schedules:
+            for index, start, end in by_day[schedule.day_of_week]:
+                if schedule.start_time < end and start < schedule.end_time:
+                    for field, resources in busy.items():
+                        if schedule[field]:
+                            resources[schedule[field].id].add(index)
+        return busy
+    
+    def action_generate(self):
+        self.ensure_one()
+        if self.session_duration <= 0 or self.day_start >= self.day_end:
+            raise UserError(_("La grille horaire est invalide."))
+        started = time.monotonic()
+        slots = self._get_slots()
+        classes = self.class_ids
+        days = list({day for day, _start, _end in slots})
+    
+        Schedule = self.env['school.schedule']
+        existing = Schedule.search([('day_of_week', 'in', days)])
+        replaced = existing.filtered(lambda s: s.class_id in classes) if self.replace_existing else Schedule
+        busy = self._get_busy_slots(slots, existing - replaced)
+    
+        rooms = self.env['school.room'].search([]).sorted('capacity')
+        unavailable = {'on_leave', 'terminated'}
+        sessions = []
+        skipped = []
+        for course in self.env['school.course'].search([('class_id', 'in', classes.ids)]):
+            count = int(round(course.hours_per_week / self.session_duration))
+            if course.teacher_id.status in unavailable or not course.teacher_id.active:
+                skipped += [(course, _("enseignant indisponible"))] * count
+                continue
+            session_rooms = None
+            if rooms:
+                session_rooms = [room.id for room in rooms if room.capacity >= course.class_id.student_count]
+            sessions += [{
+                'class_id': course.class_id.id,
+                'course_id': course.id,
+                'teacher_id': course.teacher_id.id,
+                'rooms': session_rooms,
+            }] * count
+    
+        solver = TimetableSolver(slots, sessions, busy['class_id'], busy['teacher_id'], busy['room_id'])
+        assignment, unplaced = solver.solve(self.time_budget)
+    
+        replaced.unlink()
+        Schedule.create([{
+            'class_id': sessions[index]['class_id'],
+            'course_id': sessions[index]['course_id'],
+            'teacher_id': sessions[index]['teacher_id'],
+            'room_id': room or False,
+            'day_of_week': slots[slot][0],
+            'start_time': slots[slot][1],
+            'end_time': slots[slot][2],
+            'start_date': self.start_date,
+        } for index, (slot, room) in assignment.items()])
+    
+        Course = self.env['school.course']
+        failures = Counter(
+            [(course, reason) for course, reason in skipped]
+            + [(Course.browse(sessions[index]['course_id']), reason) for index, reason in unplaced]
+        )
+        self.result_summary = self._render_summary(len(assignment), failures, time.monotonic() - started)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+    
+    def _render_summary(self, placed, failures, duration):
+        rows = "".join(
+            f"<tr><td>{html_escape(course.class_id.name)}</td><td>{html_escape(course.name)}</td>"
+            f"<td>{count}</td><td>{html_escape(reason)}</td></tr>"
+            for (course, reason), count in failures.items()
+        )
+        summary = _("<p>%(placed)s séances placées en %(duration).1f s.</p>") % {
+            'placed': placed,
+            'duration': duration,
+        }
+        if rows:
+            summary += _(
+                "<p>Contraintes non satisfaites:</p>"
+                "<table class='table table-sm'><thead><tr><th>Classe</th><th>Cours</th>"
+                "<th>Séances</th><th>Raison</th></tr></thead><tbody>%s</tbody></table>"
+            ) % rows
+        return summary
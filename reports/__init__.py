@@ -1 +1,4 @@
 # -*- coding: utf-8 -*-
+
+from . import bulletin_report
+from . import schedule_report
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import defaultdict
+
+from odoo import models, api, _
+from odoo.tools import split_every
+
+from ..models.profiling import profiled
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de bulletins rendus par passe wkhtmltopdf lors des impressions en masse
+BULLETIN_CHUNK_SIZE = 100
+# Taille des blocs lus pour écrire les archives dans le filestore
+FILE_BLOCK_SIZE = 1024 * 1024
+
+
+class BulletinReport(models.AbstractModel):
+    _name = 'report.school_management.report_bulletin'
+    _description = 'Bulletin de notes'
+    
+    @api.model
+    @profiled('report', processed=lambda self, docids, data=None: len(docids))
+    def _get_report_values(self, docids, data=None):
+        students = self.env['school.student'].browse(docids)
+        year = self.env['school.year'].browse((data or {}).get('year_id'))
+        if year and year.state == 'closed':
+            bulletins = self._prepare_archived_bulletins(students, year)
+        else:
+            bulletins = self._prepare_bulletins(students)
+        return {
+            'doc_ids': docids,
+            'doc_model': 'school.student',
+            'docs': students,
+            'bulletins': bulletins,
+        }
+    
+    @api.model
+    @profiled('report', processed=lambda self, students: len(students))
+    def _prepare_bulletins(self, students):
+        """Charge en une recherche les notes des étudiants (lignes du bulletin) et
+        en une autre leurs résultats par cours et semestre (moyennes), pour éviter
+        les filtered() répétés dans QWeb"""
+        Grade = self.env['school.grade']
+        grades = Grade.search([('student_id', 'in', students.ids)], order='date desc, id')
+        summaries = self.env['school.grade.summary'].search([('student_id', 'in', students.ids)])
+        by_semester = defaultdict(lambda: defaultdict(list))
+        for grade in grades:
+            by_semester[grade.student_id.id][grade.semester].append(grade.id)
+        totals = defaultdict(lambda: {'semesters': defaultdict(lambda: [0.0, 0]), 'courses': defaultdict(lambda: [0.0, 0])})
+        for summary in summaries:
+            student_totals = totals[summary.student_id.id]
+            for total in (student_totals['semesters'][summary.semester], student_totals['courses'][summary.course_id]):
+                total[0] += summary.grade_sum
+                total[1] += summary.grade_count
+        # Statistiques de classe et de cours (rang, percentile), en cache par révision des notes
+        Statistics = self.env['school.grade.statistics']
+        bulletins = {}
+        for student in students:
+            student_totals = totals[student.id]
+            semesters = [{
+                'semester': semester,
+                'grades': Grade.browse(ids),
+                'average': self._average(*student_totals['semesters'][semester]),
+            } for semester, ids in sorted(by_semester[student.id].items())]
+            courses = []
+            for course, (total, count) in student_totals['courses'].items():
+                course_stats = Statistics.get_statistics('school.course', course.id)
+                courses.append({
+                    'course': course,
+                    'count': count,
+                    'average': self._average(total, count),
+                    'statistics': course_stats,
+                    'rank': course_stats['students'].get(student.id),
+                })
+            class_stats = student.class_id and Statistics.get_statistics('school.class', student.class_id.id)
+            bulletins[student.id] = {
+                'year': False,
+                'class': student.class_id,
+                'average_grade': student.average_grade,
+                'weighted_average_grade': student.weighted_average_grade,
+                'attendance_rate': student.attendance_rate,
+                'grade_count': sum(course['count'] for course in courses),
+                'semesters': semesters,
+                'courses': courses,
+                'class_statistics': class_stats or None,
+                'class_rank': class_stats and class_stats['students'].get(student.id),
+            }
+        return bulletins
+    
+    @api.model
+    @profiled('report', processed=lambda self, students, year: len(students))
+    def _prepare_archived_bulletins(self, students, year):
+        """Bulletins d'une année close, reproduits à partir des notes archivées et des
+        résultats figés à la clôture; statistiques de classe et de cours recalculées
+        sur les archives de l'année (classe de l'étudiant à la clôture)"""
+        grades = self.env['school.grade.archive'].search(
+            [('year_id', '=', year.id), ('student_id', 'in', students.ids)], order='date desc, id')
+        results = self.env['school.student.year'].search(
+            [('year_id', '=', year.id), ('student_id', 'in', students.ids)])
+        results = {result.student_id.id: result for result in results}
+        by_semester = defaultdict(lambda: defaultdict(list))
+        totals = defaultdict(lambda: {'semesters': defaultdict(lambda: [0.0, 0]), 'courses': defaultdict(lambda: [0.0, 0])})
+        for grade in grades:
+            by_semester[grade.student_id.id][grade.semester].append(grade.id)
+            student_totals = totals[grade.student_id.id]
+            student_totals['semesters'][grade.semester][0] += grade.grade
+            student_totals['semesters'][grade.semester][1] += 1
+            # Cours supprimé depuis la clôture: la note reste dans la moyenne du semestre
+            if grade.course_id:
+                student_totals['courses'][grade.course_id][0] += grade.grade
+                student_totals['courses'][grade.course_id][1] += 1
+        statistics = self._archived_statistics(
+            year, grades.course_id.ids, [result.class_id.id for result in results.values() if result.class_id])
+        GradeArchive = self.env['school.grade.archive']
+        bulletins = {}
+        for student in students:
+            student_totals = totals[student.id]
+            result = results.get(student.id, self.env['school.student.year'])
+            semesters = [{
+                'semester': semester,
+                'grades': GradeArchive.browse(ids),
+                'average': self._average(*student_totals['semesters'][semester]),
+            } for semester, ids in sorted(by_semester[student.id].items())]
+            courses = []
+            for course, (total, count) in student_totals['courses'].items():
+                course_stats = statistics['school.course'][course.id]
+                courses.append({
+                    'course': course,
+                    'count': count,
+                    'average': self._average(total, count),
+                    'statistics': course_stats,
+                    'rank': course_stats['students'].get(student.id),
+                })
+            class_stats = result.class_id and statistics['school.class'][result.class_id.id]
+            bulletins[student.id] = {
+                'year': year,
+                'class': result.class_id,
+                'average_grade': result.average_grade,
+                'weighted_average_grade': result.weighted_average_grade,
+                'attendance_rate': result.attendance_rate,
+                'grade_count': sum(course['count'] for course in courses),
+                'semesters': semesters,
+                'courses': courses,
+                'class_statistics': class_stats or None,
+                'class_rank': class_stats and class_stats['students'].get(student.id),
+            }
+        return bulletins
+    
+    @api.model
+    def _archived_statistics(self, year, course_ids, class_ids):
+        """Statistiques des cours et classes d'une année close, en une requête:
+        {modèle: {id: statistiques}}, mêmes calculs que les statistiques courantes"""
+        self.env.cr.execute("""
+            SELECT 'school.course', course_id, student_id, SUM(grade) / SUM(max_grade) * 20
+            FROM school_grade_archive
+            WHERE year_id = %(year_id)s AND course_id = ANY(%(course_ids)s)
+            GROUP BY course_id, student_id
+            HAVING SUM(max_grade) > 0
+            UNION ALL
+            SELECT 'school.class', class_id, student_id, SUM(grade) / SUM(max_grade) * 20
+            FROM school_grade_archive
+            WHERE year_id = %(year_id)s AND class_id = ANY(%(class_ids)s)
+            GROUP BY class_id, student_id
+            HAVING SUM(max_grade) > 0
+            ORDER BY 1, 2, 3
+        """, {'year_id': year.id, 'course_ids': course_ids, 'class_ids': class_ids})
+        scores = defaultdict(lambda: ([], []))
+        for model, res_id, student_id, score in self.env.cr.fetchall():
+            scores[model, res_id][0].append(student_id)
+            scores[model, res_id][1].append(score)
+        Statistics = self.env['school.grade.statistics']
+        return {
+            model: {res_id: Statistics._compute(*scores[model, res_id]) for res_id in ids}
+            for model, ids in (('school.course', course_ids), ('school.class', class_ids))
+        }
+    
+    @api.model
+    def _average(self, total, count):
+        return total / count if count else 0.0
+    
+    @api.model
+    def _render_archive(self, students, chunk_size=BULLETIN_CHUNK_SIZE, progress=None):
+        """Rend les bulletins par lots et les écrit au fil de l'eau dans une archive ZIP
+        sur disque (un PDF par lot), pour borner la mémoire d'une impression de masse.
+        
+        :param progress: fonction optionnelle appelée avec (bulletins rendus, total)
+        :return: ir.attachment contenant l'archive
+        """
+        report = self.env['ir.actions.report']
+        total = len(students)
+        done = 0
+        fd, path = tempfile.mkstemp(suffix='.zip', prefix='bulletins-')
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for number, ids in enumerate(split_every(chunk_size, students.ids, list), start=1):
+                    pdf, _format = report._render_qweb_pdf('school_management.report_bulletin', ids)
+                    archive.writestr('bulletins-%04d.pdf' % number, pdf)
+                    done += len(ids)
+                    _logger.info("Bulletins: %s/%s rendus", done, total)
+                    if progress:
+                        progress(done, total)
+                    # Libère le cache ORM du lot précédent
+                    self.env.invalidate_all()
+            return self._attachment_from_file(path, _('bulletins.zip'), 'application/zip')
+        finally:
+            os.unlink(path)
+    
+    @api.model
+    def _attachment_from_file(self, path, name, mimetype):
+        """Pièce jointe créée à partir d'un fichier sur disque: copié par blocs dans le
+        filestore, sans charger le contenu en mémoire (stockage en base: lu en une fois)"""
+        Attachment = self.env['ir.attachment']
+        if Attachment._storage() != 'file':
+            with open(path, 'rb') as content:
+                return Attachment.create({'name': name, 'raw': content.read(), 'mimetype': mimetype})
+        checksum = hashlib.sha1()
+        with open(path, 'rb') as content:
+            for block in iter(lambda: content.read(FILE_BLOCK_SIZE), b''):
+                checksum.update(block)
+        fname, full_path = Attachment._get_path(b'', checksum.hexdigest())
+        if not os.path.exists(full_path):
+            shutil.copyfile(path, full_path)
+            # Supprimé par le nettoyage du filestore si la transaction est annulée
+            # (conservé sinon: la pièce jointe le référence)
+            Attachment._mark_for_gc(fname)
+        # create() ignore store_fname, file_size et checksum: renseignés ensuite en SQL
+        attachment = Attachment.create({'name': name, 'mimetype': mimetype})
+        self.env.cr.execute("""
+            UPDATE ir_attachment SET store_fname = %s, file_size = %s, checksum = %s WHERE id = %s
+        """, [fname, os.path.getsize(path), checksum.hexdigest(), attachment.id])
+        attachment.invalidate_recordset(['store_fname', 'file_size', 'checksum', 'raw', 'datas'])
+        return attachment
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+
+from ..models.profiling import profiled
+
+
+class ScheduleGridReport(models.AbstractModel):
+    """Emplois du temps imprimés depuis les grilles hebdomadaires pré-construites:
+    une requête pour les créneaux de toute la sélection, puis une lecture groupée
+    par modèle pour les libellés (cours, enseignants, salles, classes)"""
+    _name = 'report.school_management.report_class_schedule'
+    _description = 'Emploi du temps des classes'
+    _grid_model = 'school.class'
+    _grid_field = 'class_id'
+    
+    @api.model
+    @profiled('report', processed=lambda self, docids, data=None: len(docids))
+    def _get_report_values(self, docids, data=None):
+        docs = self.env[self._grid_model].browse(docids)
+        grids = self.env['school.schedule'].get_weekly_grids(self._grid_field, docs.ids)
+        return {
+            'doc_ids': docids,
+            'doc_model': self._grid_model,
+            'docs': docs,
+            'grids': grids,
+            'labels': self._get_labels(grids),
+            'session_types': dict(self.env['school.schedule']._fields['session_type'].selection),
+        }
+    
+    @api.model
+    def _get_labels(self, grids):
+        """Noms des ressources référencées par les grilles: {champ: {id: nom}}"""
+        ids = {'class_id': set(), 'course_id': set(), 'teacher_id': set(), 'room_id': set()}
+        for grid in grids.values():
+            for row in grid['rows']:
+                for cell in row['cells']:
+                    for slot in cell:
+                        for field, field_ids in ids.items():
+                            if slot[field]:
+                                field_ids.add(slot[field])
+        Schedule = self.env['school.schedule']
+        return {
+            field: {record.id: record.name for record in self.env[Schedule._fields[field].comodel_name].browse(list(field_ids))}
+            for field, field_ids in ids.items()
+        }
+
+
+class TeacherScheduleReport(models.AbstractModel):
+    _name = 'report.school_management.report_teacher_schedule'
+    _inherit = 'report.school_management.report_class_schedule'
+    _description = 'Emploi du temps des enseignants'
+    _grid_model = 'school.teacher'
+    _grid_field = 'teacher_id'
+
+
+class RoomScheduleReport(models.AbstractModel):
+    _name = 'report.school_management.report_room_schedule'
+    _inherit = 'report.school_management.report_class_schedule'
+    _description = 'Emploi du temps des salles'
+    _grid_model = 'school.room'
+    _grid_field = 'room_id'
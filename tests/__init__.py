@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+from . import test_schedule
+from . import test_grade
+from . import test_attendance
+from . import test_promotion
+from . import test_bulletin_report
+from . import test_job
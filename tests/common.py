@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase
+
+
+class SchoolCase(TransactionCase):
+    """Jeu de données du générateur: deux classes (niveaux 1 et 2) de six étudiants,
+    deux cours par classe, une note par étudiant et par cours, deux jours d'appel"""
+    
+    @classmethod
+    def setUpClass(cls):
+        super(SchoolCase, cls).setUpClass()
+        cls.env['school.data.generator']._generate(
+            2, students_per_class=6, courses_per_class=2, grades_per_course=1,
+            attendance_days=2, seed=7, prefix='TEST',
+        )
+        cls.classes = cls.env['school.class'].search([('code', '=like', 'TEST-%')], order='code')
+        cls.class_1, cls.class_2 = cls.classes
+        cls.students = cls.env['school.student'].search([('class_id', 'in', cls.classes.ids)], order='id')
+        cls.courses = cls.env['school.course'].search([('class_id', 'in', cls.classes.ids)], order='code')
+    
+    def count_queries(self, function, *args, **kwargs):
+        """Exécute function et renvoie (résultat, nombre de requêtes SQL)"""
+        queries = self.env.cr.sql_log_count
+        result = function(*args, **kwargs)
+        return result, self.env.cr.sql_log_count - queries
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import SchoolCase
+
+
+@tagged('post_install', '-at_install')
+class TestAttendance(SchoolCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestAttendance, cls).setUpClass()
+        # Le générateur fait l'appel des jours ouvrés précédents
+        cls.today = fields.Date.today()
+        cls.course = cls.courses.filtered(lambda course: course.class_id == cls.class_1)[0]
+        cls.class_students = cls.class_1.student_ids.sorted('id')
+    
+    def test_upsert_inserts_then_updates(self):
+        Attendance = self.env['school.attendance']
+        result = Attendance._upsert_attendance(
+            {student.id: 'present' for student in self.class_students}, self.today, self.course.id)
+        self.assertEqual((result['inserted'], result['updated']), (len(self.class_students), 0))
+    
+        statuses = {student.id: 'absent' for student in self.class_students[:2]}
+        result = Attendance._upsert_attendance(statuses, self.today, self.course.id)
+        self.assertEqual((result['inserted'], result['updated']), (0, 2))
+        records = Attendance.search([('course_id', '=', self.course.id), ('date', '=', self.today)])
+        self.assertEqual(len(records), len(self.class_students))
+        self.assertEqual(records.filtered(lambda record: record.status == 'absent').student_id,
+                         self.class_students[:2])
+        self.assertEqual(records.class_id, self.class_1)
+    
+    def test_upsert_query_count_independent_of_size(self):
+        Attendance = self.env['school.attendance']
+        small = Attendance._upsert_attendance(
+            {student.id: 'present' for student in self.class_students[:2]}, self.today, self.course.id)
+        large = Attendance._upsert_attendance(
+            {student.id: 'late' for student in self.class_students},
+            self.today + timedelta(days=1), self.course.id)
+        self.assertEqual(small['queries'], large['queries'])
+    
+    def test_upsert_without_unique_index(self):
+        Attendance = self.env['school.attendance']
+        self.env.cr.execute("DROP INDEX IF EXISTS school_attendance_student_date_course_uniq")
+        self.assertFalse(Attendance._has_unique_index())
+        Attendance._upsert_attendance({self.class_students[0].id: 'present'}, self.today, self.course.id)
+        result = Attendance._upsert_attendance(
+            {student.id: 'absent' for student in self.class_students[:2]}, self.today, self.course.id)
+        self.assertEqual((result['inserted'], result['updated']), (1, 1))
+        self.assertEqual(Attendance.search_count([('course_id', '=', self.course.id), ('date', '=', self.today)]), 2)
+    
+    def test_duplicate_rejected_before_insert(self):
+        Attendance = self.env['school.attendance']
+        values = {
+            'student_id': self.class_students[0].id,
+            'course_id': self.course.id,
+            'date': self.today,
+            'status': 'present',
+        }
+        Attendance.create(values)
+        with self.assertRaises(ValidationError):
+            Attendance.create(dict(values, status='late'))
+        with self.assertRaises(ValidationError):
+            Attendance.create([dict(values, student_id=self.class_students[1].id)] * 2)
+    
+    def test_bulk_marking_without_course(self):
+        records = self.env['school.attendance'].mark_bulk_attendance(
+            self.class_students.ids, self.today, False, 'present')
+        self.assertEqual(records.student_id, self.class_students)
+        self.assertFalse(records.course_id)
+    
+    def test_upsert_invalidates_student_attendances(self):
+        student = self.class_students[0]
+        count = len(student.attendance_ids)
+        result = self.env['school.attendance']._upsert_attendance(
+            {student.id: 'absent'}, self.today, self.course.id)
+        self.assertEqual(len(student.attendance_ids), count + 1)
+        self.assertIn(result['ids'][0], student.attendance_ids.ids)
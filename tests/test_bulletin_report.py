@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import tempfile
+import zipfile
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestBulletinArchive(TransactionCase):
+
+    def test_attachment_from_file(self):
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('bulletins-0001.pdf', os.urandom(200000))
+        with open(path, 'rb') as content:
+            data = content.read()
+    
+        attachment = self.env['report.school_management.report_bulletin']._attachment_from_file(
+            path, 'bulletins.zip', 'application/zip')
+        self.assertEqual(attachment.raw, data)
+        self.assertEqual(attachment.file_size, len(data))
+        self.assertEqual(attachment.checksum, hashlib.sha1(data).hexdigest())
+        # Relu depuis la base, pas depuis le cache
+        attachment.invalidate_recordset()
+        self.assertEqual(attachment.file_size, len(data))
+        self.assertEqual(attachment.raw, data)
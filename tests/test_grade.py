@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from odoo.addons.school_management.models.gradebook import GRADEBOOK_COLUMNS
+
+from .common import SchoolCase
+
+
+@tagged('post_install', '-at_install')
+class TestRunningTotals(SchoolCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestRunningTotals, cls).setUpClass()
+        cls.student = cls.students[0]
+        cls.course = cls.courses.filtered(lambda course: course.class_id == cls.student.class_id)[0]
+    
+    def new_grade(self, grade, **values):
+        return self.env['school.grade'].create(dict({
+            'student_id': self.student.id,
+            'course_id': self.course.id,
+            'grade': grade,
+            'evaluation_type': 'quiz',
+            'semester': '1',
+        }, **values))
+    
+    def assertTotalsMatchGrades(self, record, field):
+        self.env.flush_all()
+        self.env.cr.execute(f"SELECT COALESCE(SUM(grade), 0), COUNT(*) FROM school_grade WHERE {field} = %s",
+                            [record.id])
+        total, count = self.env.cr.fetchone()
+        self.assertAlmostEqual(record.grade_sum, total)
+        self.assertEqual(record.grade_count, count)
+    
+    def test_running_deltas(self):
+        grades = self.env['school.grade'].search([('student_id', '=', self.student.id)])
+        deltas = grades._get_running_deltas(1)
+        total, count = deltas['school.student'][self.student.id]
+        self.assertAlmostEqual(total, sum(grades.mapped('grade')))
+        self.assertEqual(count, len(grades))
+        grades._get_running_deltas(-1, deltas)
+        total, count = deltas['school.student'][self.student.id]
+        self.assertAlmostEqual(total, 0.0)
+        self.assertEqual(count, 0)
+    
+    def test_create_write_unlink(self):
+        grade_sum, grade_count = self.student.grade_sum, self.student.grade_count
+        grade = self.new_grade(12.0)
+        self.assertAlmostEqual(self.student.grade_sum, grade_sum + 12.0)
+        self.assertEqual(self.student.grade_count, grade_count + 1)
+        self.assertTotalsMatchGrades(self.course, 'course_id')
+    
+        grade.grade = 8.0
+        self.assertAlmostEqual(self.student.grade_sum, grade_sum + 8.0)
+        self.assertAlmostEqual(self.student.average_grade, self.student.grade_sum / self.student.grade_count)
+    
+        grade.unlink()
+        self.assertAlmostEqual(self.student.grade_sum, grade_sum)
+        self.assertEqual(self.student.grade_count, grade_count)
+        self.assertTotalsMatchGrades(self.student, 'student_id')
+        self.assertTotalsMatchGrades(self.course, 'course_id')
+    
+    def test_batch_context_key_ignored(self):
+        grade_count = self.student.grade_count
+        self.env['school.grade'].with_context(school_batch_save=True).create({
+            'student_id': self.student.id,
+            'course_id': self.course.id,
+            'grade': 10.0,
+            'evaluation_type': 'homework',
+            'semester': '1',
+        })
+        self.assertEqual(self.student.grade_count, grade_count + 1)
+    
+    def test_max_grade_write_bumps_revisions(self):
+        grade = self.new_grade(10.0)
+        course_revision = self.course.grade_revision
+        class_revision = self.student.class_id.grade_revision
+        grade.max_grade = 40.0
+        self.assertNotEqual(self.course.grade_revision, course_revision)
+        self.assertNotEqual(self.student.class_id.grade_revision, class_revision)
+    
+    def test_summary_rebuild_invalidates_students(self):
+        summaries = self.student.summary_ids
+        self.assertTrue(summaries)
+        self.env['school.grade.summary']._rebuild(self.student)
+        # Lignes recréées: la liste en cache ne référence plus les anciennes
+        self.assertFalse(summaries.exists())
+        self.assertEqual(len(self.student.summary_ids), len(summaries))
+        self.assertTrue(self.student.summary_ids.exists())
+
+
+@tagged('post_install', '-at_install')
+class TestGradebook(SchoolCase):
+
+    def test_load_in_one_query(self):
+        course = self.courses[0]
+        self.env.flush_all()
+        gradebook, queries = self.count_queries(self.env['school.grade'].get_gradebook, course.id, '1')
+        self.assertEqual(len(gradebook['students']), len(course.class_id.student_ids))
+        self.assertLessEqual(queries, 3)
+    
+    def test_save_records_zero_grade(self):
+        course = self.courses[0]
+        student = course.class_id.student_ids[0]
+        Grade = self.env['school.grade']
+        used = set(Grade.search([
+            ('student_id', '=', student.id), ('course_id', '=', course.id), ('semester', '=', '1'),
+        ]).mapped('evaluation_type'))
+        evaluation_type = next(key for key in GRADEBOOK_COLUMNS if key not in used)
+        grade_count = student.grade_count
+    
+        wizard = self.env['school.gradebook'].create({'course_id': course.id, 'semester': '1'})
+        wizard._onchange_load()
+        line = wizard.line_ids.filtered(lambda line: line.student_id == student)
+        self.assertFalse(line[GRADEBOOK_COLUMNS[evaluation_type]])
+        line[GRADEBOOK_COLUMNS[evaluation_type]] = '0'
+        wizard.action_save()
+    
+        grade = Grade.search([
+            ('student_id', '=', student.id), ('course_id', '=', course.id),
+            ('semester', '=', '1'), ('evaluation_type', '=', evaluation_type),
+        ])
+        self.assertEqual(len(grade), 1)
+        self.assertEqual(grade.grade, 0.0)
+        # Seule la case saisie est enregistrée; les cumuls sont tenus par le lot
+        self.assertEqual(student.grade_count, grade_count + 1)
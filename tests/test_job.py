@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.school_management.models.job import JOB_RETENTION_DAYS
+
+
+@tagged('post_install', '-at_install')
+class TestJobGarbageCollection(TransactionCase):
+
+    def new_job(self, days):
+        job = self.env['school.job'].sudo().create({
+            'name': 'Test',
+            'res_model': 'school.student',
+            'method': '_job_test',
+            'state': 'done',
+            'date_done': fields.Datetime.now() - timedelta(days=days),
+        })
+        attachment = self.env['ir.attachment'].create({
+            'name': 'test.txt',
+            'raw': b'test',
+            'res_model': 'school.job',
+            'res_id': job.id,
+        })
+        return job, attachment
+    
+    def test_gc_removes_attachments(self):
+        old_job, old_attachment = self.new_job(JOB_RETENTION_DAYS + 1)
+        recent_job, recent_attachment = self.new_job(1)
+        self.env['school.job']._gc_jobs()
+        self.assertFalse(old_job.exists())
+        self.assertFalse(old_attachment.exists())
+        self.assertTrue(recent_job.exists())
+        self.assertEqual(recent_job.attachment_ids, recent_attachment)
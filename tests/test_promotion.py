@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+
+from odoo import Command
+from odoo.tests import tagged
+
+from .common import SchoolCase
+
+
+@tagged('post_install', '-at_install')
+class TestPromotion(SchoolCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestPromotion, cls).setUpClass()
+        # Seules les classes générées (niveaux 1 et 2) participent au plan; la classe de
+        # niveau 2 ne garde que deux places libres, et aucune classe de niveau 3 n'existe
+        cls.env['school.class'].search([('id', 'not in', cls.classes.ids)]).active = False
+        cls.class_2.capacity = len(cls.class_2.student_ids) + 2
+        cls.promotion = cls.env['school.promotion'].create({
+            'class_ids': [Command.set(cls.classes.ids)],
+            'pass_threshold': 0.0,
+        })
+    
+    def test_plan(self):
+        self.promotion.action_plan()
+        lines = self.promotion.line_ids
+        self.assertEqual(Counter(lines.mapped('decision')), Counter(promote=2, overflow=10))
+        # Sans classe de niveau 3, les étudiants de niveau 2 restent dans leur classe
+        self.assertEqual(lines.filtered(lambda line: line.from_class_id == self.class_2).to_class_id, self.class_2)
+        # Les deux places vont aux meilleures moyennes du niveau 1
+        best = self.class_1.student_ids.sorted(
+            lambda student: (-student.weighted_average_grade, student.id))[:2]
+        promoted = lines.filtered(lambda line: line.decision == 'promote')
+        self.assertEqual(promoted.student_id, best)
+        self.assertEqual(promoted.to_class_id, self.class_2)
+    
+    def test_apply(self):
+        self.promotion.action_plan()
+        promoted = self.promotion.line_ids.filtered(lambda line: line.decision == 'promote').student_id
+        courses = promoted.grade_ids.course_id
+        revisions = {course.id: course.grade_revision for course in courses}
+        class_count = len(self.class_1.student_ids)
+    
+        self.promotion.action_apply()
+        self.assertEqual(self.promotion.state, 'done')
+        self.assertEqual(promoted.class_id, self.class_2)
+        self.assertEqual(self.class_1.student_count, class_count - 2)
+        self.assertEqual(self.class_2.student_count, self.class_2.capacity)
+        attendances = self.env['school.attendance'].search([('student_id', 'in', promoted.ids)])
+        self.assertTrue(attendances)
+        self.assertEqual(attendances.class_id, self.class_2)
+        for course in courses:
+            self.assertNotEqual(course.grade_revision, revisions[course.id])
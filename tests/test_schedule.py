@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from odoo.exceptions import ValidationError
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.school_management.models.schedule import _sweep_overlaps
+from odoo.addons.school_management.models.timetable import TimetableSolver
+
+from .common import SchoolCase
+
+
+def slot(slot_id, start, end):
+    return {'id': slot_id, 'start_time': start, 'end_time': end}
+
+
+@tagged('post_install', '-at_install')
+class TestSweepOverlaps(TransactionCase):
+
+    def test_overlapping_pairs(self):
+        slots = [slot(1, 8, 10), slot(2, 9, 11), slot(3, 10, 12), slot(4, 13, 14)]
+        pairs = {(first['id'], second['id']) for first, second in _sweep_overlaps(slots)}
+        # Des créneaux qui se touchent (fin = début) ne se chevauchent pas
+        self.assertEqual(pairs, {(1, 2), (2, 3)})
+    
+    def test_nested_slots(self):
+        slots = [slot(1, 8, 12), slot(2, 9, 10), slot(3, 10, 11)]
+        pairs = {(first['id'], second['id']) for first, second in _sweep_overlaps(slots)}
+        self.assertEqual(pairs, {(1, 2), (1, 3)})
+
+
+@tagged('post_install', '-at_install')
+class TestTimetableSolver(TransactionCase):
+
+    SLOTS = [('monday', 8, 9), ('monday', 9, 10), ('tuesday', 8, 9), ('tuesday', 9, 10)]
+    
+    def session(self, class_id, course_id, teacher_id, rooms=None):
+        return {'class_id': class_id, 'course_id': course_id, 'teacher_id': teacher_id, 'rooms': rooms}
+    
+    def test_places_without_conflict(self):
+        sessions = [
+            self.session(1, 10, 100), self.session(1, 10, 100),
+            self.session(1, 11, 101), self.session(2, 20, 100),
+        ]
+        assignment, unplaced = TimetableSolver(self.SLOTS, sessions, {}, {}, {}).solve(5)
+        self.assertFalse(unplaced)
+        self.assertEqual(len(assignment), len(sessions))
+        for field in ('class_id', 'teacher_id'):
+            used = [(sessions[index][field], slot_index) for index, (slot_index, _room) in assignment.items()]
+            self.assertEqual(len(used), len(set(used)), "%s occupé deux fois sur un créneau" % field)
+        # Les deux séances du même cours sont étalées sur deux jours
+        days = {self.SLOTS[assignment[index][0]][0] for index in (0, 1)}
+        self.assertEqual(days, {'monday', 'tuesday'})
+    
+    def test_respects_existing_schedules_and_rooms(self):
+        sessions = [self.session(1, 10, 100, rooms=[7]), self.session(2, 20, 101, rooms=[7])]
+        solver = TimetableSolver(self.SLOTS, sessions, {1: {0}}, {}, {7: {1, 2}})
+        assignment, unplaced = solver.solve(5)
+        self.assertFalse(unplaced)
+        # Classe 1 occupée lundi 8h, salle occupée lundi 9h et mardi 8h
+        self.assertEqual(assignment, {0: (3, 7), 1: (0, 7)})
+    
+    def test_reports_unplaced_sessions(self):
+        sessions = [self.session(1, 10, 100), self.session(2, 20, 101, rooms=[])]
+        solver = TimetableSolver(self.SLOTS, sessions, {1: {0, 1, 2, 3}}, {}, {})
+        assignment, unplaced = solver.solve(5)
+        self.assertFalse(assignment)
+        self.assertEqual(sorted(index for index, _reason in unplaced), [0, 1])
+
+
+@tagged('post_install', '-at_install')
+class TestSchedule(SchoolCase):
+
+    def test_conflict_detected(self):
+        existing = self.env['school.schedule'].search([('class_id', '=', self.class_1.id)], limit=1)
+        with self.assertRaises(ValidationError):
+            existing.copy()
+    
+    def test_weekly_grid_cache(self):
+        Schedule = self.env['school.schedule']
+        grids = Schedule.get_weekly_grids('class_id', self.classes.ids)
+        self.assertEqual(set(grids), set(self.classes.ids))
+        # Deux cours de trois séances d'une heure par classe
+        self.assertEqual(grids[self.class_1.id]['hours'], 6)
+        # Grille en cache: seules l'existence et la révision des classes sont relues
+        _grids, queries = self.count_queries(Schedule.get_weekly_grids, 'class_id', self.classes.ids)
+        self.assertLessEqual(queries, 2)
+    
+        revision = self.class_1.schedule_revision
+        slot = Schedule.search([('class_id', '=', self.class_1.id)], limit=1)
+        slot.write({'session_type': 'exam'})
+        self.assertNotEqual(self.class_1.schedule_revision, revision)
+        cells = [cell for row in Schedule.get_weekly_grids('class_id', self.class_1.ids)[self.class_1.id]['rows']
+                 for day in row['cells'] for cell in day]
+        self.assertIn('exam', [cell['session_type'] for cell in cells if cell['id'] == slot.id])